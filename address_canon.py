@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Listings Feed Store - Address Canonicalization
+Shared by the scrapers, combine_initial_data.py and process_data.py so every
+script formats and matches addresses by the same rules.
+
+- format_address(): the display-ish 'formatted_address' the scrapers store
+  (lowercase, punctuation to spaces, whitespace collapsed).
+- canonicalize_address(): the matching key for ListerPros orders - mirrors
+  the Google Apps Script (punctuation dropped, abbreviations expanded). The
+  scrapers store it in the listing CSVs as 'canonical_address', so
+  process_data.py only canonicalizes rows that predate the column.
+- parse_address(): splits a canonical address into house number, unit, zip
+  and street/city words.
+
+Both canonicalize_address() and parse_address() are memoized with a bounded
+LRU cache; listings and orders repeat the same addresses run after run.
+"""
+
+import re
+from functools import lru_cache
+
+# Column the canonical form is stored in
+CANONICAL_FIELD = 'canonical_address'
+
+# Bound on memoized addresses per function (a market has ~100k listings)
+CANONICAL_CACHE_SIZE = 1 << 17
+
+# Address normalization - same as Google Apps Script
+ABBREVIATION_MAP = {
+    'st': 'street', 'str': 'street', 'rd': 'road', 'dr': 'drive', 'av': 'avenue',
+    'ave': 'avenue', 'ln': 'lane', 'ct': 'court', 'pl': 'place', 'blvd': 'boulevard',
+    'pkwy': 'parkway', 'cir': 'circle', 'trl': 'trail', 'wy': 'way',
+    'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
+    'ne': 'northeast', 'nw': 'northwest', 'se': 'southeast', 'sw': 'southwest'
+}
+
+# Characters the Apps Script strips before matching (deleted, not spaced)
+STRIPPED_PUNCTUATION = ".,/#!$%^&*;:{}=-_`~()"
+PUNCTUATION_TABLE = str.maketrans('', '', STRIPPED_PUNCTUATION)
+
+# Anything that isn't a word character or whitespace (format_address)
+NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Words introducing a unit designator ('#' is already stripped)
+UNIT_WORDS = frozenset({'unit', 'apt', 'apartment', 'suite', 'ste', 'lot', 'space', 'spc', 'bldg', 'building'})
+STATE_WORDS = frozenset({'az', 'arizona'})
+
+
+def format_address(address: str) -> str:
+    """Scraper 'formatted_address': lowercase, punctuation -> spaces, single-spaced."""
+    if not address:
+        return ''
+    return ' '.join(NON_WORD_RE.sub(' ', str(address).lower()).split())
+
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def canonicalize_address(address: str) -> str:
+    """
+    Canonical matching form of an address - mirrors Google Apps Script logic.
+    Lowercases, drops punctuation and expands abbreviations.
+    """
+    if not address:
+        return ''
+    expand = ABBREVIATION_MAP.get
+    return ' '.join([expand(part, part) for part in str(address).lower().translate(PUNCTUATION_TABLE).split()])
+
+
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def parse_address(canonical: str) -> tuple:
+    """
+    Split a canonicalize_address() result into (house number, unit, zip,
+    street and city tokens). Missing parts are ''.
+    """
+    tokens = canonical.split()
+    house = tokens.pop(0) if tokens and tokens[0].isdigit() else ''
+    zip_code = tokens.pop() if tokens and len(tokens[-1]) == 5 and tokens[-1].isdigit() else ''
+    unit = ''
+    words = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token in UNIT_WORDS and i + 1 < len(tokens):
+            unit = tokens[i + 1]
+            i += 2
+            continue
+        if token.isdigit():
+            # A bare number after the street is a unit ("123 main st 4")
+            unit = token
+        elif token not in STATE_WORDS:
+            words.append(token)
+        i += 1
+    return house, unit, zip_code, tuple(words)
+
+
+def row_canonical_address(row) -> str:
+    """
+    A listing row's canonical address: the stored canonical_address column
+    when present, else canonicalized from formatted_address.
+    """
+    return row.get(CANONICAL_FIELD, '') or canonicalize_address(row.get('formatted_address', ''))
+
+
+def fill_canonical_addresses(rows) -> int:
+    """Set canonical_address on rows missing it; returns how many were filled."""
+    filled = 0
+    for row in rows:
+        if not row.get(CANONICAL_FIELD) and row.get('formatted_address'):
+            row[CANONICAL_FIELD] = canonicalize_address(row['formatted_address'])
+            filled += 1
+    return filled
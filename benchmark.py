@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Processing Benchmarks
+Times every stage of the process_data.py pipeline on synthetic data (see
+generate_synthetic_data.py, generated on first use into bench/data/<size>/)
+and reports each stage's time, throughput and peak memory. Results are saved
+to bench/results/ as JSON named by date, commit and size, so runs can be
+compared across commits.
+
+Timings are the best of --repeat passes; each pass starts from the CSV with
+the address caches cleared. Peak memory comes from one extra pass under
+tracemalloc (Python allocations; tracing slows that pass down, so it is
+never timed).
+
+Usage:
+    python benchmark.py --size 10k --size 100k
+    python benchmark.py --compare bench/results/<before>.json bench/results/<after>.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import process_data
+from address_canon import canonicalize_address, parse_address
+from generate_synthetic_data import BENCH_DATA_DIR, DEFAULT_SEED, MARKETS, SIZES, generate, parse_rows, size_label
+
+SCRIPT_DIR = Path(__file__).parent
+BENCH_DIR = SCRIPT_DIR / "bench"
+RESULTS_DIR = BENCH_DIR / "results"
+BENCH_OUTPUT_DIR = BENCH_DIR / "out"
+RESULTS_VERSION = 1
+DEFAULT_REPEAT = 3
+
+# Builders timed one by one (each derives fields and aggregates on its own)
+BUILDERS = {
+    'verified_agents': process_data.build_verified_agents,
+    'customer_loyalty': process_data.build_customer_loyalty,
+    'photographers': process_data.build_photographers_data,
+    'photographer_analytics': process_data.build_photographer_analytics,
+}
+
+
+class StepRecorder:
+    """Runs pipeline steps, recording each one's time (or traced peak memory)."""
+
+    def __init__(self, traced: bool = False):
+        self.traced = traced
+        self.steps = {}  # name -> {'seconds', 'items'} or {'peak_mb', 'step_mb'}
+
+    def run(self, name: str, items, func, *args):
+        """Run func(*args) as step `name`; items (a count, or a callable on the result) sizes its throughput."""
+        if self.traced:
+            start_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+            tracemalloc.reset_peak()
+            result = func(*args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            self.steps[name] = {'peak_mb': round(peak_mb, 1), 'step_mb': round(peak_mb - start_mb, 1)}
+        else:
+            started = time.perf_counter()
+            result = func(*args)
+            self.steps[name] = {'seconds': time.perf_counter() - started,
+                                'items': items(result) if callable(items) else items}
+        return result
+
+
+def run_pipeline(data_dir: Path, market: str, recorder: StepRecorder) -> int:
+    """
+    One pass over the pipeline for a market, step by step, the way
+    prepare_market() and the builders run it. Returns the unique listings.
+    """
+    canonicalize_address.cache_clear()
+    parse_address.cache_clear()
+    csv_path = data_dir / MARKETS[market][0]
+
+    rows = recorder.run('read_csv_file', len, process_data.read_csv_file, csv_path)
+    raw_rows = len(rows)
+    lp_addresses = recorder.run('read_listerpros_orders', len, process_data.read_listerpros_orders,
+                                data_dir / "listerpros_orders.csv")
+    photographer_map = recorder.run('read_preferred_photographers', len, process_data.read_preferred_photographers,
+                                    data_dir / "preferred_photographers.csv")
+    lp_matcher = recorder.run('index_orders', len(lp_addresses), process_data.AddressMatcher, lp_addresses)
+
+    rows = recorder.run('dedupe_by_mls', raw_rows, process_data.dedupe_by_mls, rows)
+    listings = len(rows)
+    recorder.run('enrich_listings', listings, process_data.enrich_listings, rows, lp_addresses, photographer_map,
+                 lp_matcher)
+    recorder.run('infer_lp_for_loyal_agents', listings, process_data.infer_lp_for_loyal_agents, rows)
+    recorder.run('derive_listing_fields', listings, process_data.derive_listing_fields, rows)
+
+    for name, build in BUILDERS.items():
+        recorder.run(f'build:{name}', listings, build, rows, market)
+    outputs = recorder.run('build_market_outputs', listings, process_data.build_market_outputs, rows, market)
+
+    BENCH_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    for name, (filename, style) in process_data.MARKET_FILES.items():
+        path = BENCH_OUTPUT_DIR / filename
+        recorder.run(f'write_json:{name}', listings, process_data.write_json, path, outputs[name], style)
+        recorder.steps[f'write_json:{name}']['bytes'] = path.stat().st_size
+    return listings
+
+
+def git_commit() -> str:
+    """Short commit hash of the working tree ('-dirty' if it has changes), or '' outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=SCRIPT_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return f"{commit}-dirty" if dirty else commit
+
+
+def benchmark(rows: int, market: str, repeat: int, seed: int = DEFAULT_SEED) -> dict:
+    """Benchmark one data size; returns the results document."""
+    label = size_label(rows)
+    data_dir = BENCH_DATA_DIR / label if seed == DEFAULT_SEED else BENCH_DATA_DIR / f"{label}-seed{seed}"
+    if not (data_dir / MARKETS[market][0]).exists():
+        print(f"    Generating {label} rows into {data_dir}/...")
+        generate(data_dir, rows, seed)
+
+    timings = []
+    for _ in range(repeat):
+        recorder = StepRecorder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            listings = run_pipeline(data_dir, market, recorder)
+        timings.append(recorder.steps)
+
+    tracemalloc.start()
+    traced = StepRecorder(traced=True)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_pipeline(data_dir, market, traced)
+    finally:
+        tracemalloc.stop()
+
+    steps = {}
+    for name in timings[0]:
+        best = min(timing[name]['seconds'] for timing in timings)
+        items = timings[0][name]['items']
+        steps[name] = {'seconds': round(best, 4), 'items': items,
+                       'items_per_second': round(items / best) if best else None}
+        # peak_mb and step_mb (plus bytes for the JSON writes)
+        steps[name].update(traced.steps[name])
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'json_backend': process_data.JSON_BACKEND,
+        'size': label,
+        'market': market,
+        'seed': seed,
+        'rows': rows,
+        'listings': listings,
+        'repeat': repeat,
+        'total_seconds': round(sum(step['seconds'] for step in steps.values()), 4),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        'steps': steps,
+    }
+
+
+def save_results(results: dict) -> Path:
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.fromisoformat(results['created']).strftime("%Y%m%d-%H%M%S")
+    path = RESULTS_DIR / f"{stamp}-{results['commit'] or 'nogit'}-{results['size']}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    return path
+
+
+def print_results(results: dict):
+    print(f"\n{results['size']} rows ({results['listings']} listings, {results['market']}), "
+          f"best of {results['repeat']}, commit {results['commit'] or '-'}")
+    print(f"  {'step':<36}{'seconds':>10}{'items/s':>12}{'peak MB':>10}{'step MB':>10}")
+    for name, step in results['steps'].items():
+        rate = f"{step['items_per_second']:,}" if step['items_per_second'] is not None else '-'
+        print(f"  {name:<36}{step['seconds']:>10.3f}{rate:>12}{step['peak_mb']:>10.1f}{step['step_mb']:>10.1f}")
+    print(f"  {'total':<36}{results['total_seconds']:>10.3f}")
+
+
+def compare_results(before_path: Path, after_path: Path):
+    """Print the per-step time change between two saved results."""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+    if before['rows'] != after['rows'] or before['market'] != after['market']:
+        print(f"  Warning: comparing different data ({before['size']} {before['market']} vs "
+              f"{after['size']} {after['market']})")
+
+    print(f"\n{before['commit'] or before_path.name} -> {after['commit'] or after_path.name} ({after['size']} rows)")
+    print(f"  {'step':<36}{'before s':>10}{'after s':>10}{'change':>9}{'before MB':>11}{'after MB':>10}")
+    for name in list(dict.fromkeys(list(before['steps']) + list(after['steps']))):
+        old, new = before['steps'].get(name), after['steps'].get(name)
+        if old is None or new is None:
+            print(f"  {name:<36}{'only in ' + ('after' if old is None else 'before'):>20}")
+            continue
+        change = f"{(new['seconds'] / old['seconds'] - 1) * 100:+.0f}%" if old['seconds'] else '-'
+        print(f"  {name:<36}{old['seconds']:>10.3f}{new['seconds']:>10.3f}{change:>9}"
+              f"{old['peak_mb']:>11.1f}{new['peak_mb']:>10.1f}")
+    change = (after['total_seconds'] / before['total_seconds'] - 1) * 100 if before['total_seconds'] else 0
+    print(f"  {'total':<36}{before['total_seconds']:>10.3f}{after['total_seconds']:>10.3f}{change:>+8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the processing pipeline on synthetic data.")
+    parser.add_argument('--size', action='append', type=parse_rows, metavar='N',
+                        help=f"rows per listings CSV: {', '.join(SIZES)} or a number; repeatable (default: 10k)")
+    parser.add_argument('--market', default='phoenix', choices=list(MARKETS),
+                        help="market CSV to benchmark (default: phoenix)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f"timed passes per size; the best is kept (default: {DEFAULT_REPEAT})")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="synthetic data seed")
+    parser.add_argument('--no-save', action='store_true', help="print the results without saving them")
+    parser.add_argument('--compare', nargs=2, type=Path, metavar=('BEFORE', 'AFTER'),
+                        help="compare two saved results instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    for rows in args.size or [SIZES['10k']]:
+        print(f"[*] Benchmarking {size_label(rows)} rows ({args.market})...")
+        results = benchmark(rows, args.market, args.repeat, args.seed)
+        print_results(results)
+        if not args.no_save:
+            print(f"    Saved {save_results(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import csv
 import os
 from pathlib import Path
 
+from address_canon import CANONICAL_FIELD, fill_canonical_addresses
+
 # Source files (from Google Sheets export)
 PHOENIX_ALL_IN_ONE = Path("/Users/jordannielsen/Desktop/Community/MLS Listings - Phoenix All in One.csv")
 PHOENIX_ARCHIVE = Path("/Users/jordannielsen/Desktop/Community/MLS Listings - Phoenix ARCHIVE.csv")
@@ -27,7 +29,8 @@ STANDARD_HEADERS = [
     'formatted_address', 'image_filename',
     'exif_artist', 'exif_copyright', 'exif_make', 'exif_model',
     'exif_lens_model', 'exif_body_serial_number', 'exif_date_time_digitized',
-    'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer'
+    'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer',
+    CANONICAL_FIELD
 ]
 
 # Header mappings
@@ -62,6 +65,7 @@ HEADER_MAP = {
     'lp?': 'lp_flag',
     'cleaned': 'cleaned',
     'preferred photographer': 'preferred_photographer',
+    'canonical address': CANONICAL_FIELD,
 }
 
 
@@ -132,7 +136,8 @@ def dedupe_by_mls(rows: list) -> list:
 
 
 def write_csv(rows: list, output_path: Path):
-    """Write rows to CSV with standard headers."""
+    """Write rows to CSV with standard headers (canonical_address filled in)."""
+    fill_canonical_addresses(rows)
     with open(output_path, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=STANDARD_HEADERS, extrasaction='ignore')
         writer.writeheader()
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generator
+Writes deterministic, shareable stand-ins for the data/ CSVs: a listings CSV
+per market in the scraper's column layout (STANDARD_FIELDS in
+process_data.py), plus listerpros_orders.csv and preferred_photographers.csv.
+The same --rows and --seed always produce byte-identical files.
+
+Value cardinalities follow the real feeds: a few hundred listings per heavy
+agent and a long tail of small ones, each MLS number scraped about 1.4 times
+(status and price changes), a dozen camera bodies dominated by the LP Sony,
+mixed list date formats, a share of LP customers whose orders match by
+filename, exact address or a near-miss address (fuzzy matching).
+
+Usage:
+    python generate_synthetic_data.py --rows 100k
+    python generate_synthetic_data.py --rows 1m --out /tmp/bench-data --seed 7
+"""
+
+import argparse
+import bisect
+import csv
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from address_canon import CANONICAL_FIELD, canonicalize_address, format_address
+
+SCRIPT_DIR = Path(__file__).parent
+BENCH_DATA_DIR = SCRIPT_DIR / "bench" / "data"
+
+# Named sizes (rows per market listings CSV)
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_SEED = 1
+
+LISTING_FIELDS = [
+    'timestamp', 'mls_number', 'price', 'listing_address', 'status',
+    'agent_name', 'agent_first_name', 'agent_phone', 'agent_email', 'agent_website',
+    'office_name', 'office_phone', 'office_email', 'office_website',
+    'formatted_address', 'image_filename',
+    'exif_artist', 'exif_copyright', 'exif_make', 'exif_model',
+    'exif_lens_model', 'exif_body_serial_number', 'exif_date_time_digitized',
+    'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer',
+    'list_date', CANONICAL_FIELD
+]
+ORDER_HEADERS = ['Order Date', 'Listing Address', 'Formatted Address', 'Order/Listing']
+PHOTOGRAPHER_HEADERS = ['Listing Agent', 'Name', 'First Name', 'Agent Email', 'Phone', 'Company',
+                        '# of Listings', 'Preferred Photographer']
+
+# Market -> (listings file, [(city, zip codes)], MLS number base)
+MARKETS = {
+    'phoenix': ("phoenix_listings.csv", [
+        ('Phoenix', ['85003', '85012', '85016', '85018', '85020', '85032', '85041', '85044', '85050', '85086']),
+        ('Scottsdale', ['85251', '85254', '85255', '85258', '85260', '85262']),
+        ('Mesa', ['85201', '85203', '85205', '85207', '85209', '85212']),
+        ('Chandler', ['85224', '85225', '85226', '85248', '85249']),
+        ('Gilbert', ['85233', '85234', '85295', '85296', '85297', '85298']),
+        ('Glendale', ['85301', '85304', '85306', '85308', '85310']),
+        ('Peoria', ['85345', '85381', '85382', '85383']),
+        ('Surprise', ['85374', '85378', '85379', '85387', '85388']),
+        ('Buckeye', ['85326', '85396']),
+        ('Goodyear', ['85338', '85395']),
+        ('Queen Creek', ['85140', '85142', '85144']),
+        ('Tempe', ['85281', '85282', '85283', '85284']),
+    ], 6_500_000),
+    'tucson': ("tucson_listings.csv", [
+        ('Tucson', ['85704', '85710', '85711', '85712', '85716', '85718', '85719', '85730', '85741', '85742',
+                    '85745', '85747', '85748', '85750']),
+        ('Marana', ['85653', '85658']),
+        ('Oro Valley', ['85737', '85755']),
+        ('Sahuarita', ['85629']),
+        ('Vail', ['85641']),
+        ('Green Valley', ['85614', '85622']),
+    ], 22_300_000),
+}
+
+STREET_NAMES = [
+    'Main', 'Camelback', 'Indian School', 'Thomas', 'McDowell', 'Shea', 'Cactus', 'Bell', 'Union Hills',
+    'Baseline', 'Southern', 'Broadway', 'University', 'Guadalupe', 'Elliot', 'Warner', 'Ray', 'Ocotillo',
+    'Bobwhite', 'Meadowbrook', 'Saguaro', 'Palo Verde', 'Mesquite', 'Ironwood', 'Desert Willow', 'Quail',
+    'Roadrunner', 'Coyote', 'Javelina', 'Sunrise', 'Sunset', 'Canyon', 'Mountain View', 'Vista', 'Sierra',
+    'Granite', 'Copper', 'Silver', 'Turquoise', 'Agave', 'Yucca', 'Juniper', 'Cottonwood', 'Sycamore',
+    'Mulberry', 'Orange', 'Lemon', 'Citrus', 'Olive', 'Pecan', 'Oak', 'Elm', 'Maple', 'Pinnacle Peak',
+    'Happy Valley', 'Jomax', 'Dynamite', 'Carefree', 'Tatum', 'Cave Creek', 'Speedway', 'Grant', 'Ina',
+    'Orange Grove', 'Tanque Verde', 'Golf Links', 'Valencia', 'Irvington', 'Swan', 'Craycroft', 'Kolb',
+]
+STREET_SUFFIXES = ['St', 'Ave', 'Rd', 'Dr', 'Ln', 'Way', 'Ct', 'Pl', 'Blvd', 'Trl', 'Cir', 'Pkwy']
+DIRECTIONS = ['N', 'S', 'E', 'W']
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+    'Daniel', 'Lisa', 'Matthew', 'Nancy', 'Anthony', 'Sandra', 'Mark', 'Ashley', 'Steven', 'Kimberly',
+    'Andrew', 'Emily', 'Joshua', 'Donna', 'Kevin', 'Michelle', 'Brian', 'Carol', 'Maria', 'Amanda',
+    'Luis', 'Melissa', 'Ryan', 'Deborah', 'Jacob', 'Stephanie', 'Gary', 'Rebecca', 'Eric', 'Laura',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+    'Walker', 'Young', 'Allen', 'King', 'Wright', 'Scott', 'Torres', 'Nguyen', 'Hill', 'Flores',
+    'Green', 'Adams', 'Nelson', 'Baker', 'Hall', 'Rivera', 'Campbell', 'Mitchell', 'Carter', 'Roberts',
+]
+BROKERAGE_WORDS = [
+    'Realty', 'Homes', 'Properties', 'Real Estate', 'Group', 'Partners', 'Brokerage', 'Associates',
+]
+BROKERAGE_NAMES = [
+    'Desert', 'Sonoran', 'Saguaro', 'Copper State', 'Valley', 'Canyon', 'Red Rock', 'Camelback', 'Sunbelt',
+    'Mesa Verde', 'Old Pueblo', 'Catalina', 'Superstition', 'McDowell', 'Grand', 'Arizona', 'Southwest',
+]
+OFFICE_SUFFIXES = ['', '', 'LLC', 'Inc', 'of Arizona', 'East Valley', 'West Valley']
+AREA_CODES = ['480', '602', '623', '520', '928']
+EMAIL_DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'icloud.com', 'hotmail.com', 'aol.com']
+
+# (make, model, lenses, weight); ('', '') is a photo without EXIF camera data
+CAMERAS = [
+    ('SONY', 'ILCE-7M4', ['FE 16-35mm F4 ZA OSS', 'FE 12-24mm F4 G', 'FE 24-70mm F2.8 GM II'], 30),
+    ('', '', [''], 24),
+    ('Apple', 'iPhone 14 Pro', ['iPhone 14 Pro back triple camera 2.22mm f/2.2'], 9),
+    ('Apple', 'iPhone 13', ['iPhone 13 back dual wide camera 5.1mm f/1.6'], 6),
+    ('Canon', 'EOS R5', ['RF15-35mm F2.8 L IS USM', 'EF16-35mm f/4L IS USM'], 7),
+    ('Canon', 'EOS 5D Mark IV', ['EF16-35mm f/4L IS USM', 'EF17-40mm f/4L USM'], 5),
+    ('NIKON CORPORATION', 'NIKON Z 6_2', ['NIKKOR Z 14-30mm f/4 S'], 4),
+    ('NIKON CORPORATION', 'NIKON D750', ['14.0-24.0 mm f/2.8'], 3),
+    ('SONY', 'ILCE-7M3', ['FE 16-35mm F4 ZA OSS', 'FE 12-24mm F4 G'], 5),
+    ('DJI', 'FC3582', ['24.0 mm f/1.7'], 3),
+    ('DJI', 'L1D-20c', ['10.3 mm f/2.8'], 2),
+    ('FUJIFILM', 'X-T4', ['XF10-24mmF4 R OIS WR'], 2),
+]
+STATUSES = [('Active', 55), ('Pending', 15), ('Closed', 18), ('Coming Soon', 5), ('Cancelled', 4),
+            ('Expired', 3)]
+LP_CAMERA = 0  # CAMERAS index of the LP body
+
+# Scale: unique listings per CSV row, listings per agent, agents per office/photographer
+ROWS_PER_LISTING = 1.4
+LISTINGS_PER_AGENT = 12
+AGENTS_PER_OFFICE = 8
+AGENTS_PER_PHOTOGRAPHER = 10
+LP_CUSTOMER_SHARE = 0.25     # Agents who order from ListerPros
+LP_FILENAME_SHARE = 0.4      # LP listings whose photo filename says ListerPros
+LP_NEAR_MISS_SHARE = 0.1     # LP orders whose address differs slightly (fuzzy matching)
+NO_EMAIL_SHARE = 0.06        # Agents the feed has no email for
+PREFERRED_SHARE = 0.6        # Agents listed in preferred_photographers.csv
+HISTORY_DAYS = 3 * 365
+SCRAPE_START = datetime(2023, 1, 2, 6, 0, 0)
+
+
+def parse_rows(value: str) -> int:
+    """'10k' / '100k' / '1m' or a plain row count."""
+    value = value.strip().lower()
+    if value in SIZES:
+        return SIZES[value]
+    if value.endswith('k'):
+        return int(float(value[:-1]) * 1_000)
+    if value.endswith('m'):
+        return int(float(value[:-1]) * 1_000_000)
+    return int(value)
+
+
+def size_label(rows: int) -> str:
+    for label, count in SIZES.items():
+        if count == rows:
+            return label
+    return str(rows)
+
+
+def weighted_picker(weights: list):
+    """pick(rng) -> index drawn with the given weights (cumulative bisect, no per-draw setup)."""
+    cumulative = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+
+    def pick(rng: random.Random) -> int:
+        return bisect.bisect_right(cumulative, rng.random() * total)
+    return pick
+
+
+def make_phone(rng: random.Random) -> str:
+    return f"{rng.choice(AREA_CODES)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+
+
+def make_agents(rng: random.Random, count: int, market: str) -> list:
+    """Agents with contact details, office, photographer habits and LP usage."""
+    offices = []
+    for i in range(max(count // AGENTS_PER_OFFICE, 1)):
+        name = f"{rng.choice(BROKERAGE_NAMES)} {rng.choice(BROKERAGE_WORDS)} {rng.choice(OFFICE_SUFFIXES)}".strip()
+        slug = f"{''.join(ch for ch in name.lower() if ch.isalnum())[:20]}{i}"
+        offices.append({'name': name, 'phone': make_phone(rng), 'email': f"info@{slug}.com",
+                        'website': f"https://www.{slug}.com"})
+    photographers = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                     + rng.choice(['', ' Photography', ' Media', ' Photo'])
+                     for _ in range(max(count // AGENTS_PER_PHOTOGRAPHER, 5))]
+
+    agents = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        email = ''
+        if rng.random() >= NO_EMAIL_SHARE:
+            email = f"{first[0].lower()}{last.lower()}{i}@{rng.choice(EMAIL_DOMAINS)}"
+        lp_customer = rng.random() < LP_CUSTOMER_SHARE
+        agents.append({
+            'name': f"{first} {last}",
+            'first_name': first,
+            'phone': make_phone(rng),
+            'email': email,
+            'website': f"https://{first.lower()}{last.lower()}{i}.{market}homes.com" if rng.random() < 0.3 else '',
+            # Half the agents sit in a few big brokerages
+            'office': offices[min(int(rng.paretovariate(1.2)) - 1, len(offices) - 1) if rng.random() < 0.5
+                              else rng.randrange(len(offices))],
+            'photographer': rng.choice(photographers),
+            'artist_tagged': rng.random() < 0.5,
+            'lp_rate': rng.choice([0.2, 0.5, 0.8, 0.95]) if lp_customer else 0.0,
+        })
+    return agents
+
+
+def make_address(rng: random.Random, cities: list) -> str:
+    city, zips = cities[min(int(rng.paretovariate(1.0)) - 1, len(cities) - 1)]
+    street = f"{rng.choice(DIRECTIONS)} {rng.choice(STREET_NAMES)} {rng.choice(STREET_SUFFIXES)}"
+    address = f"{rng.randint(100, 45999)} {street}"
+    if rng.random() < 0.08:
+        address += rng.choice([f" Unit {rng.randint(1, 350)}", f" #{rng.randint(100, 2400)}"])
+    return f"{address}, {city}, AZ {rng.choice(zips)}"
+
+
+def near_miss(rng: random.Random, address: str) -> str:
+    """The same property written slightly differently (as order forms often are)."""
+    street, city, state_zip = address.split(', ')
+    variant = rng.randrange(3)
+    if variant == 0:
+        return f"{street}, {city}, AZ"            # Missing zip
+    if variant == 1:
+        return f"{street}, {state_zip}"           # Missing city
+    words = street.split()
+    suffixes = {'St': 'Street', 'Ave': 'Avenue', 'Rd': 'Road', 'Dr': 'Drive', 'Ln': 'Lane'}
+    words[-1] = suffixes.get(words[-1], words[-1].upper())
+    return f"{' '.join(words)}, {city}, {state_zip}"
+
+
+def format_list_date(rng: random.Random, date: datetime) -> str:
+    """The archive's mix of date formats (and gaps)."""
+    roll = rng.random()
+    if roll < 0.55:
+        return f"{date.month}/{date.day}/{date.year}"
+    if roll < 0.85:
+        return date.strftime("%Y-%m-%d")
+    if roll < 0.92:
+        return f"{date.month}/{date.day}/{date.year % 100:02d}"
+    return rng.choice(['', '', '-'])
+
+
+def listing_values(seed: int, market: str, listing: int, first_seen: int, agents: list, pickers: tuple) -> dict:
+    """
+    A listing's attributes. They come from the listing's own seeded stream,
+    so every re-scrape repeats them without keeping listings in memory.
+    """
+    pick_agent, pick_camera = pickers
+    rng = random.Random(f"{seed}:{market}:{listing}")
+    _, cities, mls_base = MARKETS[market]
+    agent = agents[pick_agent(rng)]
+    address = make_address(rng, cities)
+    list_date = SCRAPE_START + timedelta(seconds=first_seen - rng.randrange(20 * 86400))
+    is_lp = rng.random() < agent['lp_rate']
+    camera = CAMERAS[LP_CAMERA if is_lp and rng.random() < 0.85 else pick_camera(rng)]
+    artist = ''
+    if camera[0] and not is_lp and agent['artist_tagged']:
+        artist = agent['photographer'] if rng.random() < 0.7 else f"{rng.choice(FIRST_NAMES)} Photo"
+    mls = str(mls_base + listing * 7 + rng.randrange(7))
+    if is_lp and rng.random() < LP_FILENAME_SHARE:
+        scraped = f"ListerPros_{mls}_{rng.randint(1, 40)}.jpg"
+    else:
+        scraped = f"{mls}_{rng.randint(1, 40)}.jpg" if rng.random() < 0.7 else ''
+    order_address = ''
+    if is_lp and not scraped.startswith('ListerPros'):
+        order_address = near_miss(rng, address) if rng.random() < LP_NEAR_MISS_SHARE else address
+    formatted = format_address(address)
+    return {
+        'agent': agent,
+        'mls': mls,
+        'price': int(rng.lognormvariate(13.0, 0.5)) // 1000 * 1000,
+        'address': address,
+        'formatted': formatted,
+        'canonical': canonicalize_address(formatted),
+        'camera': camera,
+        'lens': rng.choice(camera[2]),
+        'serial': str(rng.randint(10 ** 6, 10 ** 7 - 1)) if camera[0] else '',
+        'artist': artist,
+        'copyright': f"(c) {artist}" if artist and rng.random() < 0.5 else '',
+        'scraped': scraped,
+        'list_date': list_date,
+        'list_date_text': format_list_date(rng, list_date),
+        'order_address': order_address,
+        'order_date': list_date - timedelta(days=rng.randint(1, 10)),
+    }
+
+
+def listing_row(values: dict, seed: int, market: str, listing: int, scrape: int, seconds: int,
+                pick_status) -> list:
+    """One scrape of a listing as a CSV row. Re-scrapes move the status along and sometimes cut the price."""
+    rng = random.Random(f"{seed}:{market}:{listing}:{scrape}")
+    agent = values['agent']
+    camera = values['camera']
+    status = STATUSES[pick_status(rng)][0] if scrape else 'Active'
+    price = values['price']
+    if scrape and rng.random() < 0.3:
+        price = price * 97 // 100 // 1000 * 1000
+    mls = values['mls'] if rng.random() >= 0.03 else f"{values['mls']}.0"
+    # The feed's emails are occasionally upper-cased or padded
+    email = agent['email']
+    if email and rng.random() < 0.05:
+        email = email.upper() if rng.random() < 0.5 else f" {email.capitalize()}"
+    office = agent['office']
+    return [
+        (SCRAPE_START + timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S"),
+        mls, f"${price:,}", values['address'], status,
+        agent['name'], agent['first_name'], agent['phone'], email, agent['website'],
+        office['name'], office['phone'], office['email'], office['website'],
+        values['formatted'], f"{values['mls']}_1.jpg" if camera[0] else '',
+        values['artist'], values['copyright'], camera[0], camera[1],
+        values['lens'], values['serial'],
+        values['list_date'].strftime("%Y:%m:%d %H:%M:%S") if camera[0] else '',
+        values['scraped'], '', '', '',
+        values['list_date_text'], values['canonical'],
+    ]
+
+
+def generate_market(out_dir: Path, market: str, rows: int, seed: int, orders: list, preferred: dict) -> int:
+    """
+    Write one market's listings CSV with exactly `rows` data rows, in scrape
+    order. LP orders and preferred photographer agents are added to orders /
+    preferred. Returns the number of unique MLS numbers.
+    """
+    filename = MARKETS[market][0]
+    rng = random.Random(f"{seed}:{market}")
+    listings = max(int(rows / ROWS_PER_LISTING), 1)
+    agents = make_agents(rng, max(listings // LISTINGS_PER_AGENT, 10), market)
+    for agent in agents:
+        if agent['email'] and rng.random() < PREFERRED_SHARE:
+            preferred[agent['email']] = agent
+
+    # Long-tailed agent activity: a few agents list hundreds of homes
+    pickers = (weighted_picker([1 / (rank + 1) ** 0.8 for rank in range(len(agents))]),
+               weighted_picker([camera[3] for camera in CAMERAS]))
+    pick_status = weighted_picker([weight for _, weight in STATUSES])
+
+    # Every listing is scraped once; the remaining rows are re-scrapes
+    scrape_counts = [1] * listings
+    for _ in range(rows - listings):
+        scrape_counts[rng.randrange(listings)] += 1
+    events = []  # (seconds since SCRAPE_START, listing, scrape number, first seen)
+    for listing, scrapes in enumerate(scrape_counts):
+        first_seen = rng.randrange(HISTORY_DAYS * 86400)
+        seconds = first_seen
+        for scrape in range(scrapes):
+            events.append((seconds, listing, scrape, first_seen))
+            seconds += rng.randint(3, 30) * 86400
+    events.sort()
+
+    with open(out_dir / filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(LISTING_FIELDS)
+        for seconds, listing, scrape, first_seen in events:
+            values = listing_values(seed, market, listing, first_seen, agents, pickers)
+            if scrape == 0 and values['order_address']:
+                orders.append((values['order_date'], values['order_address']))
+            writer.writerow(listing_row(values, seed, market, listing, scrape, seconds, pick_status))
+    return listings
+
+
+def write_orders(out_dir: Path, orders: list, seed: int) -> int:
+    """listerpros_orders.csv: the LP orders plus orders for homes never scraped."""
+    rng = random.Random(f"{seed}:orders")
+    cities = [city for market in MARKETS.values() for city in market[1]]
+    noise = [(SCRAPE_START + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400)), make_address(rng, cities))
+             for _ in range(len(orders) // 3)]
+    rows = sorted(orders + noise)
+    with open(out_dir / "listerpros_orders.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ORDER_HEADERS)
+        for date, address in rows:
+            writer.writerow([date.strftime("%Y-%m-%d %H:%M:%S"), address, format_address(address), ''])
+    return len(rows)
+
+
+def write_preferred_photographers(out_dir: Path, preferred: dict, seed: int) -> int:
+    """preferred_photographers.csv: one row per agent (some with no preference yet)."""
+    rng = random.Random(f"{seed}:preferred")
+    with open(out_dir / "preferred_photographers.csv", 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PHOTOGRAPHER_HEADERS)
+        for email, agent in preferred.items():
+            photographer = agent['photographer'] if rng.random() < 0.8 else ''
+            writer.writerow([agent['name'], agent['name'], agent['first_name'], email, agent['phone'],
+                             agent['office']['name'], rng.randint(1, 400), photographer])
+    return len(preferred)
+
+
+def generate(out_dir: Path, rows: int, seed: int = DEFAULT_SEED, markets=None) -> dict:
+    """Write every synthetic CSV into out_dir. Returns {file name: data rows}."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    orders = []
+    preferred = {}
+    counts = {}
+    for market in markets or MARKETS:
+        generate_market(out_dir, market, rows, seed, orders, preferred)
+        counts[MARKETS[market][0]] = rows
+    counts['listerpros_orders.csv'] = write_orders(out_dir, orders, seed)
+    counts['preferred_photographers.csv'] = write_preferred_photographers(out_dir, preferred, seed)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic listings, orders and "
+                                                 "preferred photographer CSVs.")
+    parser.add_argument('--rows', type=parse_rows, default=SIZES['10k'], metavar='N',
+                        help=f"data rows per market listings CSV: {', '.join(SIZES)} or a number (default: 10k)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"random seed (default: {DEFAULT_SEED})")
+    parser.add_argument('--markets', default=','.join(MARKETS),
+                        help=f"comma-separated markets to generate (default: {','.join(MARKETS)})")
+    parser.add_argument('--out', type=Path, default=None,
+                        help="output directory (default: bench/data/<rows>)")
+    args = parser.parse_args()
+
+    markets = [market.strip() for market in args.markets.split(',') if market.strip()]
+    unknown = [market for market in markets if market not in MARKETS]
+    if unknown:
+        parser.error(f"unknown market(s): {', '.join(unknown)} (expected {', '.join(MARKETS)})")
+    out_dir = args.out or BENCH_DATA_DIR / size_label(args.rows)
+
+    print(f"[*] Generating {args.rows} rows per market (seed {args.seed}) into {out_dir}...")
+    for name, count in generate(out_dir, args.rows, args.seed, markets).items():
+        print(f"    {name}: {count} rows")
+
+
+if __name__ == "__main__":
+    main()
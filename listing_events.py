@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Listings Feed Store - Listing Event Store
+dedupe_by_mls keeps only each listing's newest row, so the outputs can't say
+what was on the market on a given day or how a listing's status and price
+moved. The event store keeps that history as an append-only log of per-MLS
+status/price changes, one partition per market under data/events/<market>/:
+
+- events.bin: one record per change, four unsigned LEB128 varints - days
+  since the previous event (delta-encoded dates, usually one byte), MLS id,
+  status id and price in whole dollars (0 = unknown).
+- mls.txt: the MLS number dictionary (id = line number), append-only.
+- meta.json: the status dictionary, counts, valid byte lengths, the
+  high-water timestamp of each source and the checkpoint list.
+- checkpoints/: every CHECKPOINT_EVERY events, the full state (status,
+  price and since-date of every MLS id), so an as-of query replays at most
+  that many events instead of the whole log.
+
+Events come from observations (timestamp, MLS number, status, price): one
+that changes a listing's status or price is appended as an event. Each
+source (the listing CSV, current_statuses.csv) keeps its own high-water
+timestamp and observations at or before it are skipped, so re-ingesting the
+same file adds nothing. The sources are separate because a scraper stamps
+its rows with its start time: a run finishing after a status snapshot was
+ingested must still be recorded. An observation dated before its listing's
+last event is stale and skipped, which keeps each listing's history in
+order.
+Writes past the lengths in meta.json (an interrupted run) are truncated on
+the next ingest.
+
+    python listing_events.py ingest
+    python listing_events.py as-of phoenix 2025-12-01 --status Active
+    python listing_events.py history phoenix 6950666
+    python listing_events.py stats
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import date, datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from listings_store import normalize_mls
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR / "data"
+EVENTS_DIR = DATA_DIR / "events"
+EVENTS_VERSION = 1
+CHECKPOINT_EVERY = 20000  # Events between full-state checkpoints
+TZ = ZoneInfo("America/Phoenix")
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Listing CSVs by partition (market) name
+LISTING_CSVS = {
+    'phoenix': DATA_DIR / "phoenix_listings.csv",
+    'tucson': DATA_DIR / "tucson_listings.csv",
+}
+CURRENT_STATUSES_PATH = DATA_DIR / "current_statuses.csv"
+
+# Observation sources, each with its own high-water timestamp
+LISTINGS_SOURCE = 'listings'
+STATUSES_SOURCE = 'current_statuses'
+
+
+def encode_varint(value: int, out: bytearray):
+    """Append an unsigned LEB128 varint."""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def iter_varints(data: bytes):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+
+def parse_day(text: str):
+    """Day number (date ordinal) of a 'YYYY-MM-DD...' timestamp or date, or None."""
+    try:
+        return date.fromisoformat(str(text)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def parse_price(text: str) -> int:
+    """Whole dollars from '$583,000' (0 if there's no number)."""
+    digits = ''.join(ch for ch in str(text or '').split('.')[0] if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+def now_timestamp() -> str:
+    return datetime.now(TZ).strftime(TIMESTAMP_FORMAT)
+
+
+def csv_observations(path: Path):
+    """Yield (timestamp, mls_number, status, price) for each row of a listing CSV."""
+    if not path.exists():
+        return
+    with open(path, newline='', encoding='utf-8', errors='ignore') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        try:
+            ts_col, mls_col, status_col, price_col = (header.index(field) for field in
+                                                      ('timestamp', 'mls_number', 'status', 'price'))
+        except ValueError:
+            return
+        width = max(ts_col, mls_col, status_col, price_col)
+        for values in reader:
+            if len(values) > width:
+                yield (values[ts_col].strip(), normalize_mls(values[mls_col]), values[status_col].strip(),
+                       parse_price(values[price_col]))
+
+
+def current_status_observations(rows: dict, timestamp: str = None):
+    """Observations from reconcile_statuses.read_current_statuses() rows ({mls: row}), all at `timestamp`."""
+    timestamp = timestamp or now_timestamp()
+    for mls, row in rows.items():
+        yield timestamp, mls, row.get('status', ''), parse_price(row.get('price'))
+
+
+class EventPartition:
+    """One market's event log."""
+
+    def __init__(self, market: str, root: Path = EVENTS_DIR):
+        self.market = market
+        self.dir = root / market
+        self.log_path = self.dir / "events.bin"
+        self.mls_path = self.dir / "mls.txt"
+        self.meta_path = self.dir / "meta.json"
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = None
+        if self.meta is None or self.meta.get('version') != EVENTS_VERSION:
+            self.meta = {
+                'version': EVENTS_VERSION,
+                'market': market,
+                'statuses': [],
+                'events': 0,
+                'bytes': 0,
+                'mls_count': 0,
+                'mls_bytes': 0,
+                'first_day': None,
+                'last_day': 0,
+                'high_water': {},
+                'checkpoints': [],
+            }
+        if isinstance(self.meta['high_water'], str):
+            # Stores from before per-source marks shared one
+            self.meta['high_water'] = dict.fromkeys((LISTINGS_SOURCE, STATUSES_SOURCE), self.meta['high_water'])
+        self.statuses = self.meta['statuses']
+        self.status_ids = {status: i for i, status in enumerate(self.statuses)}
+        self.mls = []
+        if self.meta['mls_bytes']:
+            with open(self.mls_path, 'rb') as f:
+                self.mls = f.read(self.meta['mls_bytes']).decode('utf-8').split('\n')[:-1]
+        self.mls_ids = {mls: i for i, mls in enumerate(self.mls)}
+
+    def __len__(self):
+        return self.meta['events']
+
+    def iter_events(self, offset: int = 0, day: int = 0):
+        """Yield (day, mls id, status id, price) from byte `offset` (whose previous event was on `day`)."""
+        if offset >= self.meta['bytes']:
+            return
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(self.meta['bytes'] - offset)
+        varints = iter_varints(data)
+        for delta, mls_id, status_id, price in zip(varints, varints, varints, varints):
+            day += delta
+            yield day, mls_id, status_id, price
+
+    def read_checkpoint(self, checkpoint: dict) -> dict:
+        """State {mls id: (status id, price, since day)} saved at a checkpoint."""
+        with open(self.dir / "checkpoints" / checkpoint['file'], 'rb') as f:
+            varints = iter_varints(f.read())
+        state = {}
+        for mls_id in range(checkpoint['mls_count']):
+            status = next(varints)
+            if status:
+                price, age = next(varints), next(varints)
+                state[mls_id] = (status - 1, price, checkpoint['day'] - age)
+        return state
+
+    def state_at(self, day: int = None) -> dict:
+        """State after every event up to and including `day` (all events if None)."""
+        checkpoints = [c for c in self.meta['checkpoints'] if day is None or c['day'] <= day]
+        if checkpoints:
+            state = self.read_checkpoint(checkpoints[-1])
+            events = self.iter_events(checkpoints[-1]['offset'], checkpoints[-1]['day'])
+        else:
+            state = {}
+            events = self.iter_events()
+        for event_day, mls_id, status_id, price in events:
+            if day is not None and event_day > day:
+                break
+            state[mls_id] = (status_id, price, event_day)
+        return state
+
+    def as_of(self, when, statuses=None) -> dict:
+        """
+        {mls_number: {'status', 'price', 'since'}} at the end of day `when`
+        (a date or 'YYYY-MM-DD'), optionally only listings in `statuses`.
+        """
+        day = when.toordinal() if isinstance(when, date) else parse_day(when)
+        if day is None:
+            raise ValueError(f"Not a date: {when!r}")
+        wanted = None if statuses is None else {self.status_ids.get(status) for status in statuses}
+        return {self.mls[mls_id]: {'status': self.statuses[status_id], 'price': price,
+                                   'since': date.fromordinal(since).isoformat()}
+                for mls_id, (status_id, price, since) in self.state_at(day).items()
+                if wanted is None or status_id in wanted}
+
+    def history(self, mls: str) -> list:
+        """Every event of one listing, oldest first (scans the log)."""
+        mls_id = self.mls_ids.get(normalize_mls(mls))
+        if mls_id is None:
+            return []
+        return [{'date': date.fromordinal(day).isoformat(), 'status': self.statuses[status_id], 'price': price}
+                for day, event_mls, status_id, price in self.iter_events() if event_mls == mls_id]
+
+    def ingest(self, observations, source: str = LISTINGS_SOURCE) -> int:
+        """
+        Append an event for each observation (timestamp, mls_number, status,
+        price) that changes its listing's status or price, in timestamp
+        order. Observations at or before the source's high-water timestamp,
+        or dated before their listing's last event, are skipped. Returns the
+        number of events added.
+        """
+        high_water = self.meta['high_water'].get(source, '')
+        fresh = sorted((obs for obs in observations
+                        if obs[0] > high_water and obs[1] and obs[2] and parse_day(obs[0]) is not None),
+                       key=lambda obs: obs[0])
+        if not fresh:
+            return 0
+
+        state = self.state_at()
+        recorded = dict(state)  # Before this batch, for the staleness check
+        log = bytearray()
+        new_mls = []
+        checkpoints = []
+        day = self.meta['last_day']
+        events = self.meta['events']
+        for timestamp, mls, status, price in fresh:
+            mls_id = self.mls_ids.get(mls)
+            if mls_id is None:
+                mls_id = self.mls_ids[mls] = len(self.mls)
+                self.mls.append(mls)
+                new_mls.append(mls)
+            status_id = self.status_ids.get(status)
+            if status_id is None:
+                status_id = self.status_ids[status] = len(self.statuses)
+                self.statuses.append(status)
+            if mls_id in recorded and parse_day(timestamp) < recorded[mls_id][2]:
+                continue  # Older than what another source already recorded
+            current = state.get(mls_id)
+            if current is not None:
+                price = price or current[1]  # An unknown price keeps the last one
+                if current[0] == status_id and current[1] == price:
+                    continue
+            event_day = max(parse_day(timestamp), day)
+            if self.meta['first_day'] is None:
+                self.meta['first_day'] = event_day
+            encode_varint(event_day - day, log)
+            encode_varint(mls_id, log)
+            encode_varint(status_id, log)
+            encode_varint(price, log)
+            day = event_day
+            state[mls_id] = (status_id, price, day)
+            events += 1
+            if events % CHECKPOINT_EVERY == 0:
+                checkpoints.append(self.make_checkpoint(state, events, self.meta['bytes'] + len(log), day))
+
+        self.meta['high_water'][source] = fresh[-1][0]
+        added = events - self.meta['events']
+        self.save(log, new_mls, checkpoints, events, day)
+        return added
+
+    def make_checkpoint(self, state: dict, events: int, offset: int, day: int) -> tuple:
+        data = bytearray()
+        for mls_id in range(len(self.mls)):
+            entry = state.get(mls_id)
+            if entry is None:
+                data.append(0)
+            else:
+                encode_varint(entry[0] + 1, data)
+                encode_varint(entry[1], data)
+                encode_varint(day - entry[2], data)
+        name = f"{events:010d}.bin"
+        return {'events': events, 'offset': offset, 'day': day, 'mls_count': len(self.mls), 'file': name}, data
+
+    def save(self, log: bytearray, new_mls: list, checkpoints: list, events: int, day: int):
+        """Append to the log and MLS dictionary, then commit the new lengths in meta.json."""
+        (self.dir / "checkpoints").mkdir(parents=True, exist_ok=True)
+        for path, valid in ((self.log_path, self.meta['bytes']), (self.mls_path, self.meta['mls_bytes'])):
+            if path.exists() and path.stat().st_size > valid:
+                os.truncate(path, valid)  # Drop an interrupted run's partial write
+        with open(self.log_path, 'ab') as f:
+            f.write(log)
+        mls_data = ''.join(mls + '\n' for mls in new_mls).encode('utf-8')
+        with open(self.mls_path, 'ab') as f:
+            f.write(mls_data)
+        for checkpoint, data in checkpoints:
+            with open(self.dir / "checkpoints" / checkpoint['file'], 'wb') as f:
+                f.write(data)
+            self.meta['checkpoints'].append(checkpoint)
+
+        self.meta.update(events=events, bytes=self.meta['bytes'] + len(log), mls_count=len(self.mls),
+                         mls_bytes=self.meta['mls_bytes'] + len(mls_data), last_day=day)
+        tmp_path = self.meta_path.with_name(self.meta_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2)
+        tmp_path.replace(self.meta_path)
+
+    def stats(self) -> dict:
+        first, last = self.meta['first_day'], self.meta['last_day']
+        return {
+            'events': self.meta['events'],
+            'listings': self.meta['mls_count'],
+            'statuses': self.statuses,
+            'bytes': self.meta['bytes'],
+            'checkpoints': len(self.meta['checkpoints']),
+            'first_date': date.fromordinal(first).isoformat() if first else None,
+            'last_date': date.fromordinal(last).isoformat() if last else None,
+            'high_water': self.meta['high_water'],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing status/price event store.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('ingest', help="record changes from the listing CSVs and current_statuses.csv")
+    as_of = sub.add_parser('as-of', help="listings and their status/price at the end of a date")
+    as_of.add_argument('market', choices=list(LISTING_CSVS))
+    as_of.add_argument('date', help="YYYY-MM-DD")
+    as_of.add_argument('--status', action='append', help="only listings with this status (repeatable)")
+    as_of.add_argument('--json', action='store_true', help="print the listings as JSON instead of counts")
+    history = sub.add_parser('history', help="one listing's status/price events")
+    history.add_argument('market', choices=list(LISTING_CSVS))
+    history.add_argument('mls_number')
+    sub.add_parser('stats', help="per-market event counts and sizes")
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        from reconcile_statuses import read_current_statuses
+        current = read_current_statuses(CURRENT_STATUSES_PATH) if CURRENT_STATUSES_PATH.exists() else {}
+        for market, csv_path in LISTING_CSVS.items():
+            partition = EventPartition(market)
+            added = partition.ingest(csv_observations(csv_path))
+            added += partition.ingest(current_status_observations(current.get(market, {})), STATUSES_SOURCE)
+            print(f"{market}: {added} new events ({len(partition)} total, {partition.meta['bytes'] / 1024:.1f} KB)")
+    elif args.command == 'as-of':
+        listings = EventPartition(args.market).as_of(args.date, args.status)
+        if args.json:
+            print(json.dumps(listings, indent=2))
+        else:
+            counts = {}
+            for listing in listings.values():
+                counts[listing['status']] = counts.get(listing['status'], 0) + 1
+            print(f"{args.market} as of {args.date}: {len(listings)} listings")
+            for status, count in sorted(counts.items(), key=lambda item: -item[1]):
+                print(f"  {status}: {count}")
+    elif args.command == 'history':
+        for event in EventPartition(args.market).history(args.mls_number):
+            print(f"{event['date']}  {event['status']:<12} ${event['price']:,}")
+    else:
+        for market in LISTING_CSVS:
+            print(f"{market}: {json.dumps(EventPartition(market).stats())}")
+
+
+if __name__ == "__main__":
+    main()
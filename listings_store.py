@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Listings Feed Store - SQLite Listings Store (optional)
+A local alternative to rewriting and re-reading the listing CSVs in full.
+
+One SQLite file (WAL mode, so process_data.py can read while a scraper
+writes) holds:
+- listings: one row per (market, mls_number). Writes are upserts that keep
+  dedupe_by_mls's rule - the first-seen position (id) with the newest
+  timestamp's values - and stamp the rows they change with a new store
+  revision, so incremental readers fetch only rows past their revision.
+- lp_orders / preferred_photographers: the lookup CSVs, re-imported only
+  when the CSV changes.
+- runs: one row per process_data.py run.
+
+The scrapers write into it when LISTINGS_STORE is set, and
+`process_data.py --store` reads from it. The CSVs stay the published format:
+
+    python listings_store.py import phoenix data/phoenix_listings.csv
+    python listings_store.py export phoenix data/phoenix_listings.csv
+    python listings_store.py stats
+"""
+
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from address_canon import CANONICAL_FIELD, canonicalize_address
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_STORE_PATH = SCRIPT_DIR / "data" / "listings.db"
+STORE_VERSION = 1
+
+# Listing columns, in CSV export order (the scrapers' fields plus list_date)
+LISTING_COLUMNS = [
+    'timestamp', 'mls_number', 'price', 'listing_address', 'status',
+    'agent_name', 'agent_first_name', 'agent_phone', 'agent_email', 'agent_website',
+    'office_name', 'office_phone', 'office_email', 'office_website',
+    'formatted_address', 'image_filename',
+    'exif_artist', 'exif_copyright', 'exif_make', 'exif_model',
+    'exif_lens_model', 'exif_body_serial_number', 'exif_date_time_digitized',
+    'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer',
+    'list_date', CANONICAL_FIELD
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    market TEXT NOT NULL,
+    {', '.join(f"{column} TEXT NOT NULL DEFAULT ''" for column in LISTING_COLUMNS)},
+    revision INTEGER NOT NULL,
+    UNIQUE (market, mls_number)
+);
+CREATE INDEX IF NOT EXISTS listings_agent_email ON listings (market, agent_email);
+CREATE INDEX IF NOT EXISTS listings_formatted_address ON listings (formatted_address);
+CREATE INDEX IF NOT EXISTS listings_list_date ON listings (market, list_date);
+CREATE INDEX IF NOT EXISTS listings_revision ON listings (market, revision);
+
+CREATE TABLE IF NOT EXISTS lp_orders (
+    canonical_address TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS preferred_photographers (
+    agent_email TEXT PRIMARY KEY,
+    photographer TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    finished TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    details TEXT NOT NULL
+);
+"""
+
+# Keep-newest upsert: an existing row is only replaced by a newer timestamp
+UPSERT_SQL = (
+    f"INSERT INTO listings (market, {', '.join(LISTING_COLUMNS)}, revision) "
+    f"VALUES ({', '.join('?' * (len(LISTING_COLUMNS) + 2))}) "
+    f"ON CONFLICT (market, mls_number) DO UPDATE SET "
+    f"{', '.join(f'{column} = excluded.{column}' for column in LISTING_COLUMNS)}, "
+    f"revision = excluded.revision "
+    f"WHERE excluded.timestamp > listings.timestamp"
+)
+
+SELECT_COLUMNS = ', '.join(LISTING_COLUMNS)
+
+
+def normalize_mls(mls: str) -> str:
+    """Normalize MLS number (remove .0 suffix if present)."""
+    mls = str(mls or '').strip()
+    if mls.endswith('.0'):
+        mls = mls[:-2]
+    return mls
+
+
+def listing_values(market: str, row: dict, revision: int):
+    """Upsert parameters for one listing dict, or None if it has no MLS number."""
+    values = {column: str(row.get(column) or '').strip() for column in LISTING_COLUMNS}
+    values['mls_number'] = normalize_mls(values['mls_number'])
+    if not values['mls_number']:
+        return None
+    values['agent_email'] = values['agent_email'].lower()
+    if not values[CANONICAL_FIELD]:
+        values[CANONICAL_FIELD] = canonicalize_address(values['formatted_address'])
+    return (market, *values.values(), revision)
+
+
+class ListingsStore:
+    """A connection to the SQLite store. Use as a context manager."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A writer holding the lock makes others wait (WAL readers never do)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if self.meta('version', str(STORE_VERSION)) != str(STORE_VERSION):
+            raise ValueError(f"{self.path} has store version {self.meta('version')}, expected {STORE_VERSION}")
+        with self.conn:
+            self.set_meta('version', str(STORE_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def meta(self, key: str, default: str = None) -> str:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                          "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def revision(self) -> int:
+        """The store revision: bumped by every write that changes listings."""
+        return int(self.meta('revision', '0'))
+
+    # -- Listings -------------------------------------------------------------
+
+    def upsert_listings(self, market: str, rows) -> tuple:
+        """
+        Insert or update listing dicts for a market in one transaction.
+        Returns (inserted, updated); rows older than the stored copy are ignored.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            revision = self.revision() + 1
+            before = self.count(market)
+            changes = self.conn.total_changes
+            params = (listing_values(market, row, revision) for row in rows)
+            self.conn.executemany(UPSERT_SQL, (p for p in params if p is not None))
+            changed = self.conn.total_changes - changes
+            inserted = self.count(market) - before
+            if changed:
+                self.set_meta('revision', str(revision))
+        return inserted, changed - inserted
+
+    def count(self, market: str) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM listings WHERE market = ?", (market,)).fetchone()[0]
+
+    def snapshot(self, market: str, since_revision: int = None) -> tuple:
+        """
+        (revision, rows) read in one transaction: the market's listings as
+        value lists in LISTING_COLUMNS order, first-seen order. With
+        since_revision, only rows changed after it (via the revision index).
+        """
+        with self.conn:
+            self.conn.execute("BEGIN")
+            revision = self.revision()
+            if since_revision is None:
+                cursor = self.conn.execute(
+                    f"SELECT {SELECT_COLUMNS} FROM listings WHERE market = ? ORDER BY id", (market,))
+            else:
+                cursor = self.conn.execute(
+                    f"SELECT {SELECT_COLUMNS} FROM listings WHERE market = ? AND revision > ? ORDER BY id",
+                    (market, since_revision))
+            rows = [list(row) for row in cursor]
+        return revision, rows
+
+    def _dicts(self, sql: str, params: tuple) -> list:
+        return [dict(zip(LISTING_COLUMNS, row)) for row in self.conn.execute(sql, params)]
+
+    def listing(self, market: str, mls_number: str):
+        """One listing by MLS number, or None."""
+        rows = self._dicts(f"SELECT {SELECT_COLUMNS} FROM listings WHERE market = ? AND mls_number = ?",
+                           (market, normalize_mls(mls_number)))
+        return rows[0] if rows else None
+
+    def agent_listings(self, market: str, email: str) -> list:
+        """Every listing of one agent (agent_email index)."""
+        return self._dicts(f"SELECT {SELECT_COLUMNS} FROM listings WHERE market = ? AND agent_email = ? ORDER BY id",
+                           (market, str(email or '').lower().strip()))
+
+    def listings_at_address(self, formatted_address: str) -> list:
+        """Listings in any market at one formatted address (formatted_address index)."""
+        return self._dicts(f"SELECT {SELECT_COLUMNS} FROM listings WHERE formatted_address = ? ORDER BY id",
+                           (formatted_address,))
+
+    def listings_between(self, market: str, start: str, end: str) -> list:
+        """Listings whose list_date (YYYY-MM-DD) is in [start, end] (list_date index)."""
+        return self._dicts(f"SELECT {SELECT_COLUMNS} FROM listings WHERE market = ? AND list_date BETWEEN ? AND ? "
+                           f"ORDER BY id", (market, start, end))
+
+    def import_csv(self, market: str, path: Path) -> tuple:
+        """Upsert a listings CSV written with LISTING_COLUMNS-style headers."""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [name.lower().strip().replace(' ', '_') for name in reader.fieldnames or []]
+            return self.upsert_listings(market, reader)
+
+    def export_csv(self, market: str, path: Path) -> int:
+        """Write a market's listings as a CSV (first-seen order). Returns the row count."""
+        path = Path(path)
+        tmp_path = path.with_suffix('.tmp')
+        _, rows = self.snapshot(market)
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(LISTING_COLUMNS)
+            writer.writerows(rows)
+        tmp_path.replace(path)
+        return len(rows)
+
+    # -- Lookups --------------------------------------------------------------
+
+    def lookups_sha256(self, name: str) -> str:
+        return self.meta(f'lookups_sha256:{name}', '')
+
+    def replace_lp_orders(self, addresses, sha256: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM lp_orders")
+            self.conn.executemany("INSERT OR IGNORE INTO lp_orders (canonical_address) VALUES (?)",
+                                  ((address,) for address in addresses))
+            self.set_meta('lookups_sha256:lp_orders', sha256)
+
+    def replace_preferred_photographers(self, mapping: dict, sha256: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM preferred_photographers")
+            self.conn.executemany("INSERT INTO preferred_photographers (agent_email, photographer) VALUES (?, ?)",
+                                  mapping.items())
+            self.set_meta('lookups_sha256:preferred_photographers', sha256)
+
+    def lp_addresses(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT canonical_address FROM lp_orders")}
+
+    def photographer_map(self) -> dict:
+        return dict(self.conn.execute("SELECT agent_email, photographer FROM preferred_photographers"))
+
+    def is_lp_address(self, canonical_address: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM lp_orders WHERE canonical_address = ?",
+                                 (canonical_address,)).fetchone() is not None
+
+    def preferred_photographer(self, email: str) -> str:
+        row = self.conn.execute("SELECT photographer FROM preferred_photographers WHERE agent_email = ?",
+                                (str(email or '').lower().strip(),)).fetchone()
+        return row[0] if row else ''
+
+    # -- Run history ----------------------------------------------------------
+
+    def record_run(self, started: str, details: dict, revision: int = None):
+        """Append a processing run (details is any JSON-serializable dict)."""
+        with self.conn:
+            self.conn.execute("INSERT INTO runs (started, finished, revision, details) VALUES (?, ?, ?, ?)",
+                              (started, datetime.now(timezone.utc).isoformat(),
+                               self.revision() if revision is None else revision,
+                               json.dumps(details, sort_keys=True)))
+
+    def runs(self, limit: int = 10) -> list:
+        cursor = self.conn.execute("SELECT started, finished, revision, details FROM runs ORDER BY id DESC LIMIT ?",
+                                   (limit,))
+        return [{'started': started, 'finished': finished, 'revision': revision, **json.loads(details)}
+                for started, finished, revision, details in cursor]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the optional SQLite listings store.")
+    parser.add_argument('--store', type=Path, default=DEFAULT_STORE_PATH, help=f"store path (default: {DEFAULT_STORE_PATH})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('import', "upsert a market's listings CSV into the store"),
+                            ('export', "write a market's listings from the store as CSV")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('market')
+        command.add_argument('csv', type=Path)
+    commands.add_parser('stats', help="show listing counts, the revision and recent runs")
+    args = parser.parse_args(argv)
+
+    with ListingsStore(args.store) as store:
+        if args.command == 'import':
+            inserted, updated = store.import_csv(args.market, args.csv)
+            print(f"[*] {args.csv.name}: {inserted} new, {updated} updated {args.market} listings "
+                  f"(revision {store.revision()})")
+        elif args.command == 'export':
+            count = store.export_csv(args.market, args.csv)
+            print(f"[*] Wrote {count} {args.market} listings to {args.csv}")
+        else:
+            print(f"[*] {store.path} (revision {store.revision()})")
+            for market, count in store.conn.execute("SELECT market, COUNT(*) FROM listings GROUP BY market"):
+                print(f"    {market}: {count} listings")
+            for run in store.runs(5):
+                print(f"    run {run['started']} (revision {run['revision']})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
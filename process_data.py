@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Listings Feed Store - Data Processor
-Processes Phoenix and Tucson listing CSVs into JSON output files.
+Processes the market listing CSVs (Phoenix and Tucson, see MARKETS) into JSON
+output files. Each market's pipeline runs in its own worker process.
 
 Outputs (market-segmented):
 - phx-internal/verified_agents.json: Phoenix agents (for Community Photos verification)
@@ -10,18 +11,65 @@ Outputs (market-segmented):
 - tuc-internal/verified_agents.json: Tucson agents
 - tuc-internal/photographers.json: Tucson photo metadata analysis
 - tuc-internal/customer_loyalty.json: Tucson per-agent ListerPros usage stats
+- <market>-internal/photographer_analytics.json: photographer page analytics
 - output/listings_summary.json: Combined summary stats
 
 Run locally or via GitHub Actions when CSVs are updated.
 """
 
+import argparse
+import base64
+import contextlib
+import cProfile
 import csv
+import gzip
+import hashlib
+import heapq
+import io
 import json
+import os
+import pickle
+import pstats
 import re
-from datetime import datetime, timezone
+import resource
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, timezone
 from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 
+from address_canon import CANONICAL_FIELD, canonicalize_address, parse_address, row_canonical_address
+from listings_store import DEFAULT_STORE_PATH, LISTING_COLUMNS, ListingsStore
+from listing_events import (EVENTS_DIR, STATUSES_SOURCE, EventPartition, csv_observations,
+                            current_status_observations)
+from reconcile_statuses import (CSV_ERRORS, CURRENT_STATUSES_PATH, last_rewrite, print_reconciliation,
+                                read_current_statuses, read_rewrites, reconcile_statuses)
+
+try:
+    import orjson  # Optional: much faster JSON output (pip install orjson)
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # Optional: .br siblings of published outputs (pip install brotli)
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow as pa  # Optional: columnar listings archive, --archive (pip install pyarrow)
+    import pyarrow.dataset as pads
+except ImportError:
+    pa = pads = None
+
 # Paths
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR / "data"
@@ -29,10 +77,17 @@ OUTPUT_DIR = SCRIPT_DIR / "output"
 PHX_OUTPUT_DIR = SCRIPT_DIR / "phx-internal"
 TUC_OUTPUT_DIR = SCRIPT_DIR / "tuc-internal"
 
+# Market registry - each market's name, display label, input CSV and output
+# directory. Adding a market is a new entry here.
+MARKETS = [
+    {'name': 'phoenix', 'label': 'Phoenix', 'input': DATA_DIR / "phoenix_listings.csv", 'output_dir': PHX_OUTPUT_DIR},
+    {'name': 'tucson', 'label': 'Tucson', 'input': DATA_DIR / "tucson_listings.csv", 'output_dir': TUC_OUTPUT_DIR},
+]
+
 # Ensure output directories exist
 OUTPUT_DIR.mkdir(exist_ok=True)
-PHX_OUTPUT_DIR.mkdir(exist_ok=True)
-TUC_OUTPUT_DIR.mkdir(exist_ok=True)
+for _market in MARKETS:
+    _market['output_dir'].mkdir(exist_ok=True)
 
 # Standard field names (normalize across different CSV header variations)
 STANDARD_FIELDS = [
@@ -43,7 +98,7 @@ STANDARD_FIELDS = [
     'exif_artist', 'exif_copyright', 'exif_make', 'exif_model',
     'exif_lens_model', 'exif_body_serial_number', 'exif_date_time_digitized',
     'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer',
-    'list_date'
+    'list_date', CANONICAL_FIELD
 ]
 
 # Header mappings (various CSV headers -> standard field names)
@@ -83,18 +138,9 @@ HEADER_MAP = {
     'preferred photographer': 'preferred_photographer',
     'list_date': 'list_date',
     'list date': 'list_date',
+    'canonical address': CANONICAL_FIELD,
 }
 
-# Address normalization - same as Google Apps Script
-ABBREVIATION_MAP = {
-    'st': 'street', 'str': 'street', 'rd': 'road', 'dr': 'drive', 'av': 'avenue',
-    'ave': 'avenue', 'ln': 'lane', 'ct': 'court', 'pl': 'place', 'blvd': 'boulevard',
-    'pkwy': 'parkway', 'cir': 'circle', 'trl': 'trail', 'wy': 'way',
-    'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
-    'ne': 'northeast', 'nw': 'northwest', 'se': 'southeast', 'sw': 'southwest'
-}
-
-
 def normalize_header(header: str) -> str:
     """Convert CSV header to standard field name."""
     normalized = header.lower().strip()
@@ -118,10 +164,12 @@ def normalize_email(email: str) -> str:
     return email.lower().strip()
 
 
+@lru_cache(maxsize=8192)
 def parse_list_date(date_str: str) -> str:
     """
     Parse list_date from various formats and return ISO format (YYYY-MM-DD).
     Returns empty string if parsing fails.
+    Memoized - there are only a few thousand distinct date strings per market.
     """
     if not date_str:
         return ''
@@ -161,64 +209,285 @@ def normalize_mls(mls: str) -> str:
 def normalize_address(address: str) -> str:
     """
     Normalize an address for matching - mirrors Google Apps Script logic.
-    Expands abbreviations and standardizes formatting.
+    Expands abbreviations and standardizes formatting (see address_canon).
     """
-    if not address:
-        return ''
+    return canonicalize_address(address)
+
+
+# =============================================================================
+# COLUMNAR LISTING TABLE
+# Listings are stored column-wise instead of as one dict per row. Each column
+# dictionary-encodes its values (a list of distinct values plus an array of
+# 32-bit codes), so strings that repeat tens of thousands of times - office
+# names, EXIF make/model, status, agent email - are stored once per column.
+# ListingRow is a __slots__ view that reads and writes like the old row dict,
+# so the pipeline functions work unchanged on either representation.
+# =============================================================================
+
+class Column:
+    """A dictionary-encoded column: distinct values plus one code per row."""
+
+    __slots__ = ('values', 'codes', '_lookup')
+
+    def __init__(self, size: int = 0):
+        # Code 0 is always '' so a column added after loading starts out blank
+        self.values = ['']
+        self.codes = array('I', [0]) * size
+        self._lookup = None
+
+    def encode(self, value) -> int:
+        """Return the code for a value, adding it to the dictionary if new."""
+        lookup = self._lookup
+        if lookup is None:
+            lookup = self._lookup = {v: i for i, v in enumerate(self.values)}
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def take(self, indices) -> 'Column':
+        """Build a new column from the given row indices, keeping only used values."""
+        old_codes = self.codes
+        old_values = self.values
+        column = Column()
+        remap = {0: 0}
+        values = column.values
+        codes = column.codes
+        for i in indices:
+            old = old_codes[i]
+            code = remap.get(old)
+            if code is None:
+                code = remap[old] = len(values)
+                values.append(old_values[old])
+            codes.append(code)
+        return column
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __setitem__(self, i, value):
+        self.codes[i] = self.encode(value)
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getstate__(self):
+        # The lookup index is rebuilt on demand, so it is not persisted
+        return self.values, self.codes
+
+    def __setstate__(self, state):
+        self.values, self.codes = state
+        self._lookup = None
+
+
+class ListingRow:
+    """A dict-like view of one row of a ListingTable."""
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: 'ListingTable', index: int):
+        self.table = table
+        self.index = index
+
+    def get(self, field: str, default=None):
+        column = self.table.columns.get(field)
+        if column is None:
+            return default
+        return column.values[column.codes[self.index]]
+
+    def __getitem__(self, field: str):
+        column = self.table.columns[field]
+        return column.values[column.codes[self.index]]
+
+    def __setitem__(self, field: str, value):
+        column = self.table.columns.get(field)
+        if column is None:
+            column = self.table.add_column(field)
+        column[self.index] = value
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.table.columns
+
+    def keys(self):
+        return self.table.columns.keys()
+
+    def to_dict(self) -> dict:
+        i = self.index
+        return {field: column.values[column.codes[i]] for field, column in self.table.columns.items()}
+
+
+class ListingTable:
+    """
+    Column-oriented table of listing rows.
 
-    # Lowercase and clean
-    cleaned = str(address).strip().lower()
+    Iterating yields ListingRow views, and table[i] returns the view for row i,
+    so code written against a list of row dicts works unchanged. Whole-column
+    scans should use column() instead, which avoids per-row view objects.
+    """
 
-    # Remove punctuation
-    cleaned = re.sub(r'[.,\/#!$%\^&\*;:{}=\-_`~()]', '', cleaned)
+    def __init__(self, fields=()):
+        self.columns = {field: Column() for field in fields}
+        self.size = 0
+
+    @property
+    def fields(self) -> list:
+        return list(self.columns)
+
+    def add_column(self, field: str) -> Column:
+        """Add a column of blank values (no-op if it already exists)."""
+        if field not in self.columns:
+            self.columns[field] = Column(self.size)
+        return self.columns[field]
+
+    def append_values(self, values: list):
+        """Append a row given as values in self.fields order."""
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        self.size += 1
+
+    def append(self, row: dict):
+        """Append a row given as a dict (unknown fields become new columns)."""
+        for field in row:
+            if field not in self.columns:
+                self.add_column(field)
+        for field, column in self.columns.items():
+            column.append(row.get(field, ''))
+        self.size += 1
+
+    def set_row(self, i: int, row: dict):
+        """Overwrite row i from a dict (fields it lacks are blanked)."""
+        for field in row:
+            if field not in self.columns:
+                self.add_column(field)
+        for field, column in self.columns.items():
+            column[i] = row.get(field, '')
+
+    def column(self, field: str) -> list:
+        """Decode a whole column to a list (blank values if the column is missing)."""
+        column = self.columns.get(field)
+        if column is None:
+            return [''] * self.size
+        return list(column)
+
+    def set_column(self, field: str, values):
+        """Replace (or add) a whole column from an iterable of values."""
+        column = Column()
+        encode = column.encode
+        column.codes = array('I', [encode(value) for value in values])
+        if len(column.codes) != self.size:
+            raise ValueError(f"Column '{field}' has {len(column.codes)} values, table has {self.size} rows")
+        self.columns[field] = column
+
+    def take(self, indices) -> 'ListingTable':
+        """Build a new, compacted table holding only the given rows (in order)."""
+        indices = list(indices)
+        table = ListingTable()
+        table.columns = {field: column.take(indices) for field, column in self.columns.items()}
+        table.size = len(indices)
+        return table
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield ListingRow(self, i)
+
+    def iter_dicts(self):
+        """Yield each row as a fresh plain dict (fast read-only scans)."""
+        fields = list(self.columns)
+        for values in zip(*self.columns.values()):
+            yield dict(zip(fields, values))
+
+    def __getitem__(self, i: int) -> ListingRow:
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('ListingTable index out of range')
+        return ListingRow(self, i)
+
+
+def csv_field_positions(headers: list) -> dict:
+    """Standard field -> CSV column position (later duplicate headers win, as with DictReader)."""
+    positions = {}
+    for i, header in enumerate(headers):
+        positions[normalize_header(header)] = i
+    return positions
+
+
+def csv_row_parser(positions: dict, fields: list, width: int):
+    """
+    Return parse(values): a raw CSV value list (laid out by a header of
+    `width` columns, see csv_field_positions) normalized into a list in
+    `fields` order, or None for a blank row or one without an MLS number.
+    """
+    columns = [positions.get(field) for field in fields]
+    mls_idx = fields.index('mls_number')
+    email_idx = fields.index('agent_email') if 'agent_email' in positions else None
 
-    # Split into words and expand abbreviations
-    parts = cleaned.split()
-    normalized_parts = []
-    for part in parts:
-        # Check if this word is an abbreviation
-        expanded = ABBREVIATION_MAP.get(part, part)
-        normalized_parts.append(expanded)
+    def parse(values: list):
+        if not values:
+            return None
+        if len(values) < width:
+            values += [''] * (width - len(values))
 
-    # Join with single spaces
-    return ' '.join(normalized_parts)
+        row = [clean_value(values[i]) if i is not None else '' for i in columns]
 
+        if not row[mls_idx]:
+            return None
 
-def read_csv_file(filepath: Path) -> list:
-    """Read a CSV file and return normalized rows."""
-    rows = []
+        row[mls_idx] = normalize_mls(row[mls_idx])
 
-    if not filepath.exists():
-        print(f"  Warning: {filepath} not found")
-        return rows
+        if email_idx is not None and row[email_idx]:
+            row[email_idx] = normalize_email(row[email_idx])
+        return row
+    return parse
 
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        reader = csv.DictReader(f)
-        header_mapping = {h: normalize_header(h) for h in reader.fieldnames or []}
 
-        for row in reader:
-            normalized_row = {}
-            for original_header, value in row.items():
-                standard_field = header_mapping.get(original_header, original_header)
-                normalized_row[standard_field] = clean_value(value)
+def append_csv_rows(table: 'ListingTable', headers: list, reader) -> 'ListingTable':
+    """
+    Normalize raw CSV value lists from reader and append them to table.
+    headers is the CSV header row the values are laid out by.
+    """
+    positions = csv_field_positions(headers)
+    for field in positions:
+        table.add_column(field)
+    if 'mls_number' not in positions:
+        return table
 
-            if not normalized_row.get('mls_number'):
-                continue
+    parse = csv_row_parser(positions, table.fields, len(headers))
+    for values in reader:
+        row = parse(values)
+        if row is not None:
+            table.append_values(row)
 
-            normalized_row['mls_number'] = normalize_mls(normalized_row['mls_number'])
+    return table
 
-            if normalized_row.get('agent_email'):
-                normalized_row['agent_email'] = normalize_email(normalized_row['agent_email'])
 
-            rows.append(normalized_row)
+def read_csv_file(filepath: Path) -> 'ListingTable':
+    """Read a CSV file and return normalized rows as a ListingTable."""
+    if not filepath.exists():
+        print(f"  Warning: {filepath} not found")
+        return ListingTable(STANDARD_FIELDS)
 
-    return rows
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        reader = csv.reader(f)
+        headers = next(reader, [])
+        return append_csv_rows(ListingTable(), headers, reader)
 
 
 def read_listerpros_orders(filepath: Path) -> set:
     """
     Read ListerPros order addresses and return normalized address set.
-    Expected CSV format: at minimum a 'Formatted Address' or 'formatted_address' column
+    Expected CSV format: at minimum a 'Formatted Address' or 'formatted_address' column.
+    A 'canonical_address' column, when present, is used as-is.
     """
     addresses = set()
 
@@ -240,13 +509,15 @@ def read_listerpros_orders(filepath: Path) -> set:
         if not address_col:
             print(f"  Warning: No address column found in {filepath}")
             return addresses
+        canonical_col = headers_lower.get('canonical address') or headers_lower.get(CANONICAL_FIELD)
 
         for row in reader:
-            addr = row.get(address_col, '')
-            if addr:
-                normalized = normalize_address(addr)
-                if normalized:
-                    addresses.add(normalized)
+            normalized = row.get(canonical_col, '') if canonical_col else ''
+            if not normalized:
+                addr = row.get(address_col, '')
+                normalized = normalize_address(addr) if addr else ''
+            if normalized:
+                addresses.add(normalized)
 
     return addresses
 
@@ -282,23 +553,41 @@ def read_preferred_photographers(filepath: Path) -> dict:
     return mapping
 
 
-def dedupe_by_mls(rows: list) -> list:
-    """Deduplicate rows by MLS number, keeping the most recent."""
-    seen = {}
-    for row in rows:
-        mls = row.get('mls_number', '')
+def column_values(rows, field: str) -> list:
+    """All values of one field, read column-wise when rows is a ListingTable."""
+    if isinstance(rows, ListingTable):
+        return rows.column(field)
+    return [row.get(field, '') for row in rows]
+
+
+def dedupe_by_mls(rows):
+    """
+    Deduplicate rows by MLS number, keeping the most recent.
+    A ListingTable comes back as a new compacted ListingTable; a list as a list.
+    """
+    seen = {}  # mls -> (row index, timestamp)
+    timestamps = column_values(rows, 'timestamp')
+    for idx, mls in enumerate(column_values(rows, 'mls_number')):
         if not mls:
             continue
 
-        if mls not in seen:
-            seen[mls] = row
-        else:
-            existing_ts = seen[mls].get('timestamp', '')
-            new_ts = row.get('timestamp', '')
-            if new_ts > existing_ts:
-                seen[mls] = row
+        new_ts = timestamps[idx]
+        existing = seen.get(mls)
+        if existing is None or new_ts > existing[1]:
+            seen[mls] = (idx, new_ts)
+
+    indices = [idx for idx, _ in seen.values()]
+    if isinstance(rows, ListingTable):
+        return rows.take(indices)
+    return [rows[idx] for idx in indices]
+
 
-    return list(seen.values())
+LP_FLAG_VALUES = ('yes', 'true', '1')
+
+
+def is_lp_flagged(row: dict) -> bool:
+    """Check the raw lp_flag column (address/filename match or inference)."""
+    return row.get('lp_flag', '').lower() in LP_FLAG_VALUES
 
 
 def check_lp_in_filename(filename: str) -> bool:
@@ -318,6 +607,7 @@ def check_lp_in_filename(filename: str) -> bool:
 LP_VALID_CAMERAS = {'SONY ILCE-7M4', 'Sony ILCE-7M4', 'ILCE-7M4'}
 
 
+@lru_cache(maxsize=4096)
 def is_valid_lp_camera(camera: str) -> bool:
     """
     Check if the camera model is valid for an LP order.
@@ -329,6 +619,8 @@ def is_valid_lp_camera(camera: str) -> bool:
 
     Returns False if:
     - Camera is any other model (iPhone, Canon, etc. = NOT shot by LP)
+
+    Memoized - a market has only a few hundred distinct camera strings.
     """
     if not camera or camera.strip() in ('', '-'):
         # Blank camera = metadata stripped, could be LP
@@ -368,188 +660,555 @@ def infer_lp_for_loyal_agents(rows: list) -> list:
     clearly uses ListerPros consistently.
     """
     # First pass: calculate LP stats per agent
-    agent_stats = defaultdict(lambda: {
-        'total': 0,
-        'lp_confirmed': 0,
-        'indices': [],  # Track row indices for this agent
-    })
-
+    agent_stats = {}
+    agent_indices = defaultdict(list)  # Track row indices for each agent
     for idx, row in enumerate(rows):
-        email = row.get('agent_email', '')
-        if not email or '@' not in email:
-            continue
+        email = count_agent_lp(agent_stats, row)
+        if email:
+            agent_indices[email].append(idx)
+
+    # Identify high-loyalty agents (50%+ LP rate)
+    high_loyalty_agents = loyal_agent_emails(agent_stats)
 
-        agent_stats[email]['total'] += 1
-        agent_stats[email]['indices'].append(idx)
+    # Second pass: infer LP for high-loyalty agents' unmatched orders
+    inferred_count = 0
+    for email in high_loyalty_agents:
+        for idx in agent_indices[email]:
+            inferred_count += infer_lp(rows[idx])
 
-        # Check if this is a confirmed LP order
-        camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
-        address_matched = row.get('lp_flag', '').lower() in ['yes', 'true', '1']
-        camera_valid = is_valid_lp_camera(camera)
+    report_lp_inference(inferred_count, high_loyalty_agents)
+    return rows
 
-        if address_matched and camera_valid:
-            agent_stats[email]['lp_confirmed'] += 1
 
-    # Identify high-loyalty agents (50%+ LP rate)
+def count_agent_lp(agent_stats: dict, row: dict) -> str:
+    """
+    Count a row towards its agent's [total, confirmed LP] in agent_stats.
+    Returns the agent email, or '' for rows without a usable agent.
+    """
+    email = row.get('agent_email', '')
+    if not email or '@' not in email:
+        return ''
+    stats = agent_stats.get(email)
+    if stats is None:
+        stats = agent_stats[email] = [0, 0]
+    stats[0] += 1
+
+    # Check if this is a confirmed LP order
+    camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
+    if is_lp_flagged(row) and is_valid_lp_camera(camera):
+        stats[1] += 1
+    return email
+
+
+def loyal_agent_emails(agent_stats: dict) -> set:
+    """Agents with 50%+ confirmed LP orders (and at least 2 listings)."""
     high_loyalty_agents = set()
-    for email, stats in agent_stats.items():
-        if stats['total'] >= 2:  # Need at least 2 listings to determine loyalty
-            lp_percentage = (stats['lp_confirmed'] / stats['total']) * 100
+    for email, (total, lp_confirmed) in agent_stats.items():
+        if total >= 2:  # Need at least 2 listings to determine loyalty
+            lp_percentage = (lp_confirmed / total) * 100
             if lp_percentage >= 50:
                 high_loyalty_agents.add(email)
+    return high_loyalty_agents
 
-    # Second pass: infer LP for high-loyalty agents' unmatched orders
-    inferred_count = 0
 
-    for email in high_loyalty_agents:
-        stats = agent_stats[email]
-        for idx in stats['indices']:
-            row = rows[idx]
+def infer_lp(row: dict) -> bool:
+    """Flag a high-loyalty agent's unmatched listing as LP if it looks like one."""
+    # Skip if already marked as LP
+    if is_lp_flagged(row):
+        return False
 
-            # Skip if already marked as LP
-            if row.get('lp_flag', '').lower() in ['yes', 'true', '1']:
-                continue
+    # Check if this listing looks like an LP order
+    camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
+    artist = row.get('exif_artist', '').strip()
 
-            # Check if this listing looks like an LP order
-            camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
-            artist = row.get('exif_artist', '').strip()
+    # Criteria for inference:
+    # 1. Camera must be valid LP camera (blank, Sony ILCE-7M4, or DJI)
+    # 2. Artist/photographer must be blank (not clearly someone else's work)
+    camera_valid = is_valid_lp_camera(camera)
+    artist_blank = not artist or artist == '-'
 
-            # Criteria for inference:
-            # 1. Camera must be valid LP camera (blank, Sony ILCE-7M4, or DJI)
-            # 2. Artist/photographer must be blank (not clearly someone else's work)
-            camera_valid = is_valid_lp_camera(camera)
-            artist_blank = not artist or artist == '-'
+    if camera_valid and artist_blank:
+        row['lp_flag'] = 'Yes'
+        row['lp_inferred'] = 'Yes'  # Mark as inferred for tracking
+        return True
+    return False
 
-            if camera_valid and artist_blank:
-                row['lp_flag'] = 'Yes'
-                row['lp_inferred'] = 'Yes'  # Mark as inferred for tracking
-                inferred_count += 1
 
+def report_lp_inference(inferred_count: int, high_loyalty_agents: set):
     if inferred_count > 0:
         print(f"    LP inference: {inferred_count} orders inferred for {len(high_loyalty_agents)} high-loyalty agents (50%+ LP rate)")
 
-    return rows
+
+# =============================================================================
+# FUZZY ADDRESS MATCHING
+# Exact normalize_address() matching misses orders whose address differs from
+# the listing's only by a unit number, a missing zip or a street suffix
+# variant. AddressMatcher indexes the order addresses in blocks keyed by
+# house number + zip and house number + street name, so each listing is only
+# scored against the handful of orders sharing a block (near-linear overall
+# instead of orders x listings). Candidates are scored with token overlap
+# and character-trigram similarity; the best one above
+# LP_FUZZY_MIN_CONFIDENCE counts as a match, with its confidence recorded.
+# Fuzzy matching is opt-in (--fuzzy-addresses): it changes the published LP
+# counts, and the threshold hasn't been checked against real order
+# addresses, so exact matching stays the default.
+# =============================================================================
+
+LP_FUZZY_MIN_CONFIDENCE = 0.85
+
+DIRECTION_WORDS = {'north', 'south', 'east', 'west', 'northeast', 'northwest', 'southeast', 'southwest'}
 
 
-def enrich_listings(rows: list, lp_addresses: set, photographer_map: dict) -> list:
+def street_key(words: tuple) -> str:
+    """The most distinctive street word: the first non-direction word."""
+    for word in words:
+        if word not in DIRECTION_WORDS:
+            return word
+    return words[0] if words else ''
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressMatcher:
+    """
+    Approximate matcher over a set of normalized order addresses.
+    match(normalized) returns (order address, confidence) or ('', 0.0).
+    """
+
+    MEMO_SIZE = 1 << 16  # Memoized listing addresses before the memo is reset
+
+    def __init__(self, addresses):
+        self.entries = []   # (address, unit, word set, trigrams)
+        self.blocks = defaultdict(list)
+        self.memo = {}
+        for address in addresses:
+            house, unit, zip_code, words = parse_address(address)
+            if not house:
+                continue
+            idx = len(self.entries)
+            self.entries.append((address, unit, frozenset(words), trigrams(' '.join(words))))
+            if zip_code:
+                self.blocks[('zip', house, zip_code)].append(idx)
+            key = street_key(words)
+            if key:
+                self.blocks[('street', house, key)].append(idx)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def candidates(self, house: str, zip_code: str, words: tuple) -> set:
+        found = set()
+        if zip_code:
+            found.update(self.blocks.get(('zip', house, zip_code), ()))
+        key = street_key(words)
+        if key:
+            found.update(self.blocks.get(('street', house, key), ()))
+        return found
+
+    @staticmethod
+    def score(unit: str, words: frozenset, grams: set, entry: tuple) -> float:
+        """Similarity in [0, 1] of a parsed address to an indexed entry."""
+        _, entry_unit, entry_words, entry_grams = entry
+        if unit and entry_unit and unit != entry_unit:
+            return 0.0  # Different units are different properties
+        if not words or not entry_words:
+            return 0.0
+        # Overlap coefficient tolerates a missing city; Dice on trigrams
+        # tolerates typos and suffix variants
+        token_score = len(words & entry_words) / min(len(words), len(entry_words))
+        gram_score = 2 * len(grams & entry_grams) / (len(grams) + len(entry_grams))
+        confidence = 0.5 * token_score + 0.5 * gram_score
+        if bool(unit) != bool(entry_unit):
+            confidence *= 0.95
+        return confidence
+
+    def match(self, normalized: str) -> tuple:
+        """Best order address for a normalized listing address, with confidence."""
+        result = self.memo.get(normalized)
+        if result is not None:
+            return result
+        result = ('', 0.0)
+        house, unit, zip_code, words = parse_address(normalized)
+        if house:
+            word_set = frozenset(words)
+            grams = trigrams(' '.join(words))
+            for idx in self.candidates(house, zip_code, words):
+                confidence = self.score(unit, word_set, grams, self.entries[idx])
+                if confidence > result[1]:
+                    result = (self.entries[idx][0], confidence)
+        if len(self.memo) >= self.MEMO_SIZE:
+            self.memo.clear()
+        self.memo[normalized] = result
+        return result
+
+
+def enrich_listings(rows: list, lp_addresses: set, photographer_map: dict,
+                    lp_matcher: AddressMatcher = None) -> list:
     """
     Enrich listings with LP matching and preferred photographer lookups.
 
     LP Detection Priority:
     1. Check if 'ListerPros' is in the scraped_image_filename (definitive match)
     2. Check if normalized address matches Xeviofy order addresses (fallback)
+    3. With lp_matcher, approximate address match at LP_FUZZY_MIN_CONFIDENCE+
 
+    Address matches record their confidence in lp_match_confidence.
     Only updates if not already set or if we have lookup data.
     """
-    enriched_by_filename = 0
-    enriched_by_address = 0
-
+    matches = {'filename': 0, 'address': 0, 'fuzzy': 0}
     for row in rows:
-        # Skip if already flagged as LP
-        if row.get('lp_flag', '').lower() in ['yes', 'true', '1']:
-            continue
+        match = enrich_row(row, lp_addresses, photographer_map, lp_matcher)
+        if match:
+            matches[match] += 1
 
-        # Priority 1: Check filename for 'ListerPros' (definitive match)
-        scraped_filename = row.get('scraped_image_filename', '')
-        if check_lp_in_filename(scraped_filename):
-            row['lp_flag'] = 'Yes'
-            enriched_by_filename += 1
-            continue
+    report_lp_matches(matches, lp_matcher is not None)
+    return rows
 
-        # Also check the image_filename field (from HTML extraction)
-        image_filename = row.get('image_filename', '')
-        if check_lp_in_filename(image_filename):
-            row['lp_flag'] = 'Yes'
-            enriched_by_filename += 1
-            continue
 
-        # Priority 2: LP Address Matching (fallback for renamed files)
-        if lp_addresses:
-            formatted_addr = row.get('formatted_address', '')
-            if formatted_addr:
-                normalized = normalize_address(formatted_addr)
-                if normalized in lp_addresses:
+def enrich_row(row: dict, lp_addresses: set, photographer_map: dict, lp_matcher: AddressMatcher = None) -> str:
+    """
+    Enrich one listing (see enrich_listings). Returns how it was newly
+    flagged as LP: 'filename', 'address', 'fuzzy' or '' (not flagged).
+    """
+    # Skip if already flagged as LP
+    if is_lp_flagged(row):
+        return ''
+
+    # Priority 1: Check filename for 'ListerPros' (definitive match)
+    scraped_filename = row.get('scraped_image_filename', '')
+    if check_lp_in_filename(scraped_filename):
+        row['lp_flag'] = 'Yes'
+        return 'filename'
+
+    # Also check the image_filename field (from HTML extraction)
+    image_filename = row.get('image_filename', '')
+    if check_lp_in_filename(image_filename):
+        row['lp_flag'] = 'Yes'
+        return 'filename'
+
+    # Priority 2: LP Address Matching (fallback for renamed files)
+    if lp_addresses:
+        # Stored canonical_address skips re-normalizing (address_canon)
+        normalized = row_canonical_address(row)
+        if normalized:
+            if normalized in lp_addresses:
+                row['lp_flag'] = 'Yes'
+                row['lp_match_confidence'] = '1.00'
+                return 'address'
+            if lp_matcher is not None:
+                _, confidence = lp_matcher.match(normalized)
+                if confidence >= LP_FUZZY_MIN_CONFIDENCE:
                     row['lp_flag'] = 'Yes'
-                    enriched_by_address += 1
-                    continue
+                    row['lp_match_confidence'] = f"{confidence:.2f}"
+                    return 'fuzzy'
+
+    # Preferred Photographer Matching (separate from LP detection)
+    if photographer_map:
+        email = row.get('agent_email', '')
+        if email and email in photographer_map:
+            row['preferred_photographer'] = photographer_map[email]
+    return ''
 
-        # Preferred Photographer Matching (separate from LP detection)
-        if photographer_map:
-            email = row.get('agent_email', '')
-            if email and email in photographer_map:
-                row['preferred_photographer'] = photographer_map[email]
 
-    total_enriched = enriched_by_filename + enriched_by_address
+def report_lp_matches(matches: dict, fuzzy: bool):
+    """Print enrich_listings' LP match counts ({'filename', 'address', 'fuzzy'})."""
+    total_enriched = sum(matches.values())
     if total_enriched > 0:
-        print(f"    LP matches: {enriched_by_filename} by filename, {enriched_by_address} by address ({total_enriched} total)")
+        print(f"    LP matches: {matches['filename']} by filename, {matches['address']} by address"
+              + (f", {matches['fuzzy']} by fuzzy address" if fuzzy else "")
+              + f" ({total_enriched} total)")
+
+
+# =============================================================================
+# DERIVED FIELDS STAGE
+# Runs once after enrich_listings / infer_lp_for_loyal_agents and attaches
+# typed, already-parsed values to every row so builders never re-split
+# camera strings or re-run strptime:
+#   camera        - "make model" string ('' if no EXIF camera)
+#   camera_valid  - camera passes is_valid_lp_camera()
+#   is_lp         - lp_flag set AND camera valid (the validated LP order flag)
+#   price_cents   - integer listing price in cents, or None if unparseable
+#   list_date_iso - list_date as YYYY-MM-DD, or '' if unparseable
+# =============================================================================
+
+def parse_price_cents(price_str: str):
+    """Parse a price like '$309,999' into integer cents. Returns None if unparseable."""
+    price_str = (price_str or '').replace('$', '').replace(',', '').strip()
+    try:
+        return round(float(price_str) * 100)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def derive_listing_fields(rows):
+    """
+    Attach derived fields (camera, camera_valid, is_lp, price_cents,
+    list_date_iso) to each row. Safe to re-run; values are recomputed
+    from the source columns.
+    """
+    cameras = [
+        f"{make} {model}".strip()
+        for make, model in zip(column_values(rows, 'exif_make'), column_values(rows, 'exif_model'))
+    ]
+    camera_valid = [is_valid_lp_camera(camera) for camera in cameras]
+    derived = {
+        'camera': cameras,
+        'camera_valid': camera_valid,
+        'is_lp': [
+            valid and flag.lower() in LP_FLAG_VALUES
+            for valid, flag in zip(camera_valid, column_values(rows, 'lp_flag'))
+        ],
+        'price_cents': [parse_price_cents(price) for price in column_values(rows, 'price')],
+        'list_date_iso': [parse_list_date(date) for date in column_values(rows, 'list_date')],
+    }
+
+    if isinstance(rows, ListingTable):
+        for field, values in derived.items():
+            rows.set_column(field, values)
+    else:
+        for field, values in derived.items():
+            for row, value in zip(rows, values):
+                row[field] = value
 
     return rows
 
 
-def build_verified_agents(rows: list, market_name: str) -> dict:
-    """Build verified agents list from listings for a single market."""
-    agents_by_email = defaultdict(lambda: {
-        'email': '',
-        'names': set(),
-        'phones': set(),
-        'listing_count': 0,
-        'listings': [],
-        'offices': set(),
-        'listing_volume': 0,
-        'lp_listings': 0,
-        'listing_dates': [],  # Track all list dates for period filtering
-    })
+# =============================================================================
+# FUSED AGGREGATION ENGINE
+# Every output builder is an accumulator fed from a single walk over a
+# market's rows (after derive_listing_fields), so build time scales with
+# rows instead of rows x outputs.
+#
+# Accumulators are retractable and keyed by mls_number: add(row, idx) records
+# a row's contribution (re-adding an MLS number replaces it) and retract(mls)
+# removes it again. An updated listing is folded in by retracting the old
+# contribution and adding the new one, so only the affected agents change.
+# idx is the row's position in the market table; it orders per-agent detail
+# the same way a full rebuild would. Rows must be deduped by MLS number.
+# =============================================================================
+
+def feed_rows(rows: list, accumulators: list) -> list:
+    """Walk rows once, adding each row to every accumulator."""
+    add_fns = [acc.add for acc in accumulators]
+    if isinstance(rows, ListingTable):
+        # Accumulators only read, so plain dicts beat per-field view lookups
+        rows = rows.iter_dicts()
+    for idx, row in enumerate(rows):
+        for add in add_fns:
+            add(row, idx)
+    return accumulators
 
-    for row in rows:
-        email = row.get('agent_email', '')
-        if not email or '@' not in email:
-            continue
 
-        agent = agents_by_email[email]
-        agent['email'] = email
+def aggregate_rows(rows: list, accumulators: list) -> list:
+    """
+    Walk rows once, feeding every accumulator.
+    Returns each accumulator's result() in the same order.
+    """
+    return [acc.result() for acc in feed_rows(rows, accumulators)]
+
 
-        if row.get('agent_name'):
-            agent['names'].add(row['agent_name'])
+def count_add(counts: dict, key, amount: int = 1):
+    """Adjust a retractable counter. Keys are kept at zero so first-seen order survives retraction."""
+    counts[key] = counts.get(key, 0) + amount
 
-        if row.get('agent_phone'):
-            agent['phones'].add(row['agent_phone'])
 
-        if row.get('office_name'):
-            agent['offices'].add(row['office_name'])
+def sorted_counts(counts: dict) -> dict:
+    """Non-zero counts sorted descending (ties keep first-seen order)."""
+    return dict(sorted(((k, v) for k, v in counts.items() if v), key=lambda x: x[1], reverse=True))
 
-        agent['listing_count'] += 1
 
-        # Track listing volume from price
-        price_str = row.get('price', '').replace('$', '').replace(',', '').strip()
-        try:
-            price = float(price_str)
-            agent['listing_volume'] += price
-        except (ValueError, TypeError):
-            pass
-
-        # Track LP listings - with camera validation
-        # Build camera string for validation
-        camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
-        address_matched = row.get('lp_flag', '').lower() in ['yes', 'true', '1']
-        camera_valid = is_valid_lp_camera(camera)
-
-        # Only count as LP if BOTH address matched AND camera is valid
-        is_lp = address_matched and camera_valid
-        if is_lp:
-            agent['lp_listings'] += 1
-
-        # Parse and track list_date for period filtering
-        list_date = parse_list_date(row.get('list_date', ''))
-        if list_date:
-            agent['listing_dates'].append(list_date)
+def valid_agent_email(row: dict) -> str:
+    """The row's agent email, or '' if it has no usable agent."""
+    email = row.get('agent_email', '')
+    if not email or '@' not in email:
+        return ''
+    return email
+
+
+class MarketSummaryAccumulator:
+    """Status counts and LP match totals for output/listings_summary.json."""
+
+    def __init__(self):
+        self.records = {}  # mls -> (status, lp_flagged)
+        self.by_status = {}
+        self.lp_matched = 0
+
+    def add(self, row: dict, idx: int):
+        mls = row.get('mls_number', '')
+        self.retract(mls)
+        record = (row.get('status', 'Unknown'), is_lp_flagged(row))
+        self.records[mls] = record
+        count_add(self.by_status, record[0])
+        self.lp_matched += record[1]
+
+    def retract(self, mls: str):
+        record = self.records.pop(mls, None)
+        if record is None:
+            return
+        count_add(self.by_status, record[0], -1)
+        self.lp_matched -= record[1]
+
+    def result(self) -> dict:
+        return {
+            'total': len(self.records),
+            'by_status': {status: count for status, count in self.by_status.items() if count},
+            'lp_matched': self.lp_matched,
+        }
+
+
+class AgentGroupedAccumulator:
+    """
+    Base for accumulators that group row records by agent email.
+    Subclasses build a record tuple (row index first) in make_record() and
+    an output entry from an agent's index-ordered records in build_entry().
+    Entries are cached per agent and rebuilt only when that agent changes.
+    """
+
+    def __init__(self, market_name: str):
+        self.market_name = market_name
+        self.agents = {}     # email -> {mls: record}
+        self.agent_of = {}   # mls -> email
+        self.entries = {}    # email -> (first row index, cached output entry)
+
+    def make_record(self, row: dict, idx: int) -> tuple:
+        raise NotImplementedError
+
+    def build_entry(self, email: str, records: list) -> dict:
+        raise NotImplementedError
+
+    def add(self, row: dict, idx: int):
+        mls = row.get('mls_number', '')
+        self.retract(mls)
+        email = valid_agent_email(row)
+        if not email:
+            return
+        self.agents.setdefault(email, {})[mls] = self.make_record(row, idx)
+        self.agent_of[mls] = email
+        self.entries.pop(email, None)
+
+    def retract(self, mls: str):
+        email = self.agent_of.pop(mls, None)
+        if email is None:
+            return
+        del self.agents[email][mls]
+        self.entries.pop(email, None)
+
+    def agent_entries(self) -> list:
+        """
+        Current output entries for every agent with listings, ordered by the
+        agent's first row (the order a full rebuild would see them in).
+        """
+        entries = []
+        for email, records in self.agents.items():
+            if not records:
+                continue
+            cached = self.entries.get(email)
+            if cached is None:
+                ordered = sorted(records.values())
+                cached = self.entries[email] = (ordered[0][0], self.build_entry(email, ordered))
+            entries.append(cached)
+        entries.sort(key=lambda x: x[0])
+        return [entry for _, entry in entries]
+
+
+def first_row_order(groups: dict) -> list:
+    """(key, index-ordered records) for non-empty record groups, ordered by each group's first row."""
+    ordered = [(key, sorted(records.values())) for key, records in groups.items() if records]
+    ordered.sort(key=lambda x: x[1][0][0])
+    return ordered
+
+
+def group_first_row_order(groups: dict) -> list:
+    """(key, {email: records}) for nested groups, ordered by each group's first row."""
+    firsts = []
+    for key, agents_dict in groups.items():
+        first = min((min(records.values())[0] for records in agents_dict.values() if records), default=None)
+        if first is not None:
+            firsts.append((first, key, agents_dict))
+    firsts.sort(key=lambda x: x[0])
+    return [(key, agents_dict) for _, key, agents_dict in firsts]
+
+
+def first_values(values) -> list:
+    """Distinct non-empty values in first-seen order."""
+    return list(dict.fromkeys(v for v in values if v))
+
+
+def last_value(values) -> str:
+    """Last non-empty value (the 'value or previous' rule the builders use)."""
+    result = ''
+    for value in values:
+        result = value or result
+    return result
+
+
+def add_activity(bucket: list, is_lp, price_cents):
+    """Count one listing into a [listings, lp_listings, volume] bucket."""
+    bucket[0] += 1
+    bucket[1] += bool(is_lp)
+    if price_cents is not None:
+        bucket[2] += price_cents / 100
 
+
+def activity_entries(buckets) -> dict:
+    """Output form of (key, activity bucket) pairs: volume in dollars, whole dollars as ints."""
+    entries = {}
+    for key, (listings, lp, volume) in buckets:
+        volume = round(volume, 2)
+        entries[key] = [listings, lp, int(volume) if volume == int(volume) else volume]
+    return entries
+
+
+def listing_volume(price_cents) -> float:
+    """Sum prices (in dollars) the way the builders always have: float, 0 if none parsed."""
+    volume = 0
+    for cents in price_cents:
+        if cents is not None:
+            volume += cents / 100
+    return volume
+
+
+class VerifiedAgentsAccumulator(AgentGroupedAccumulator):
+    """
+    Builds verified_agents.json (agents by email) for a single market.
+
+    Each agent carries its activity per list month ('monthly', newest first)
+    and over the ROLLING_WINDOWS days up to 'activity_through' ('rolling'),
+    as [listings, lp_listings, volume] arrays (see 'activity_fields'), so the
+    dashboards get period totals without every listing date. The windows end
+    at the newest list date in the data (local, like every list date), not
+    today, so the file only changes when the data does; cached entries are
+    rebuilt when that date moves. Empty months and windows are left out.
+    """
+
+    RECENT_LISTINGS = 20
+    ROLLING_WINDOWS = (30, 90, 365)
+    ACTIVITY_FIELDS = ('listings', 'lp_listings', 'volume')
+
+    def __init__(self, market_name: str):
+        super().__init__(market_name)
+        self.as_of = ''  # The list date the cached entries' rolling windows end at
+
+    def rolling_starts(self) -> list:
+        """(window label, exclusive start date) for each rolling window ending at as_of."""
+        if not self.as_of:
+            return []
+        as_of = date.fromisoformat(self.as_of)
+        return [(f"{days}d", (as_of - timedelta(days=days)).isoformat()) for days in self.ROLLING_WINDOWS]
+
+    def make_record(self, row: dict, idx: int) -> tuple:
+        listing = None
         if row.get('listing_address'):
-            agent['listings'].append({
+            camera = row['camera']
+            listing = {
                 'mls': row.get('mls_number', ''),
                 'address': row.get('listing_address', ''),
                 'status': row.get('status', ''),
                 'price': row.get('price', ''),
-                'lp': is_lp,
+                'lp': row['is_lp'],
                 # Listing-level metadata for pattern identification
                 'exif_artist': row.get('exif_artist', '') or '-',
                 'exif_copyright': row.get('exif_copyright', '') or '-',
@@ -557,47 +1216,98 @@ def build_verified_agents(rows: list, market_name: str) -> dict:
                 'lens': row.get('exif_lens_model', '') or '-',
                 'filename': row.get('scraped_image_filename', '') or '-',
                 # List date for period filtering (ISO format YYYY-MM-DD)
-                'list_date': list_date,
+                'list_date': row['list_date_iso'],
                 # Timestamp for timeline filtering (legacy)
                 'timestamp': row.get('timestamp', '') or '-',
-            })
+            }
+        return (
+            idx,
+            row.get('agent_name') or '',
+            row.get('agent_phone') or '',
+            row.get('office_name') or '',
+            row['price_cents'],
+            row['is_lp'],
+            row['list_date_iso'],
+            listing,
+        )
 
-    agents_list = []
-    for email, data in agents_by_email.items():
+    def build_entry(self, email: str, records: list) -> dict:
         # Sort listings by list_date descending (newest first)
         sorted_listings = sorted(
-            data['listings'],
+            (r[7] for r in records if r[7] is not None),
             key=lambda x: x.get('list_date', '') or '0000-00-00',
             reverse=True
         )
-        agents_list.append({
+        monthly = {}
+        starts = self.rolling_starts()
+        rolling = {label: [0, 0, 0] for label, _ in starts}
+        for r in records:
+            if r[6]:
+                add_activity(monthly.setdefault(r[6][:7], [0, 0, 0]), r[5], r[4])
+                for label, start in starts:
+                    if start < r[6] <= self.as_of:
+                        add_activity(rolling[label], r[5], r[4])
+        return self.make_entry(
+            email,
+            first_values(r[1] for r in records),
+            first_values(r[2] for r in records),
+            first_values(r[3] for r in records),
+            len(records),
+            listing_volume(r[4] for r in records),
+            sum(1 for r in records if r[5]),
+            monthly,
+            rolling,
+            sorted_listings[:self.RECENT_LISTINGS],
+        )
+
+    @staticmethod
+    def make_entry(email: str, names: list, phones: list, offices: list, total_listings: int,
+                   volume: float, lp_listings: int, monthly: dict, rolling: dict, recent_listings: list) -> dict:
+        return {
             'email': email,
-            'name': list(data['names'])[0] if data['names'] else '',
-            'all_names': list(data['names']),
-            'phone': list(data['phones'])[0] if data['phones'] else '',
-            'office': list(data['offices'])[0] if data['offices'] else '',
-            'total_listings': data['listing_count'],
-            'listing_volume': data['listing_volume'],
-            'lp_listings': data['lp_listings'],
-            # All listing dates for period filtering (sorted newest first)
-            'listing_dates': sorted(data['listing_dates'], reverse=True),
+            'name': names[0] if names else '',
+            'all_names': names,
+            'phone': phones[0] if phones else '',
+            'office': offices[0] if offices else '',
+            'total_listings': total_listings,
+            'listing_volume': volume,
+            'lp_listings': lp_listings,
+            # Activity per list month (newest first) and over the rolling windows
+            'monthly': activity_entries(sorted(monthly.items(), reverse=True)),
+            'rolling': activity_entries((label, bucket) for label, bucket in rolling.items() if bucket[0]),
             # Recent listings with full detail (sorted by list_date)
-            'recent_listings': sorted_listings[:20],
-        })
-
-    agents_list.sort(key=lambda x: x['total_listings'], reverse=True)
-
-    return {
-        'market': market_name,
-        'agents': agents_list,
-        'total_agents': len(agents_list),
-        'updated': datetime.now(timezone.utc).isoformat(),
-    }
-
-
-def build_customer_loyalty(rows: list, market_name: str) -> dict:
+            'recent_listings': recent_listings,
+        }
+
+    def newest_list_date(self) -> str:
+        """Newest list date of any agent's listing ('' if none has one)."""
+        return max((r[6] for records in self.agents.values() for r in records.values() if r[6]), default='')
+
+    def agent_entries(self) -> list:
+        as_of = self.newest_list_date()
+        if as_of != self.as_of:
+            # Newer (or retracted) listings moved the rolling windows
+            self.as_of = as_of
+            self.entries.clear()
+        return super().agent_entries()
+
+    def result(self) -> dict:
+        agents_list = self.agent_entries()
+        agents_list.sort(key=lambda x: x['total_listings'], reverse=True)
+
+        return {
+            'market': self.market_name,
+            'activity_fields': list(self.ACTIVITY_FIELDS),
+            'activity_through': self.as_of,
+            'agents': agents_list,
+            'total_agents': len(agents_list),
+            'updated': datetime.now(timezone.utc).isoformat(),
+        }
+
+
+class CustomerLoyaltyAccumulator(AgentGroupedAccumulator):
     """
-    Build customer loyalty analytics for a single market.
+    Builds customer_loyalty.json for a single market.
     Shows which agents use ListerPros, how often, and loyalty percentage.
 
     LP Order Validation:
@@ -605,553 +1315,3151 @@ def build_customer_loyalty(rows: list, market_name: str) -> dict:
     - BUT camera must also be valid (SONY ILCE-7M4 or blank)
     - If camera is iPhone, Canon, etc. -> NOT an LP order even if address matched
     """
-    agents = defaultdict(lambda: {
-        'email': '',
-        'name': '',
-        'phone': '',
-        'office': '',
-        'total_listings': 0,
-        'lp_listings': 0,
-        'non_lp_listings': 0,
-        'lp_percentage': 0.0,
-        'listing_volume': 0,
-        'preferred_photographer': '',
-        'listings_detail': [],
-    })
 
-    camera_filtered_out = 0  # Track how many were filtered by camera
+    RECENT_LISTINGS = 10
 
-    for row in rows:
-        email = row.get('agent_email', '')
-        if not email or '@' not in email:
-            continue
+    def __init__(self, market_name: str):
+        super().__init__(market_name)
+        self.camera_filtered = {}  # mls -> 1 for address-matched orders with the wrong camera
 
-        agent = agents[email]
-        agent['email'] = email
-        agent['name'] = row.get('agent_name', '') or agent['name']
-        agent['phone'] = row.get('agent_phone', '') or agent['phone']
-        agent['office'] = row.get('office_name', '') or agent['office']
-        agent['preferred_photographer'] = row.get('preferred_photographer', '') or agent['preferred_photographer']
+    def add(self, row: dict, idx: int):
+        super().add(row, idx)
+        mls = row.get('mls_number', '')
+        if mls in self.agent_of and not row['camera_valid'] and is_lp_flagged(row):
+            self.camera_filtered[mls] = 1
+
+    def retract(self, mls: str):
+        super().retract(mls)
+        self.camera_filtered.pop(mls, None)
+
+    def make_record(self, row: dict, idx: int) -> tuple:
+        camera = row['camera']
+        # Listing-level metadata for identification (not agent-level preferred)
+        detail = (
+            row.get('mls_number', ''),
+            row.get('listing_address', ''),
+            row.get('exif_artist', '') or '-',
+            row.get('exif_copyright', '') or '-',
+            camera if camera else '-',
+            row.get('exif_lens_model', '') or '-',
+            row.get('scraped_image_filename', '') or '-',
+            row['list_date_iso'],
+            row.get('timestamp', '') or '-',
+        )
+        return (
+            idx,
+            row.get('agent_name', ''),
+            row.get('agent_phone', ''),
+            row.get('office_name', ''),
+            row.get('preferred_photographer', ''),
+            row['price_cents'],
+            row['is_lp'],
+            detail,
+        )
 
-        agent['total_listings'] += 1
+    def build_entry(self, email: str, records: list) -> dict:
+        return self.make_entry(
+            email,
+            last_value(r[1] for r in records),
+            last_value(r[2] for r in records),
+            last_value(r[3] for r in records),
+            last_value(r[4] for r in records),
+            len(records),
+            listing_volume(r[5] for r in records),
+            sum(1 for r in records if r[6]),
+            self.recent_listing_entries(records[:self.RECENT_LISTINGS]),
+        )
 
-        # Track listing volume
-        price_str = row.get('price', '').replace('$', '').replace(',', '').strip()
-        try:
-            price = float(price_str)
-            agent['listing_volume'] += price
-        except (ValueError, TypeError):
-            pass
+    @staticmethod
+    def make_entry(email: str, name: str, phone: str, office: str, preferred: str, total_listings: int,
+                   volume: float, lp_listings: int, recent_listings: list) -> dict:
+        return {
+            'email': email,
+            'name': name,
+            'phone': phone,
+            'office': office,
+            'total_listings': total_listings,
+            'listing_volume': volume,
+            'lp_listings': lp_listings,
+            'non_lp_listings': total_listings - lp_listings,
+            'lp_percentage': round((lp_listings / total_listings) * 100, 1),
+            'preferred_photographer': preferred,
+            'recent_listings': recent_listings,
+        }
+
+    @staticmethod
+    def recent_listing_entries(records: list) -> list:
+        """
+        Listing detail for the agent's first RECENT_LISTINGS listings.
+        Include all metadata for pattern identification - NO fallback to preferred_photographer
+        """
+        recent_listings = []
+        for r in records:
+            mls, address, artist, copyright_, camera, lens, filename, list_date, ts = r[7]
+            is_lp = r[6]
+            recent_listings.append({
+                'mls': mls,
+                'address': address,
+                'lp': is_lp,
+                'status': 'LP Order' if is_lp else 'Other',
+                'exif_artist': artist,
+                'exif_copyright': copyright_,
+                'camera': camera,
+                'lens': lens,
+                'filename': filename,
+                # List date for period filtering (ISO format YYYY-MM-DD)
+                'list_date': list_date,
+                # Timestamp for timeline filtering (legacy)
+                'timestamp': ts,
+            })
+        return recent_listings
+
+    def camera_filtered_count(self) -> int:
+        return len(self.camera_filtered)
+
+    def result(self) -> dict:
+        camera_filtered_out = self.camera_filtered_count()
+        if camera_filtered_out > 0:
+            print(f"      Camera filter: {camera_filtered_out} address-matched orders filtered out (wrong camera)")
+
+        # Sort by total listings descending
+        loyalty_list = self.agent_entries()
+        loyalty_list.sort(key=lambda x: x['total_listings'], reverse=True)
+
+        # Calculate summary stats
+        total_agents = len(loyalty_list)
+        agents_using_lp = len([a for a in loyalty_list if a['lp_listings'] > 0])
+        total_lp_listings = sum(a['lp_listings'] for a in loyalty_list)
+        total_all_listings = sum(a['total_listings'] for a in loyalty_list)
+
+        # Loyalty tiers
+        loyal_agents = [a for a in loyalty_list if a['lp_percentage'] >= 75 and a['total_listings'] >= 3]
+        occasional_agents = [a for a in loyalty_list if 25 <= a['lp_percentage'] < 75 and a['total_listings'] >= 3]
+        rare_agents = [a for a in loyalty_list if 0 < a['lp_percentage'] < 25 and a['total_listings'] >= 3]
+        never_used = [a for a in loyalty_list if a['lp_listings'] == 0 and a['total_listings'] >= 3]
+
+        return {
+            'market': self.market_name,
+            'summary': {
+                'total_agents': total_agents,
+                'agents_using_lp': agents_using_lp,
+                'total_lp_listings': total_lp_listings,
+                'total_listings': total_all_listings,
+                'overall_lp_percentage': round((total_lp_listings / total_all_listings * 100) if total_all_listings > 0 else 0, 1),
+            },
+            'loyalty_tiers': {
+                'loyal_75_plus': len(loyal_agents),
+                'occasional_25_to_75': len(occasional_agents),
+                'rare_under_25': len(rare_agents),
+                'never_used': len(never_used),
+            },
+            'top_loyal_agents': loyal_agents[:50],
+            'opportunity_agents': [a for a in never_used if a['total_listings'] >= 5][:50],
+            'all_agents': loyalty_list,
+            'updated': datetime.now(timezone.utc).isoformat(),
+        }
+
+
+class PhotographersAccumulator:
+    """Builds photographers.json (camera/photographer counts) for a single market."""
+
+    def __init__(self, market_name: str):
+        self.market_name = market_name
+        self.records = {}  # mls -> (camera_key, artist, preferred)
+        self.cameras = {}
+        self.photographers = {}
+        self.preferred_photographers = {}
+
+    def add(self, row: dict, idx: int):
+        # Counts every row (with or without an agent email)
+        mls = row.get('mls_number', '')
+        self.retract(mls)
+        record = self.make_record(row)
+        self.records[mls] = record
+        self._count(record, 1)
 
-        # Build camera string for validation
-        camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
+    @staticmethod
+    def make_record(row: dict) -> tuple:
+        make = row.get('exif_make', '').strip()
+        model = row.get('exif_model', '').strip()
+        if make and model:
+            camera_key = f"{make} {model}"
+        else:
+            camera_key = make
+
+        return (
+            camera_key,
+            row.get('exif_artist', '').strip(),
+            row.get('preferred_photographer', '').strip(),
+        )
+
+    def retract(self, mls: str):
+        record = self.records.pop(mls, None)
+        if record is not None:
+            self._count(record, -1)
 
-        # LP validation: check both address match AND camera validity
-        address_matched = row.get('lp_flag', '').lower() in ['yes', 'true', '1']
-        camera_valid = is_valid_lp_camera(camera)
+    def _count(self, record: tuple, amount: int):
+        camera_key, artist, preferred = record
+        if camera_key:
+            count_add(self.cameras, camera_key, amount)
+        if artist:
+            count_add(self.photographers, artist, amount)
+        if preferred:
+            count_add(self.preferred_photographers, preferred, amount)
 
-        # Only count as LP if BOTH address matched AND camera is valid
-        is_lp = address_matched and camera_valid
+    def result(self) -> dict:
+        return {
+            'market': self.market_name,
+            'cameras': sorted_counts(self.cameras),
+            'photographers': sorted_counts(self.photographers),
+            'preferred_photographers': sorted_counts(self.preferred_photographers),
+            'updated': datetime.now(timezone.utc).isoformat(),
+        }
 
-        # Track filtered orders for logging
-        if address_matched and not camera_valid:
-            camera_filtered_out += 1
 
-        if is_lp:
-            agent['lp_listings'] += 1
+class PhotographerAnalyticsAccumulator:
+    """
+    Builds comprehensive photographer analytics for the photographer pages.
+    This is a lighter-weight alternative to customer_loyalty.json that includes
+    only what's needed for photographer analysis.
+    """
+
+    # The listings array is left empty for markets with this many listings;
+    # they point to their listing pages instead (see write_listing_pages)
+    LISTINGS_LIMIT = 30000
+    SAMPLE_LISTINGS = 5
+
+    # Record layout (row index first so sorted records follow table order)
+    IDX, EMAIL, NAME, PHONE, OFFICE, IS_LP, CAMERA, LENS, ARTIST, PREFERRED, MLS, ADDRESS, FILE, LIST_DATE, TS = range(15)
+
+    def __init__(self, market_name: str):
+        self.market_name = market_name
+        self.records = {}  # mls -> record tuple
+        self.agents = {}   # email -> {mls: record}
+        self.cameras = {}
+        self.lenses = {}
+        self.exif_artists = {}
+        self.preferred_photographers = {}
+        self.equipment_fingerprints = {}  # "camera|||lens" -> {mls: record}
+        # Which agents use each EXIF artist (for photographer->agent lookup)
+        self.artist_to_agents = {}  # artist -> email -> {mls: record}
+        # Which agents use each camera model
+        self.camera_to_agents = {}  # camera -> email -> {mls: record}
+
+    def add(self, row: dict, idx: int):
+        mls = row.get('mls_number', '')
+        self.retract(mls)
+        email = valid_agent_email(row)
+        if not email:
+            return
+        record = self.make_record(row, idx, email)
+        self.records[mls] = record
+        self._index(mls, record, 1)
+
+    @staticmethod
+    def make_record(row: dict, idx: int, email: str) -> tuple:
+        return (
+            idx,
+            email,
+            row.get('agent_name', ''),
+            row.get('agent_phone', ''),
+            row.get('office_name', ''),
+            row['is_lp'],
+            row['camera'] or '-',
+            row.get('exif_lens_model', '') or '-',
+            row.get('exif_artist', '').strip(),
+            row.get('preferred_photographer', '').strip(),
+            row.get('mls_number', ''),
+            row.get('listing_address', ''),
+            row.get('scraped_image_filename', '') or '-',
+            row['list_date_iso'],
+            row.get('timestamp', '') or '-',
+        )
+
+    def retract(self, mls: str):
+        record = self.records.pop(mls, None)
+        if record is not None:
+            self._index(mls, record, -1)
+
+    def _index(self, mls: str, record: tuple, amount: int):
+        """Add (amount=1) or remove (amount=-1) a record from every grouping."""
+        email, camera, lens, artist, preferred = (
+            record[self.EMAIL], record[self.CAMERA], record[self.LENS], record[self.ARTIST], record[self.PREFERRED])
+
+        groups = [self.agents.setdefault(email, {}), self.equipment_fingerprints.setdefault(f"{camera}|||{lens}", {})]
+        if camera != '-':
+            count_add(self.cameras, camera, amount)
+            groups.append(self.camera_to_agents.setdefault(camera, {}).setdefault(email, {}))
+        if lens != '-':
+            count_add(self.lenses, lens, amount)
+        if artist:
+            count_add(self.exif_artists, artist, amount)
+            groups.append(self.artist_to_agents.setdefault(artist, {}).setdefault(email, {}))
+        if preferred:
+            count_add(self.preferred_photographers, preferred, amount)
+
+        for group in groups:
+            if amount > 0:
+                group[mls] = record
+            else:
+                del group[mls]
+
+    def _agent_lookup(self, agents_dict: dict, agents_by_email: dict, count_field: str) -> list:
+        """Agents for one artist/camera, biggest users first (ties in first-row order)."""
+        agents_list = []
+        for email, records in sorted(((e, r) for e, r in agents_dict.items() if r),
+                                     key=lambda x: min(x[1].values())[0]):
+            ordered = sorted(records.values())
+            agents_list.append(self.lookup_entry(
+                email,
+                last_value(r[self.NAME] for r in ordered),
+                last_value(r[self.PHONE] for r in ordered),
+                last_value(r[self.OFFICE] for r in ordered),
+                count_field, len(records), agents_by_email))
+        agents_list.sort(key=lambda x: x[count_field], reverse=True)
+        return agents_list
+
+    @staticmethod
+    def lookup_entry(email: str, name: str, phone: str, office: str, count_field: str, count: int,
+                     agents_by_email: dict) -> dict:
+        final_agent = agents_by_email.get(email, {})
+        return {
+            'email': email,
+            'name': name,
+            'phone': phone,
+            'office': office,
+            count_field: count,
+            'total_listings': final_agent.get('total_listings', 0),
+            'lp_listings': final_agent.get('lp_listings', 0),
+        }
+
+    def agent_totals(self) -> dict:
+        """Per-agent totals (contact details from the agent's first listing)."""
+        agents_by_email = {}
+        for email, records in self.agents.items():
+            if not records:
+                continue
+            first = min(records.values())
+            agents_by_email[email] = {
+                'email': email,
+                'name': first[self.NAME],
+                'phone': first[self.PHONE],
+                'office': first[self.OFFICE],
+                'total_listings': len(records),
+                'lp_listings': sum(1 for r in records.values() if r[self.IS_LP]),
+            }
+        return agents_by_email
+
+    def fingerprint_entries(self) -> list:
+        """Equipment fingerprints for JSON serialization, biggest first."""
+        fingerprints_list = []
+        for key, ordered in first_row_order(self.equipment_fingerprints):
+            exif_artists = {}
+            for r in ordered:
+                if r[self.ARTIST]:
+                    count_add(exif_artists, r[self.ARTIST])
+            fingerprints_list.append(self.fingerprint_entry(
+                key, len(ordered), len({r[self.EMAIL] for r in ordered}), exif_artists, ordered[:self.SAMPLE_LISTINGS]))
+
+        # Sort fingerprints by count descending
+        fingerprints_list.sort(key=lambda x: x['count'], reverse=True)
+        return fingerprints_list
+
+    def fingerprint_entry(self, key: str, count: int, agent_count: int, exif_artists: dict, samples: list) -> dict:
+        camera, lens = key.split('|||')
+        return {
+            'camera': camera,
+            'lens': lens,
+            'count': count,
+            'agent_count': agent_count,
+            'exif_artists': exif_artists,
+            'sample_listings': [{
+                'mls': r[self.MLS],
+                'address': r[self.ADDRESS],
+                'agent': r[self.NAME],
+                'filename': r[self.FILE],
+            } for r in samples],
+        }
+
+    def agent_lookups(self, groups: dict, agents_by_email: dict, count_field: str) -> dict:
+        """{artist or camera: its agents, biggest users first} in first-row order."""
+        lookups = {}
+        for key, agents_dict in group_first_row_order(groups):
+            agents_list = self._agent_lookup(agents_dict, agents_by_email, count_field)
+            if agents_list:
+                lookups[key] = agents_list
+        return lookups
+
+    def listing_entries(self) -> list:
+        """Listings array (limit fields), in table order."""
+        return [self.listing_entry(r) for r in sorted(self.records.values())]
+
+    def paged_listings(self):
+        """Listing entries in page order: list_date newest first, undated last, ties in table order."""
+        # Stable sort: listings sharing a list date keep table order
+        return sorted(self.listing_entries(), key=lambda listing: listing['list_date'], reverse=True)
+
+    def listing_entry(self, r: tuple) -> dict:
+        return {
+            'mls': r[self.MLS],
+            'address': r[self.ADDRESS],
+            'email': r[self.EMAIL],
+            'name': r[self.NAME],
+            'lp': r[self.IS_LP],
+            'cam': r[self.CAMERA],
+            'lens': r[self.LENS],
+            'artist': r[self.ARTIST] or '-',
+            'file': r[self.FILE],
+            'list_date': r[self.LIST_DATE],
+            'ts': r[self.TS],
+        }
+
+    def total_listings(self) -> int:
+        return len(self.records)
+
+    def listings_paged(self) -> bool:
+        """Whether the market is too big for the listings array and ships listing pages instead."""
+        return self.total_listings() >= self.LISTINGS_LIMIT
+
+    def result(self) -> dict:
+        agents_by_email = self.agent_totals()
+        fingerprints_list = self.fingerprint_entries()
+        # Artist to agents lookup - biggest customers first, all agents per photographer
+        artist_agents = self.agent_lookups(self.artist_to_agents, agents_by_email, 'photographer_listings')
+        # Camera to agents lookup - who uses each camera model
+        camera_agents = self.agent_lookups(self.camera_to_agents, agents_by_email, 'camera_listings')
+        paged = self.listings_paged()
+
+        # Calculate market share stats
+        total_listings = self.total_listings()
+        lp_listings = sum(a['lp_listings'] for a in agents_by_email.values())
+        total_agents = len(agents_by_email)
+        agents_using_lp = len([a for a in agents_by_email.values() if a['lp_listings'] > 0])
+        lp_agent_percentage = round((agents_using_lp / total_agents * 100) if total_agents > 0 else 0, 1)
+        lp_listing_percentage = round((lp_listings / total_listings * 100) if total_listings > 0 else 0, 1)
+        cameras = sorted_counts(self.cameras)
+        exif_artists = sorted_counts(self.exif_artists)
+
+        result = {
+            'market': self.market_name,
+            'summary': {
+                'total_listings': total_listings,
+                'lp_listings': lp_listings,
+                'lp_listing_percentage': lp_listing_percentage,
+                'total_agents': total_agents,
+                'agents_using_lp': agents_using_lp,
+                'lp_agent_percentage': lp_agent_percentage,
+                'unique_cameras': len(cameras),
+                'unique_exif_artists': len(exif_artists),
+            },
+            'cameras': cameras,
+            'lenses': sorted_counts(self.lenses),
+            'exif_artists': exif_artists,
+            'preferred_photographers': sorted_counts(self.preferred_photographers),
+            'equipment_fingerprints': fingerprints_list,  # All fingerprints
+            # Artist to agents lookup - for photographer->customer drill-down
+            'artist_agents': artist_agents,
+            # Camera to agents lookup - for camera->user drill-down
+            'camera_agents': camera_agents,
+            # Store listings only for Tucson (smaller market) - Phoenix is too large
+            'listings': [] if paged else self.listing_entries(),
+        }
+        if paged:
+            # Phoenix's listings are in NDJSON pages, indexed relative to this file
+            result['listing_pages'] = f"{LISTING_PAGES_DIR}/{LISTING_PAGE_INDEX}"
+        result['updated'] = datetime.now(timezone.utc).isoformat()
+        return result
+
+
+MARKET_OUTPUTS = ('summary', 'verified_agents', 'customer_loyalty', 'photographers', 'photographer_analytics')
+
+
+def market_accumulators(market_name: str) -> list:
+    """Fresh accumulators for every per-market output, in MARKET_OUTPUTS order."""
+    return [
+        MarketSummaryAccumulator(),
+        VerifiedAgentsAccumulator(market_name),
+        CustomerLoyaltyAccumulator(market_name),
+        PhotographersAccumulator(market_name),
+        PhotographerAnalyticsAccumulator(market_name),
+    ]
+
+
+def build_market_outputs(rows: list, market_name: str) -> dict:
+    """
+    Build every per-market output in a single pass over the rows.
+    Rows must already carry derive_listing_fields() values.
+    Returns {'summary', 'verified_agents', 'customer_loyalty',
+    'photographers', 'photographer_analytics'}.
+    """
+    return dict(zip(MARKET_OUTPUTS, aggregate_rows(rows, market_accumulators(market_name))))
+
+
+def build_verified_agents(rows: list, market_name: str) -> dict:
+    """Build verified agents list from listings for a single market."""
+    derive_listing_fields(rows)
+    return aggregate_rows(rows, [VerifiedAgentsAccumulator(market_name)])[0]
+
+
+def build_customer_loyalty(rows: list, market_name: str) -> dict:
+    """Build customer loyalty analytics for a single market."""
+    derive_listing_fields(rows)
+    return aggregate_rows(rows, [CustomerLoyaltyAccumulator(market_name)])[0]
+
+
+def build_photographers_data(rows: list, market_name: str) -> dict:
+    """Build photographer/camera analytics from EXIF data for a single market."""
+    derive_listing_fields(rows)
+    return aggregate_rows(rows, [PhotographersAccumulator(market_name)])[0]
+
+
+def build_photographer_analytics(rows: list, market_name: str) -> dict:
+    """Build comprehensive photographer analytics for the photographer pages."""
+    derive_listing_fields(rows)
+    return aggregate_rows(rows, [PhotographerAnalyticsAccumulator(market_name)])[0]
+
+
+# =============================================================================
+# JSON OUTPUT
+# Every output file goes through write_json(). It encodes with orjson when
+# installed (pip install orjson) and falls back to the stdlib encoder. Large
+# top-level arrays (agents, listings, fingerprints) are streamed to the file
+# in batches instead of encoding the whole document into one string first.
+# Two styles: 'pretty' (2-space indent, the json.dump(indent=2) layout except
+# that arrays of plain numbers stay on one line, so a month bucket like
+# [3, 1, 1425000] costs one line instead of five) and 'compact' (no whitespace
+# at all).
+#
+# Outputs embed an 'updated' timestamp, so a naive rewrite changes every file
+# on every run. write_json() hashes the encoded document minus VOLATILE_FIELDS
+# and leaves the file untouched when that content hash matches the one
+# output/manifest.json recorded for it last run.
+# =============================================================================
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+JSON_STYLES = ('pretty', 'compact')
+JSON_STREAM_MIN_ITEMS = 256  # Top-level arrays at least this long are streamed
+JSON_STREAM_BATCH = 512      # Array items encoded per write
+
+# A pretty-printed array whose items are all numbers (JSON strings never hold
+# raw newlines, so this can't match inside one)
+NUMERIC_ARRAY = re.compile(rb'\[\n +(-?[0-9][0-9.eE+-]*(?:,\n +-?[0-9][0-9.eE+-]*)*)\n *\]')
+NUMERIC_ITEM_SEP = re.compile(rb',\n +')
+
+# Top-level keys that change every run even when the data doesn't
+VOLATILE_FIELDS = ('updated',)
+
+# Previous run's manifest entries by output name (see remember_previous_outputs)
+_PREVIOUS_OUTPUTS = {}
+# This run's writes: output name -> {'content_sha256': ..., 'written': bool}
+_WRITES = {}
+
+
+def output_name(path: Path) -> str:
+    """An output's name in the manifest and run metrics: its repo-relative path."""
+    return path.relative_to(SCRIPT_DIR).as_posix()
+
+
+def remember_previous_outputs(manifest: dict):
+    """Use a previous manifest's content hashes to skip unchanged writes."""
+    _PREVIOUS_OUTPUTS.clear()
+    _PREVIOUS_OUTPUTS.update(manifest.get('files', {}))
+
+
+def inline_numeric_arrays(encoded: bytes) -> bytes:
+    """Put each pretty-printed array of plain numbers on one line."""
+    return NUMERIC_ARRAY.sub(lambda m: b'[' + NUMERIC_ITEM_SEP.sub(b', ', m.group(1)) + b']', encoded)
+
+
+def json_encoder(style: str):
+    """Return encode(value) -> UTF-8 bytes for the given style."""
+    if style not in JSON_STYLES:
+        raise ValueError(f"Unknown JSON style '{style}' (expected one of {', '.join(JSON_STYLES)})")
+    if orjson is not None:
+        if style == 'pretty':
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+            return lambda value: inline_numeric_arrays(orjson.dumps(value, option=option))
+        return lambda value: orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    if style == 'pretty':
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+        return lambda value: inline_numeric_arrays(encoder.encode(value).encode('utf-8'))
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return lambda value: encoder.encode(value).encode('utf-8')
+
+
+def iter_json_chunks(data, style: str = 'pretty'):
+    """Yield the encoded document in chunks (see iter_keyed_json_chunks)."""
+    for _, chunk in iter_keyed_json_chunks(data, style):
+        yield chunk
+
+
+def iter_keyed_json_chunks(data, style: str = 'pretty'):
+    """
+    Yield (top-level key, chunk) pairs for the encoded document; the key is
+    None for the enclosing braces. A top-level dict is written key by key and
+    its long list values item by item; anything else in one piece.
+    """
+    encode = json_encoder(style)
+    if not isinstance(data, dict) or not data:
+        yield None, encode(data)
+        return
+
+    pretty = style == 'pretty'
+    # Nested lines in pretty mode are re-indented one or two levels deeper;
+    # JSON strings never contain raw newlines, so this is safe
+    key_sep, item_sep = (b': ', b',\n    ') if pretty else (b':', b',')
+    open_obj, next_key, close_obj = (b'{\n  ', b',\n  ', b'\n}') if pretty else (b'{', b',', b'}')
+    open_list, close_list = (b'[\n    ', b'\n  ]') if pretty else (b'[', b']')
+
+    def nested(value, depth):
+        encoded = encode(value)
+        return encoded.replace(b'\n', b'\n' + b'  ' * depth) if pretty else encoded
+
+    yield None, open_obj
+    for i, (key, value) in enumerate(data.items()):
+        head = (next_key if i else b'') + encode(key if isinstance(key, str) else str(key)) + key_sep
+        if isinstance(value, list) and len(value) >= JSON_STREAM_MIN_ITEMS:
+            yield key, head + open_list
+            for start in range(0, len(value), JSON_STREAM_BATCH):
+                batch = value[start:start + JSON_STREAM_BATCH]
+                chunk = item_sep.join(nested(item, 2) for item in batch)
+                yield key, (item_sep + chunk) if start else chunk
+            yield key, close_list
         else:
-            agent['non_lp_listings'] += 1
+            yield key, head + nested(value, 1)
+    yield None, close_obj
 
-        # Parse list_date
-        list_date = parse_list_date(row.get('list_date', ''))
 
-        # Store listing detail (limit to recent 20)
-        # Include all metadata for pattern identification - NO fallback to preferred_photographer
-        if len(agent['listings_detail']) < 20:
-            agent['listings_detail'].append({
-                'mls': row.get('mls_number', ''),
-                'address': row.get('listing_address', ''),
-                'lp': is_lp,
-                'status': 'LP Order' if is_lp else 'Other',
-                # Listing-level metadata for identification (not agent-level preferred)
-                'exif_artist': row.get('exif_artist', '') or '-',
-                'exif_copyright': row.get('exif_copyright', '') or '-',
-                'camera': camera if camera else '-',
-                'lens': row.get('exif_lens_model', '') or '-',
-                'filename': row.get('scraped_image_filename', '') or '-',
-                # List date for period filtering (ISO format YYYY-MM-DD)
-                'list_date': list_date,
-                # Timestamp for timeline filtering (legacy)
-                'timestamp': row.get('timestamp', '') or '-',
-            })
+def write_json(path: Path, data, style: str = 'pretty') -> bool:
+    """
+    Write data to path as JSON in the given style ('pretty' or 'compact'),
+    unless only VOLATILE_FIELDS changed since the previous run. Returns True
+    if the file was written. Either way the outcome is recorded in _WRITES.
+    """
+    return write_output(path, iter_keyed_json_chunks(data, style))
+
+
+def write_ndjson(path: Path, items: list) -> bool:
+    """Write items as NDJSON (one compact JSON document per line); see write_json."""
+    encode = json_encoder('compact')
+    return write_output(path, ((None, encode(item) + b'\n') for item in items))
+
+
+def write_output(path: Path, keyed_chunks) -> bool:
+    """
+    Write (top-level key, chunk) pairs to path, skipping the write when the
+    content hash (chunks of VOLATILE_FIELDS excluded) matches the previous
+    run's. Returns True if the file was written.
+    """
+    name = output_name(path)
+    content = hashlib.sha256()
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        for key, chunk in keyed_chunks:
+            if key not in VOLATILE_FIELDS:
+                content.update(chunk)
+            f.write(chunk)
+
+    digest = content.hexdigest()
+    written = not (path.exists() and _PREVIOUS_OUTPUTS.get(name, {}).get('content_sha256') == digest)
+    if written:
+        tmp_path.replace(path)
+    else:
+        tmp_path.unlink()
+    _WRITES[name] = {'content_sha256': digest, 'written': written}
+    return written
 
-    if camera_filtered_out > 0:
-        print(f"      Camera filter: {camera_filtered_out} address-matched orders filtered out (wrong camera)")
-
-    # Calculate percentages and build output
-    loyalty_list = []
-    for email, data in agents.items():
-        if data['total_listings'] > 0:
-            data['lp_percentage'] = round((data['lp_listings'] / data['total_listings']) * 100, 1)
-
-        loyalty_list.append({
-            'email': data['email'],
-            'name': data['name'],
-            'phone': data['phone'],
-            'office': data['office'],
-            'total_listings': data['total_listings'],
-            'listing_volume': data['listing_volume'],
-            'lp_listings': data['lp_listings'],
-            'non_lp_listings': data['non_lp_listings'],
-            'lp_percentage': data['lp_percentage'],
-            'preferred_photographer': data['preferred_photographer'],
-            'recent_listings': data['listings_detail'][:10],
-        })
-
-    # Sort by total listings descending
-    loyalty_list.sort(key=lambda x: x['total_listings'], reverse=True)
-
-    # Calculate summary stats
-    total_agents = len(loyalty_list)
-    agents_using_lp = len([a for a in loyalty_list if a['lp_listings'] > 0])
-    total_lp_listings = sum(a['lp_listings'] for a in loyalty_list)
-    total_all_listings = sum(a['total_listings'] for a in loyalty_list)
-
-    # Loyalty tiers
-    loyal_agents = [a for a in loyalty_list if a['lp_percentage'] >= 75 and a['total_listings'] >= 3]
-    occasional_agents = [a for a in loyalty_list if 25 <= a['lp_percentage'] < 75 and a['total_listings'] >= 3]
-    rare_agents = [a for a in loyalty_list if 0 < a['lp_percentage'] < 25 and a['total_listings'] >= 3]
-    never_used = [a for a in loyalty_list if a['lp_listings'] == 0 and a['total_listings'] >= 3]
 
+# =============================================================================
+# SHARDED AGENT OUTPUT (--agent-shards N)
+# verified_agents.json embeds every agent's listings, so looking up one agent
+# downloads the whole market. With --agent-shards N each market also gets an
+# agents/ folder: agent entries bucketed into N shard files by a hash of the
+# normalized email, plus a small index.json describing the layout. A client
+# finds an agent's shard with
+#   int(sha256(email.lower().strip()).hexdigest()[:8], 16) % shards
+# (the first 32 bits of the digest, big-endian) and fetches only that file.
+# A run without --agent-shards removes the folder, so stale shards are never
+# served alongside a newer verified_agents.json.
+# =============================================================================
+
+AGENT_SHARDS_DIR = "agents"
+AGENT_SHARD_INDEX = "index.json"
+
+
+def agent_hash32(email: str) -> int:
+    """First 32 bits of the SHA-256 of the normalized email."""
+    return int.from_bytes(hashlib.sha256(normalize_email(email).encode('utf-8')).digest()[:4], 'big')
+
+
+def agent_shard(email: str, shards: int) -> int:
+    """Shard number (0..shards-1) holding the agent with this email."""
+    return agent_hash32(email) % shards
+
+
+def agent_shard_name(shard: int) -> str:
+    return f"shard-{shard:03d}.json"
+
+
+def write_agent_shards(output_dir: Path, verified_agents: dict, shards: int, style: str = 'compact') -> list:
+    """
+    Write verified_agents' entries as shard files plus index.json under
+    output_dir/agents/. Shard files left over from a different shard count
+    are removed. Returns the paths written (shards, then the index).
+    """
+    shard_dir = output_dir / AGENT_SHARDS_DIR
+    shard_dir.mkdir(exist_ok=True)
+
+    buckets = [{} for _ in range(shards)]
+    for agent in verified_agents['agents']:
+        buckets[agent_shard(agent['email'], shards)][agent['email']] = agent
+
+    market = verified_agents['market']
+    names = []
+    paths = []
+    for shard, agents in enumerate(buckets):
+        name = agent_shard_name(shard)
+        write_json(shard_dir / name, {'market': market, 'shard': shard, 'agents': agents}, style)
+        names.append(name)
+        paths.append(shard_dir / name)
+
+    for path in shard_dir.glob("shard-*.json"):
+        if path.name not in names:
+            path.unlink()
+
+    index_path = shard_dir / AGENT_SHARD_INDEX
+    write_json(index_path, {
+        'market': market,
+        'total_agents': verified_agents['total_agents'],
+        'activity_fields': verified_agents['activity_fields'],
+        'activity_through': verified_agents['activity_through'],
+        'shards': shards,
+        'hash': 'sha256(lower(trim(email)))[:8 hex] mod shards',
+        'files': names,
+        'agents_per_shard': [len(agents) for agents in buckets],
+        'updated': verified_agents['updated'],
+    }, style)
+    return paths + [index_path]
+
+
+def remove_agent_shards(output_dir: Path) -> bool:
+    """Delete output_dir/agents/ left by an earlier sharded run; True if it existed."""
+    shard_dir = output_dir / AGENT_SHARDS_DIR
+    if not shard_dir.exists():
+        return False
+    shutil.rmtree(shard_dir)
+    return True
+
+
+# =============================================================================
+# LISTING PAGES (<market>-internal/listings/)
+# photographer_analytics.json only embeds its listings array for markets under
+# PhotographerAnalyticsAccumulator.LISTINGS_LIMIT. A market at the limit
+# (Phoenix) gets a listings/ folder instead, and its photographer_analytics
+# 'listing_pages' field points to the folder's index: every listing record
+# (the same fields as that array) sorted by list_date, newest first with
+# undated listings last, split into NDJSON pages of LISTING_PAGE_SIZE
+# records, plus an index.json giving each page's list date range and agent
+# email range. The site reads the index and fetches only the pages it needs.
+# --listing-pages [N] writes pages for every market, N records each; a
+# market that no longer needs them has its folder removed.
+# =============================================================================
+
+LISTING_PAGES_DIR = "listings"
+LISTING_PAGE_INDEX = "index.json"
+LISTING_PAGE_SIZE = 5000
+
+
+def listing_page_name(page: int) -> str:
+    return f"page-{page:04d}.ndjson"
+
+
+def listing_page_entry(name: str, listings: list) -> dict:
+    """Index entry for one page: its file, size and date / email ranges."""
+    dates = [listing['list_date'] for listing in listings if listing['list_date']]
+    emails = [listing['email'] for listing in listings]
     return {
+        'file': name,
+        'count': len(listings),
+        # Newest first, so the first dated listing has the latest date
+        'list_dates': [dates[-1], dates[0]] if dates else None,
+        'undated': len(listings) - len(dates),
+        'agent_emails': [min(emails), max(emails)],
+    }
+
+
+def write_listing_pages(output_dir: Path, market_name: str, listings, page_size: int,
+                        updated: str) -> list:
+    """
+    Write listings (an iterable already in page order, see
+    PhotographerAnalyticsAccumulator.paged_listings) as NDJSON pages plus
+    index.json under output_dir/listings/. Pages left over from a larger or
+    differently sized run are removed. Returns the paths written (pages,
+    then the index).
+    """
+    page_dir = output_dir / LISTING_PAGES_DIR
+    page_dir.mkdir(exist_ok=True)
+
+    pages = []
+    paths = []
+    total = 0
+    listings = iter(listings)
+    while True:
+        chunk = list(islice(listings, page_size))
+        if not chunk:
+            break
+        name = listing_page_name(len(pages))
+        write_ndjson(page_dir / name, chunk)
+        pages.append(listing_page_entry(name, chunk))
+        paths.append(page_dir / name)
+        total += len(chunk)
+
+    names = {entry['file'] for entry in pages}
+    for path in page_dir.glob("page-*.ndjson"):
+        if path.name not in names:
+            path.unlink()
+
+    index_path = page_dir / LISTING_PAGE_INDEX
+    write_json(index_path, {
         'market': market_name,
-        'summary': {
-            'total_agents': total_agents,
-            'agents_using_lp': agents_using_lp,
-            'total_lp_listings': total_lp_listings,
-            'total_listings': total_all_listings,
-            'overall_lp_percentage': round((total_lp_listings / total_all_listings * 100) if total_all_listings > 0 else 0, 1),
-        },
-        'loyalty_tiers': {
-            'loyal_75_plus': len(loyal_agents),
-            'occasional_25_to_75': len(occasional_agents),
-            'rare_under_25': len(rare_agents),
-            'never_used': len(never_used),
-        },
-        'top_loyal_agents': loyal_agents[:50],
-        'opportunity_agents': [a for a in never_used if a['total_listings'] >= 5][:50],
-        'all_agents': loyalty_list,
-        'updated': datetime.now(timezone.utc).isoformat(),
+        'total_listings': total,
+        'page_size': page_size,
+        'order': 'list_date descending, undated last',
+        'pages': pages,
+        'updated': updated,
+    }, 'pretty')
+    return paths + [index_path]
+
+
+def remove_listing_pages(output_dir: Path) -> bool:
+    """Delete output_dir/listings/ left by an earlier run; True if it existed."""
+    page_dir = output_dir / LISTING_PAGES_DIR
+    if not page_dir.exists():
+        return False
+    shutil.rmtree(page_dir)
+    return True
+
+
+# =============================================================================
+# AGENT MEMBERSHIP INDEX (output/agent_index.json)
+# Answers "is this email an active agent in market X" without downloading
+# any agent data. For each market the index stores the sorted 32-bit email
+# hashes (the same agent_hash32 the shards use), packed big-endian and
+# base64-encoded. A lookup is a binary search over that array. Different
+# emails share a 32-bit hash with probability about agents / 2**32 per lookup
+# (under 1 in 100,000 for a few thousand agents), so a hit is confirmed
+# against the agent's shard (or verified_agents.json) before it is trusted.
+# =============================================================================
+
+AGENT_INDEX_FILE = "agent_index.json"
+AGENT_INDEX_VERSION = 1
+
+
+def agent_index_hashes(verified_agents: dict) -> array:
+    """Sorted, de-duplicated 32-bit email hashes for one market's agents."""
+    return array('I', sorted({agent_hash32(agent['email']) for agent in verified_agents['agents']}))
+
+
+def pack_hashes(hashes: array) -> str:
+    packed = array('I', hashes)
+    if sys.byteorder == 'little':
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def unpack_hashes(encoded: str) -> array:
+    hashes = array('I')
+    hashes.frombytes(base64.b64decode(encoded))
+    if sys.byteorder == 'little':
+        hashes.byteswap()
+    return hashes
+
+
+def write_agent_index(path: Path, market_hashes: dict, updated: str) -> dict:
+    """Write the membership index for {market name: sorted hashes}; returns it."""
+    markets = {}
+    for name, hashes in market_hashes.items():
+        markets[name] = {
+            'count': len(hashes),
+            'false_positive_rate': round(len(hashes) / 2 ** 32, 10),
+            'hashes': pack_hashes(hashes),
+        }
+    index = {
+        'version': AGENT_INDEX_VERSION,
+        'hash': 'sha256(lower(trim(email)))[:8 hex], big-endian uint32, sorted, base64',
+        'markets': markets,
+        'updated': updated,
     }
+    write_json(path, index, 'compact')
+    return index
 
 
-def build_photographers_data(rows: list, market_name: str) -> dict:
-    """Build photographer/camera analytics from EXIF data for a single market."""
-    cameras = defaultdict(int)
-    photographers = defaultdict(int)
-    preferred_photographers = defaultdict(int)
+def load_agent_index(path: Path = None) -> dict:
+    """Load the membership index as {market name: sorted hash array}."""
+    with open(path or OUTPUT_DIR / AGENT_INDEX_FILE, 'rb') as f:
+        index = json.loads(f.read())
+    if index.get('version') != AGENT_INDEX_VERSION:
+        raise ValueError(f"Unsupported agent index version: {index.get('version')}")
+    return {name: unpack_hashes(market['hashes']) for name, market in index['markets'].items()}
 
-    for row in rows:
-        make = row.get('exif_make', '').strip()
-        model = row.get('exif_model', '').strip()
-        if make and model:
-            camera_key = f"{make} {model}"
-            cameras[camera_key] += 1
-        elif make:
-            cameras[make] += 1
 
-        artist = row.get('exif_artist', '').strip()
-        if artist:
-            photographers[artist] += 1
+def agent_in_index(index: dict, email: str, market_name: str) -> bool:
+    """Binary-search the market's hashes. May rarely be a false positive."""
+    hashes = index.get(market_name)
+    if not hashes or not email:
+        return False
+    target = agent_hash32(email)
+    pos = bisect_left(hashes, target)
+    return pos < len(hashes) and hashes[pos] == target
 
-        preferred = row.get('preferred_photographer', '').strip()
-        if preferred:
-            preferred_photographers[preferred] += 1
 
-    return {
+def shards_published(shard_index: Path) -> bool:
+    """True if the shard index on disk is the one the last run listed in output/manifest.json."""
+    entry = load_manifest().get('files', {}).get(output_name(shard_index))
+    return entry is not None and entry['sha256'] == hashlib.sha256(shard_index.read_bytes()).hexdigest()
+
+
+def lookup_agent(email: str, market_name: str, index: dict = None):
+    """
+    Return the market's verified agent entry for email, or None.
+    The membership index rules out misses cheaply; a hit is confirmed against
+    the agent's shard when the last run published shards, else
+    verified_agents.json.
+    """
+    email = normalize_email(email)
+    if index is None:
+        index = load_agent_index()
+    if not agent_in_index(index, email, market_name):
+        return None
+
+    market = next(m for m in MARKETS if m['name'] == market_name)
+    shard_index = market['output_dir'] / AGENT_SHARDS_DIR / AGENT_SHARD_INDEX
+    if shard_index.exists() and shards_published(shard_index):
+        with open(shard_index, 'rb') as f:
+            layout = json.loads(f.read())
+        with open(shard_index.parent / layout['files'][agent_shard(email, layout['shards'])], 'rb') as f:
+            return json.loads(f.read())['agents'].get(email)
+
+    with open(market['output_dir'] / MARKET_FILES['verified_agents'][0], 'rb') as f:
+        agents = json.loads(f.read())['agents']
+    return next((agent for agent in agents if agent['email'] == email), None)
+
+
+# =============================================================================
+# PUBLISHED ASSETS (output/manifest.json)
+# jsDelivr caches the mutable @main paths unpredictably, so every output is
+# also published as an immutable, content-hashed copy under output/assets/
+# (e.g. assets/phx-internal/verified_agents.<sha256[:12]>.json) with
+# precompressed .gz and .br siblings (.br needs pip install brotli).
+# output/manifest.json maps each logical output to its current asset and
+# byte sizes: clients fetch the small manifest, then only the assets whose
+# hash changed, which can be cached forever. An asset that already exists
+# is not rewritten or recompressed. Assets referenced by neither the new nor
+# the previous manifest are pruned.
+# =============================================================================
+
+ASSETS_DIR = OUTPUT_DIR / "assets"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+ASSET_HASH_LENGTH = 12
+
+
+def gzip_compress(data: bytes) -> bytes:
+    # mtime=0 keeps the .gz byte-identical for identical content
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def brotli_compress(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11)
+
+
+# Precompressed sibling suffix -> compressor (brotli only when installed)
+COMPRESSORS = {'gz': gzip_compress}
+if brotli is not None:
+    COMPRESSORS['br'] = brotli_compress
+
+
+def publish_file(path: Path) -> tuple:
+    """
+    Publish one output file as a content-hashed asset with compressed
+    siblings. Returns (output name, manifest entry). A file write_json()
+    skipped as unchanged, or a file this run never wrote whose bytes still
+    match, keeps its previous entry, as long as that entry has every current
+    compressed sibling (a compressor may have been installed since).
+    """
+    name = output_name(path)
+    write = _WRITES.get(name, {})
+    previous = _PREVIOUS_OUTPUTS.get(name)
+    reusable = (previous and all(f'{suffix}_bytes' in previous for suffix in COMPRESSORS)
+                and all((SCRIPT_DIR / asset).exists() for asset in entry_assets(previous)))
+    if reusable and write.get('written') is False:
+        return name, previous
+
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if reusable and not write and digest == previous['sha256']:
+        return name, previous
+    rel = path.relative_to(OUTPUT_DIR if OUTPUT_DIR in path.parents else SCRIPT_DIR)
+    asset = ASSETS_DIR / rel.parent / f"{path.stem}.{digest[:ASSET_HASH_LENGTH]}{path.suffix}"
+
+    entry = {'path': output_name(asset), 'sha256': digest, 'bytes': len(data)}
+    if 'content_sha256' in write:
+        entry['content_sha256'] = write['content_sha256']
+    if not asset.exists():
+        asset.parent.mkdir(parents=True, exist_ok=True)
+        asset.write_bytes(data)
+    for suffix, compress in COMPRESSORS.items():
+        sibling = asset.with_name(f"{asset.name}.{suffix}")
+        if not sibling.exists():
+            sibling.write_bytes(compress(data))
+        entry[f'{suffix}_bytes'] = sibling.stat().st_size
+    return name, entry
+
+
+def publish_files(paths: list) -> dict:
+    """Publish several output files; returns {logical name: manifest entry}."""
+    return dict(publish_file(path) for path in paths)
+
+
+def entry_assets(entry: dict) -> list:
+    """A manifest entry's asset file and its compressed siblings."""
+    return [entry['path']] + [f"{entry['path']}.{suffix}" for suffix in COMPRESSORS if f'{suffix}_bytes' in entry]
+
+
+def manifest_assets(manifest: dict) -> set:
+    """Every asset file (with compressed siblings) a manifest references."""
+    assets = set()
+    for entry in manifest.get('files', {}).values():
+        assets.add(entry['path'])
+        assets.update(f"{entry['path']}.{suffix}" for suffix in manifest.get('compression', ()))
+    return assets
+
+
+def load_manifest() -> dict:
+    """The previous run's output/manifest.json, or {} if missing or unusable."""
+    path = OUTPUT_DIR / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'rb') as f:
+            manifest = json.loads(f.read())
+    except ValueError:
+        return {}
+    return manifest if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def write_manifest(files: dict, updated: str) -> dict:
+    """
+    Write output/manifest.json for the published files and prune assets that
+    neither it nor the previous manifest references. Returns the manifest.
+    """
+    path = OUTPUT_DIR / MANIFEST_FILE
+    previous = load_manifest()
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'compression': list(COMPRESSORS),
+        'files': dict(sorted(files.items())),
+        'updated': updated,
+    }
+    stable = {key: value for key, value in manifest.items() if key not in VOLATILE_FIELDS}
+    if path.exists() and stable == {key: value for key, value in previous.items() if key not in VOLATILE_FIELDS}:
+        _WRITES[output_name(path)] = {'written': False}
+    else:
+        write_json(path, manifest, 'pretty')
+
+    keep = manifest_assets(manifest) | manifest_assets(previous)
+    for asset in ASSETS_DIR.rglob("*"):
+        if asset.is_file() and asset.relative_to(SCRIPT_DIR).as_posix() not in keep:
+            asset.unlink()
+    return manifest
+
+
+# =============================================================================
+# DELTA FEED (<market>-internal/deltas/)
+# Dashboards cache the market outputs and only need what changed. Every run
+# that changes a market's outputs bumps that market's generation (recorded in
+# deltas/index.json only, so a change to one output doesn't rewrite the others)
+# and writes deltas/delta-<generation>.json describing the change from the
+# previous generation, i.e. the files still on disk from the last run. Those
+# files are a usable base only if they are byte for byte what the last run
+# published with this index (per output/manifest.json). Per output it lists the
+# changed top-level fields ('set'/'unset', or 'merge' one level into changed
+# dicts, with 'order' when their keys were reordered) and, for the keyed
+# collections in DELTA_COLLECTIONS, the entries added (with their positions),
+# removed (by key) and changed (only the changed fields), or the full key order
+# when entries moved. DELTA_KEYED_MAPS fields (dicts of keyed lists) get the
+# same treatment per list under 'maps'. deltas/index.json lists the last
+# DELTA_HISTORY deltas; a client whose cached generation is older than the
+# first delta's base_generation re-fetches the full files instead.
+# =============================================================================
+
+DELTAS_DIR = "deltas"
+DELTA_INDEX = "index.json"
+DELTA_HISTORY = 28  # About a week of six-hourly runs
+
+# Keyed collections diffed entry by entry: output -> {collection key: entry key}
+DELTA_COLLECTIONS = {
+    'verified_agents': {'agents': 'email'},
+    'customer_loyalty': {'all_agents': 'email'},
+    'photographers': {},
+    'photographer_analytics': {'listings': 'mls'},
+}
+
+# Dicts of keyed lists, diffed list by list: output -> {field: entry key}
+DELTA_KEYED_MAPS = {
+    'photographer_analytics': {'artist_agents': 'email', 'camera_agents': 'email'},
+}
+
+# Top-level keys that are not data (never reported as changed); outputs
+# written before the generation moved to deltas/index.json still embed it
+DELTA_IGNORED_FIELDS = VOLATILE_FIELDS + ('generation',)
+
+
+def json_roundtrip(value):
+    """value as it reads back from a JSON file (tuples -> lists, int keys -> str)."""
+    if orjson is not None:
+        return orjson.loads(orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS))
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+def json_differs(old, new) -> bool:
+    return old != new and old != json_roundtrip(new)
+
+
+def diff_fields(old: dict, new: dict, ignored=()) -> dict:
+    """{'set': {field: new value}, 'unset': [fields]} for the changed fields."""
+    changes = {}
+    changed = {field: value for field, value in new.items()
+               if field not in ignored and (field not in old or json_differs(old[field], value))}
+    if changed:
+        changes['set'] = changed
+    removed = [field for field in old if field not in new and field not in ignored]
+    if removed:
+        changes['unset'] = removed
+    return changes
+
+
+def diff_collection(old_items: list, new_items: list, key: str) -> dict:
+    """Added, removed and changed entries of a keyed list, plus order if needed."""
+    old = {item[key]: item for item in old_items}
+    new_keys = [item[key] for item in new_items]
+    new_key_set = set(new_keys)
+
+    added = [item for item in new_items if item[key] not in old]
+    removed = [item_key for item_key in old if item_key not in new_key_set]
+    changed = {}
+    for item in new_items:
+        previous = old.get(item[key])
+        if previous is not None:
+            fields = diff_fields(previous, item)
+            if fields:
+                changed[item[key]] = fields
+
+    delta = {}
+    if added:
+        delta['added'] = added
+    if removed:
+        delta['removed'] = removed
+    if changed:
+        delta['changed'] = changed
+    # When surviving entries kept their relative order, new entries are
+    # inserted at 'added_at' (their indexes in the new list, ascending);
+    # otherwise the full key order is sent
+    surviving = [item_key for item_key in old if item_key in new_key_set]
+    if [item_key for item_key in new_keys if item_key in old] == surviving:
+        if added:
+            delta['added_at'] = [i for i, item_key in enumerate(new_keys) if item_key not in old]
+    else:
+        delta['order'] = new_keys
+    return delta
+
+
+def diff_keyed_map(old_map: dict, new_map: dict, key: str) -> dict:
+    """Delta of a dict of keyed lists: lists set, unset or diffed per entry."""
+    delta = {}
+    added = {name: items for name, items in new_map.items() if name not in old_map}
+    removed = [name for name in old_map if name not in new_map]
+    changed = {}
+    for name, items in new_map.items():
+        if name in old_map:
+            changes = diff_collection(old_map[name], items, key)
+            if changes:
+                changed[name] = changes
+    if added:
+        delta['set'] = added
+    if removed:
+        delta['unset'] = removed
+    if changed:
+        delta['changed'] = changed
+    implied = [name for name in old_map if name in new_map] + list(added)
+    if implied != list(new_map):
+        delta['order'] = list(new_map)
+    return delta
+
+
+def diff_output(old: dict, new: dict, collections: dict, keyed_maps: dict = None) -> dict:
+    """
+    Delta between two generations of one output ({} if unchanged). Changed
+    top-level dicts (e.g. camera counts) are diffed one level down into
+    'merge'; other changed fields are replaced whole via 'set'.
+    """
+    keyed_maps = keyed_maps or {}
+    keyed = set(collections) | set(keyed_maps)
+    delta = diff_fields({k: v for k, v in old.items() if k not in keyed},
+                        {k: v for k, v in new.items() if k not in keyed},
+                        DELTA_IGNORED_FIELDS)
+    for field, value in list(delta.get('set', {}).items()):
+        if isinstance(value, dict) and isinstance(old.get(field), dict):
+            changes = diff_fields(old[field], value)
+            # Counts are sorted by value, so a changed dict may also reorder
+            implied = [k for k in old[field] if k in value] + [k for k in value if k not in old[field]]
+            if implied != list(value):
+                changes['order'] = list(value)
+            delta.setdefault('merge', {})[field] = changes
+            del delta['set'][field]
+    if 'set' in delta and not delta['set']:
+        del delta['set']
+    for name, key in collections.items():
+        changes = diff_collection(old.get(name, []), new.get(name, []), key)
+        if changes:
+            delta.setdefault('collections', {})[name] = dict(changes, key=key)
+    for name, key in keyed_maps.items():
+        changes = diff_keyed_map(old.get(name, {}), new.get(name, {}), key)
+        if changes:
+            delta.setdefault('maps', {})[name] = dict(changes, key=key)
+    return delta
+
+
+def read_json(path: Path):
+    """Parse a JSON file, or return None if it is missing or unreadable."""
+    try:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read()) if orjson is not None else json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def read_published_json(path: Path):
+    """
+    Parse an output file if it is exactly the copy the previous run
+    published (sha256 as in output/manifest.json), else return None.
+    """
+    entry = _PREVIOUS_OUTPUTS.get(output_name(path))
+    if entry is None:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if hashlib.sha256(data).hexdigest() != entry['sha256']:
+        return None
+    try:
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    except ValueError:
+        return None
+
+
+def delta_file_name(generation: int) -> str:
+    return f"delta-{generation:06d}.json"
+
+
+def write_market_delta(output_dir: Path, market_name: str, outputs: dict, updated: str):
+    """
+    Diff this run's outputs against the previous generation on disk and
+    write the delta plus deltas/index.json. Returns (generation for this
+    run's outputs, delta paths to publish).
+    """
+    delta_dir = output_dir / DELTAS_DIR
+    index_path = delta_dir / DELTA_INDEX
+    index = read_json(index_path) or {}
+    generation = index.get('generation', 0)
+    history = index.get('deltas', [])
+
+    # One previous output in memory at a time; an index or output file the
+    # last run didn't publish (--no-deltas, an interrupted run, a manual
+    # edit) means there is no consistent base to diff against
+    delta = None
+    if generation and read_published_json(index_path) is not None:
+        delta = {}
+        for name, collections in DELTA_COLLECTIONS.items():
+            old = read_published_json(output_dir / MARKET_FILES[name][0])
+            if old is None:
+                delta = None
+                break
+            changes = diff_output(old, outputs[name], collections, DELTA_KEYED_MAPS.get(name))
+            if changes:
+                delta[name] = changes
+
+    delta_dir.mkdir(exist_ok=True)
+    if delta is not None:
+        if not delta:
+            return generation, [index_path] if index_path.exists() else []
+        generation += 1
+        delta_path = delta_dir / delta_file_name(generation)
+        write_json(delta_path, {
+            'market': market_name,
+            'generation': generation,
+            'base_generation': generation - 1,
+            'outputs': delta,
+            'updated': updated,
+        }, 'compact')
+        history = (history + [{
+            'generation': generation,
+            'base_generation': generation - 1,
+            'file': delta_path.name,
+            'bytes': delta_path.stat().st_size,
+        }])[-DELTA_HISTORY:]
+    else:
+        # No usable previous generation: start a new one, clients do a full fetch
+        generation += 1
+        history = []
+
+    keep = {entry['file'] for entry in history}
+    for path in delta_dir.glob("delta-*.json"):
+        if path.name not in keep:
+            path.unlink()
+    write_json(index_path, {
         'market': market_name,
-        'cameras': dict(sorted(cameras.items(), key=lambda x: x[1], reverse=True)),
-        'photographers': dict(sorted(photographers.items(), key=lambda x: x[1], reverse=True)),
-        'preferred_photographers': dict(sorted(preferred_photographers.items(), key=lambda x: x[1], reverse=True)),
-        'updated': datetime.now(timezone.utc).isoformat(),
+        'generation': generation,
+        'oldest_base_generation': history[0]['base_generation'] if history else generation,
+        'deltas': history,
+        'updated': updated,
+    }, 'pretty')
+    return generation, [index_path]
+
+
+# =============================================================================
+# RUN METRICS (output/run_metrics.json)
+# A small report about the last run, for spotting churn and regressions.
+# 'outputs' lists which files were rewritten and which write_json() left
+# untouched because only their timestamp would have changed. 'stages' has
+# one record per measured stage, per market ('main' for the lookups and the
+# combined outputs): wall and CPU seconds, rows in/out, bytes written and
+# the process's peak RSS, plus the tracemalloc peak with --trace-memory.
+# Records whose 'parent' is set are steps within that stage (prepare's
+# read_csv, dedupe, enrich, ...). 'history' keeps the last
+# RUN_METRICS_HISTORY runs' totals and per-stage wall times for trends.
+# Since it changes on every run, the file is git-ignored: it stays local
+# and is never committed or published.
+# =============================================================================
+
+RUN_METRICS_FILE = "run_metrics.json"
+RUN_METRICS_HISTORY = 100
+
+# Output entries counted as a build stage's rows_out: output -> key
+STAGE_OUTPUT_ROWS = {
+    'summary': 'total',
+    'verified_agents': 'agents',
+    'customer_loyalty': 'all_agents',
+    'photographers': 'photographers',
+    'photographer_analytics': 'listings',
+}
+
+# This process's stage records, in start order (see measure_stage)
+_STAGE_METRICS = []
+# Per-thread stack of the stages being measured (for nesting)
+_ACTIVE_STAGES = threading.local()
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    """Peak resident set size so far (ru_maxrss is KB on Linux)."""
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+@contextlib.contextmanager
+def measure_stage(name: str, rows_in: int = None):
+    """
+    Record the enclosed block as stage `name` in _STAGE_METRICS: wall time,
+    CPU time of this thread, process peak RSS and, when tracemalloc is
+    tracing, its peak. Yields the record so the block can set 'rows_out'.
+    A stage measured inside another one records it as its 'parent'.
+    """
+    stack = getattr(_ACTIVE_STAGES, 'stack', None)
+    if stack is None:
+        stack = _ACTIVE_STAGES.stack = []
+    record = {'stage': name}
+    if stack:
+        record['parent'] = stack[-1]['stage']
+    if rows_in is not None:
+        record['rows_in'] = rows_in
+    _STAGE_METRICS.append(record)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if stack:
+            # Keep the parent's peak so far before restarting the count
+            stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(record)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    finally:
+        record['wall_seconds'] = round(time.perf_counter() - wall, 4)
+        record['cpu_seconds'] = round(time.thread_time() - cpu, 4)
+        stack.pop()
+        if tracing:
+            peak = max(record.pop('_peak', 0), tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = round(peak / 2 ** 20, 1)
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1].get('_peak', 0), peak)
+        record['max_rss_mb'] = max_rss_mb()
+
+
+def stage_output_metrics(results: dict) -> dict:
+    """rows_out (table rows or an output's entries) and bytes written, from a stage's outputs."""
+    metrics = {}
+    for name, value in results.items():
+        if isinstance(value, ListingTable):
+            metrics['rows_out'] = len(value)
+        elif name in STAGE_OUTPUT_ROWS and isinstance(value, dict):
+            count = value.get(STAGE_OUTPUT_ROWS[name])
+            metrics['rows_out'] = count if isinstance(count, int) else len(count or ())
+        paths = value if isinstance(value, list) else [value]
+        sizes = [path.stat().st_size for path in paths if isinstance(path, Path) and path.exists()]
+        if sizes:
+            metrics['bytes'] = metrics.get('bytes', 0) + sum(sizes)
+    return metrics
+
+
+def take_stage_metrics(start: int = 0) -> list:
+    """Remove and return the stage records from index `start` on."""
+    records = _STAGE_METRICS[start:]
+    del _STAGE_METRICS[start:]
+    return records
+
+
+def leaf_stages(stages: dict) -> list:
+    """(group, record) for every stage without measured steps of its own."""
+    leaves = []
+    for group, records in stages.items():
+        parents = {record.get('parent') for record in records}
+        leaves.extend((group, record) for record in records if record['stage'] not in parents)
+    return leaves
+
+
+def run_history_entry(run: dict, stages: dict, updated: str) -> dict:
+    """One run's totals plus wall seconds per stage name, summed over markets."""
+    stage_seconds = {}
+    for _, record in leaf_stages(stages):
+        stage_seconds[record['stage']] = round(stage_seconds.get(record['stage'], 0) + record['wall_seconds'], 4)
+    return {
+        'updated': updated,
+        'wall_seconds': run['wall_seconds'],
+        'cpu_seconds': run['cpu_seconds'],
+        'max_rss_mb': run['max_rss_mb'],
+        'listings': run['listings'],
+        'stages': stage_seconds,
     }
 
 
-def build_photographer_analytics(rows: list, market_name: str) -> dict:
+def write_run_metrics(writes: dict, updated: str, run: dict = None, stages: dict = None):
     """
-    Build comprehensive photographer analytics for the photographer pages.
-    This is a lighter-weight alternative to customer_loyalty.json that includes
-    only what's needed for photographer analysis.
+    Write output/run_metrics.json from {output name: write status}, this
+    run's totals and {market name or 'main': stage records}, appending the
+    run to the rolling history kept from the previous file.
     """
-    # Track all listings with their metadata
-    listings = []
-    agents_by_email = {}
-    cameras = defaultdict(int)
-    lenses = defaultdict(int)
-    exif_artists = defaultdict(int)
-    preferred_photographers = defaultdict(int)
-    equipment_fingerprints = defaultdict(lambda: {
-        'count': 0,
-        'agents': set(),
-        'exif_artists': defaultdict(int),
-        'sample_listings': []
-    })
-    # Track which agents use each EXIF artist (for photographer->agent lookup)
-    artist_to_agents = defaultdict(lambda: defaultdict(lambda: {
-        'count': 0,
-        'email': '',
-        'name': '',
-        'phone': '',
-        'office': '',
-        'total_listings': 0,
-        'lp_listings': 0,
-    }))
-
-    # Track camera to agents (who uses each camera model)
-    camera_to_agents = defaultdict(lambda: defaultdict(lambda: {
-        'count': 0,
-        'email': '',
-        'name': '',
-        'phone': '',
-        'office': '',
-        'total_listings': 0,
-        'lp_listings': 0,
-    }))
-
-    # Track LP stats
-    total_listings = 0
-    lp_listings = 0
-    agents_with_lp = set()
+    path = OUTPUT_DIR / RUN_METRICS_FILE
+    skipped = sorted(name for name, write in writes.items() if not write['written'])
+    metrics = {
+        'outputs': {
+            'written': len(writes) - len(skipped),
+            'skipped': len(skipped),
+            'skipped_files': skipped,
+        },
+    }
+    if run is not None:
+        previous = read_json(path) or {}
+        history = previous.get('history', []) + [run_history_entry(run, stages, updated)]
+        metrics['run'] = run
+        metrics['stages'] = stages
+        metrics['history'] = history[-RUN_METRICS_HISTORY:]
+    metrics['updated'] = updated
+    write_json(path, metrics, 'pretty')
+
+
+# =============================================================================
+# INCREMENTAL PROCESSING (--incremental)
+# The scrapers only ever append to the listings CSVs, so a run can resume
+# where the last one stopped. Each market keeps a state file holding its
+# deduped table (including each row's pre-inference lp_flag_enriched), its
+# retractable accumulators and a watermark for the input CSV: the byte
+# offset already consumed and a SHA-256 of that prefix. The next run
+# verifies the prefix, parses only the appended bytes, folds them in with
+# dedupe_by_mls's keep-newest rule and re-folds only the affected agents.
+# Status reconciliation rewrites rows inside the prefix; it journals each
+# rewrite, so the watermark is rebased across it and the rewritten rows are
+# applied to the saved table. Any other rewritten prefix, a rewrite the
+# journal no longer holds, changed lookup files or a STATE_VERSION bump
+# falls back to a full rebuild.
+# =============================================================================
+
+STATE_DIR = SCRIPT_DIR / "state"
+STATE_VERSION = 6
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(filepath: Path, length: int = None) -> str:
+    """SHA-256 of a file's first `length` bytes (whole file if None). '' if missing."""
+    if not filepath.exists():
+        return ''
+    hasher = hashlib.sha256()
+    remaining = filepath.stat().st_size if length is None else length
+    with open(filepath, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher.hexdigest()
 
-    for row in rows:
-        email = row.get('agent_email', '')
-        if not email or '@' not in email:
+
+def lookups_fingerprint(*paths: Path) -> str:
+    """Combined hash of the lookup CSVs; enrichment must be redone when it changes."""
+    return hashlib.sha256('|'.join(file_sha256(p) for p in paths).encode()).hexdigest()
+
+
+def read_csv_header(filepath: Path) -> list:
+    """Return the raw header row of a CSV file."""
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        return next(csv.reader(f), [])
+
+
+def read_csv_tail(filepath: Path, watermark: dict):
+    """
+    Parse rows appended after a watermark ({'offset', 'sha256', 'headers'}).
+    Returns (ListingTable, new_watermark), or None if the file no longer
+    starts with the watermarked prefix.
+    """
+    offset = watermark['offset']
+    if filepath.stat().st_size < offset:
+        return None
+
+    hasher = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        remaining = offset
+        last_byte = b'\n'
+        while remaining > 0:
+            chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+            if not chunk:
+                return None
+            hasher.update(chunk)
+            last_byte = chunk[-1:]
+            remaining -= len(chunk)
+        # The prefix must match and end on a line boundary
+        if hasher.hexdigest() != watermark['sha256'] or last_byte != b'\n':
+            return None
+        tail = f.read()
+
+    hasher.update(tail)
+    text = io.StringIO(tail.decode('utf-8', errors='ignore'), newline=None)
+    table = append_csv_rows(ListingTable(), watermark['headers'], csv.reader(text))
+    return table, dict(watermark, offset=offset + len(tail), sha256=hasher.hexdigest())
+
+
+def file_chunks(filepath: Path):
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def unpatched(chunks, patches: list):
+    """
+    The bytes a file had before a journaled rewrite, streamed from the bytes
+    it had after it (chunks) and the rewrite's (old offset, new offset, old
+    bytes, new bytes) patches, in file order.
+    """
+    pending = iter(patches)
+    patch = next(pending, None)
+    position = 0  # In the rewritten file
+    skip = 0      # Rewritten bytes still to drop
+    for chunk in chunks:
+        while chunk:
+            if skip:
+                step = min(skip, len(chunk))
+                skip -= step
+            elif patch is not None and patch[1] == position:
+                yield patch[2]
+                skip = len(patch[3])
+                patch = next(pending, None)
+                continue
+            else:
+                step = len(chunk) if patch is None else min(len(chunk), patch[1] - position)
+                yield chunk[:step]
+            chunk = chunk[step:]
+            position += step
+
+
+def prefix_sha256(chunks, length: int) -> str:
+    """SHA-256 of the first `length` bytes of a chunk stream ('' if it is shorter)."""
+    hasher = hashlib.sha256()
+    for chunk in chunks:
+        if len(chunk) >= length:
+            hasher.update(chunk[:length])
+            return hasher.hexdigest()
+        hasher.update(chunk)
+        length -= len(chunk)
+    return hasher.hexdigest() if length == 0 else ''
+
+
+def rebase_watermark(filepath: Path, watermark: dict):
+    """
+    Carry a CSV watermark across the rewrites reconcile_statuses journaled
+    since it was taken. Returns (watermark for the file as it is now, the
+    rewritten rows inside the prefix as (old text, old headers, new text,
+    new headers)), or None if the journal can't vouch for the prefix.
+    """
+    seen = watermark.get('rewrite', 0)
+    rewrites = [rewrite for rewrite in read_rewrites(filepath) if rewrite['rewrite'] > seen]
+    if not rewrites:
+        return watermark, []
+    if rewrites[0]['rewrite'] != seen + 1 or any(rewrite['patches'] is None for rewrite in rewrites):
+        return None
+    # Journaled text keeps a CSV's stray bytes as lone surrogates
+    rewrites = [[(old, new, old_text.encode('utf-8', CSV_ERRORS), new_text.encode('utf-8', CSV_ERRORS))
+                 for old, new, old_text, new_text in rewrite['patches']] for rewrite in rewrites]
+
+    # Undo the rewrites, newest first: the file as the watermark saw it must
+    # still start with the watermarked prefix
+    chunks = file_chunks(filepath)
+    for patches in reversed(rewrites):
+        chunks = unpatched(chunks, patches)
+    if prefix_sha256(chunks, watermark['offset']) != watermark['sha256']:
+        return None
+
+    # Then shift the offset through them, oldest first
+    offset = watermark['offset']
+    headers = watermark['headers']
+    updates = []
+    for patches in rewrites:
+        shift = 0
+        new_headers = headers
+        for old, _, old_text, new_text in patches:
+            if old >= offset:
+                break
+            shift += len(new_text) - len(old_text)
+            if old == 0:
+                new_headers = next(csv.reader(io.StringIO(new_text.decode('utf-8', errors='ignore'), newline=None)), [])
+            else:
+                updates.append((old_text, headers, new_text, new_headers))
+        offset += shift
+        headers = new_headers
+    return dict(watermark, offset=offset, sha256=file_sha256(filepath, offset), headers=headers,
+                rewrite=seen + len(rewrites)), updates
+
+
+def parse_csv_record(text: bytes, headers: list) -> dict:
+    """One raw CSV record as a normalized row dict, or None (no MLS number)."""
+    table = append_csv_rows(ListingTable(), headers,
+                            csv.reader(io.StringIO(text.decode('utf-8', errors='ignore'), newline=None)))
+    return table[0].to_dict() if len(table) else None
+
+
+def apply_row_updates(rows: 'ListingTable', updates: list) -> list:
+    """
+    Apply rewritten prefix rows (see rebase_watermark) to a deduped table.
+    Reconciliation gives every row of a listing the same new values, so a
+    rewrite's changed fields carry over to the row kept for its MLS number
+    whichever of its rows was rewritten. Returns the touched row indices.
+    """
+    seen = {mls: idx for idx, mls in enumerate(rows.column('mls_number'))}
+    touched = {}
+    for old_text, old_headers, new_text, new_headers in updates:
+        old = parse_csv_record(old_text, old_headers) or {}
+        new = parse_csv_record(new_text, new_headers)
+        idx = seen.get(new['mls_number']) if new is not None else None
+        if idx is None:
             continue
+        row = rows[idx]
+        for field, value in new.items():
+            if value != old.get(field, ''):
+                row[field] = value
+        touched[idx] = True
+    return list(touched)
+
+
+def market_state_path(market_name: str) -> Path:
+    return STATE_DIR / f"{market_name}.pickle"
+
+
+def load_market_state(market_name: str):
+    """Load a market's incremental state, or None if missing or unreadable."""
+    path = market_state_path(market_name)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"    Warning: could not read {path.name} ({e}) - full rebuild")
+        return None
+
+
+def save_market_state(market_name: str, state: dict):
+    """Write a market's incremental state atomically."""
+    STATE_DIR.mkdir(exist_ok=True)
+    path = market_state_path(market_name)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path.replace(path)
+
+
+def fold_new_rows(rows: 'ListingTable', new_rows: 'ListingTable'):
+    """
+    Fold appended rows into a deduped table using dedupe_by_mls's rule
+    (first-seen position, newest timestamp wins).
+    Returns (touched row indices, agent emails of the rows that were replaced).
+    """
+    seen = {mls: idx for idx, mls in enumerate(rows.column('mls_number'))}
+    touched = {}
+    replaced_emails = set()
+    for new_row in new_rows:
+        mls = new_row.get('mls_number', '')
+        if not mls:
+            continue
+        idx = seen.get(mls)
+        if idx is None:
+            rows.append(new_row.to_dict())
+            idx = seen[mls] = len(rows) - 1
+        elif new_row.get('timestamp', '') > rows[idx].get('timestamp', ''):
+            replaced_emails.add(rows[idx].get('agent_email', ''))
+            rows.set_row(idx, new_row.to_dict())
+        else:
+            continue
+        touched[idx] = True
+    return list(touched), replaced_emails
 
-        total_listings += 1
 
-        # Build camera string
-        camera = f"{row.get('exif_make', '')} {row.get('exif_model', '')}".strip()
-        if not camera:
-            camera = '-'
-        lens = row.get('exif_lens_model', '') or '-'
+def refold_agents(rows: 'ListingTable', accumulators: list, touched: list, replaced_emails: set) -> int:
+    """
+    Re-fold the touched rows plus every row of the agents they belong to
+    (before or after the update) into retractable accumulators.
 
-        # LP validation
-        address_matched = row.get('lp_flag', '').lower() in ['yes', 'true', '1']
-        camera_valid = is_valid_lp_camera(camera)
-        is_lp = address_matched and camera_valid
+    LP inference depends on an agent's whole listing history, so each
+    affected agent's rows are reset to their enriched lp_flag, re-inferred
+    and re-derived, then re-added (add() retracts the old contribution).
+    Returns the number of rows re-folded.
+    """
+    emails = rows.column('agent_email')
+    affected_agents = {email for email in replaced_emails if email and '@' in email}
+    affected_agents.update(emails[idx] for idx in touched if '@' in emails[idx])
 
-        if is_lp:
-            lp_listings += 1
-            agents_with_lp.add(email)
+    indices = sorted(set(touched).union(idx for idx, email in enumerate(emails) if email in affected_agents))
+    affected_rows = [rows[idx] for idx in indices]
+    for row in affected_rows:
+        row['lp_flag'] = row['lp_flag_enriched']
+        row['lp_inferred'] = ''
 
-        # Track agent
-        if email not in agents_by_email:
-            agents_by_email[email] = {
-                'email': email,
-                'name': row.get('agent_name', ''),
-                'phone': row.get('agent_phone', ''),
-                'office': row.get('office_name', ''),
-                'total_listings': 0,
-                'lp_listings': 0,
-            }
-        agents_by_email[email]['total_listings'] += 1
-        if is_lp:
-            agents_by_email[email]['lp_listings'] += 1
+    infer_lp_for_loyal_agents(affected_rows)
+    derive_listing_fields(affected_rows)
+
+    add_fns = [acc.add for acc in accumulators]
+    for idx, row in zip(indices, affected_rows):
+        row = row.to_dict()
+        for add in add_fns:
+            add(row, idx)
+
+    print(f"    Re-folded {len(indices)} rows for {len(affected_agents)} affected agents")
+    return len(indices)
+
+
+def prepare_market(csv_path: Path, market_name: str, lp_addresses: set, photographer_map: dict,
+                   lookups_sha256: str = '', incremental: bool = False, lp_matcher: AddressMatcher = None,
+                   store_path: Path = None):
+    """
+    Run one market's pipeline up to the builders: read -> dedupe -> enrich ->
+    infer -> derive -> aggregate. Returns (rows, accumulators, watermark);
+    the accumulators' result()s are the MARKET_OUTPUTS, in order.
+
+    With incremental=True, resumes from the saved state when it is still valid:
+    appended rows are folded into the table and only the affected agents are
+    retracted and re-added to the saved accumulators. watermark is None when
+    there is no input CSV to resume from next time.
+
+    With store_path, listings are read from the SQLite store instead of the
+    CSV (see read_store_table); incremental runs resume from a store revision.
+    """
+    state = load_market_state(market_name) if incremental else None
+    store_name = store_path.name if store_path is not None else None
+    if state is not None and (state.get('version') != STATE_VERSION
+                              or state.get('lookups_sha256') != lookups_sha256
+                              or state.get('fuzzy_addresses') != (lp_matcher is not None)
+                              or state.get('input', {}).get('path') != csv_path.name
+                              or state.get('input', {}).get('store') != store_name):
+        print("    Incremental state is stale (version, input or lookups changed) - full rebuild")
+        state = None
+
+    tail = None
+    updates = []
+    if state is not None and store_path is not None:
+        with measure_stage('read_tail') as record:
+            tail = read_store_tail(store_path, market_name, state['input'])
+            record['rows_out'] = len(tail[0]) if tail is not None else 0
+    elif state is not None and csv_path.exists():
+        with measure_stage('read_tail') as record:
+            rebased = rebase_watermark(csv_path, state['input'])
+            if rebased is not None:
+                watermark, updates = rebased
+                tail = read_csv_tail(csv_path, watermark)
+            record['rows_out'] = len(tail[0]) if tail is not None else 0
+        if tail is None:
+            print("    Input CSV was rewritten since the last run - full rebuild")
+
+    if tail is not None:
+        rows = state['rows']
+        accumulators = state['accumulators']
+        new_rows, watermark = tail
+        if store_path is not None:
+            print(f"    Resuming from store revision {state['input']['revision']}: {len(new_rows)} changed rows")
+        else:
+            print(f"    Resuming from byte {state['input']['offset']}: {len(new_rows)} appended rows")
+        if updates:
+            print(f"    Rebased on reconciled rewrites of the CSV: {len(updates)} rows rewritten")
+        with measure_stage('fold', len(new_rows) + len(updates)) as record:
+            # Reconciled rows keep their enrichment (status and price don't feed it)
+            reconciled = apply_row_updates(rows, updates)
+            touched, replaced_emails = fold_new_rows(rows, new_rows)
+            touched_rows = [rows[idx] for idx in touched]
+            enrich_listings(touched_rows, lp_addresses, photographer_map, lp_matcher)
+            for row in touched_rows:
+                row['lp_flag_enriched'] = row.get('lp_flag', '')
+            touched = list(dict.fromkeys(reconciled + touched))
+            record['rows_out'] = len(touched)
+        print(f"    {len(touched)} listings added or updated ({len(rows)} unique MLS numbers)")
+        with measure_stage('refold', len(touched)):
+            refold_agents(rows, accumulators, touched, replaced_emails)
+    else:
+        if store_path is not None:
+            with measure_stage('read_store') as record:
+                rows, watermark = read_store_table(store_path, market_name, csv_path)
+                record['rows_out'] = len(rows)
+            print(f"    Loaded {len(rows)} rows from {store_path.name} (revision {watermark['revision']})")
+        else:
+            with measure_stage('read_csv') as record:
+                rows = read_csv_file(csv_path)
+                record['rows_out'] = len(rows)
+            print(f"    Loaded {len(rows)} rows")
+
+        with measure_stage('dedupe', len(rows)) as record:
+            rows = dedupe_by_mls(rows)
+            record['rows_out'] = len(rows)
+        print(f"    After deduplication: {len(rows)} unique MLS numbers")
+
+        with measure_stage('enrich', len(rows)) as record:
+            rows = enrich_listings(rows, lp_addresses, photographer_map, lp_matcher)
+            # Keep the pre-inference flag so incremental runs can re-infer an agent
+            rows.set_column('lp_flag_enriched', rows.column('lp_flag'))
+            record['rows_out'] = len(rows)
+        # Infer LP orders for high-loyalty agents (50%+ LP rate)
+        with measure_stage('infer_lp', len(rows)) as record:
+            rows = infer_lp_for_loyal_agents(rows)
+            record['rows_out'] = len(rows)
+        # Attach parsed camera/is_lp/price/list_date fields once for all builders
+        with measure_stage('derive_fields', len(rows)) as record:
+            rows = derive_listing_fields(rows)
+            record['rows_out'] = len(rows)
+
+        with measure_stage('aggregate', len(rows)):
+            accumulators = feed_rows(rows, market_accumulators(market_name))
+
+        if store_path is None:
+            watermark = None
+            if csv_path.exists():
+                size = csv_path.stat().st_size
+                watermark = {
+                    'offset': size,
+                    'sha256': file_sha256(csv_path, size),
+                    'headers': read_csv_header(csv_path),
+                    'rewrite': last_rewrite(csv_path),
+                }
+
+    return rows, accumulators, watermark
+
+
+# =============================================================================
+# STREAMING MODE (--stream)
+# The default pipeline holds every row of a market in a ListingTable and the
+# accumulators keep one record per listing, so peak memory grows with the
+# CSV. Streaming mode never materializes the rows:
+#   pass 1 - read records one at a time and build the MLS dedupe index
+#            (mls -> newest timestamp and the byte span of that record)
+#   pass 2 - re-read the winning records (in first-seen MLS order, the order
+#            dedupe_by_mls gives) to enrich them and count per-agent LP stats
+#   pass 3 - re-read and enrich them again, infer LP for the high-loyalty
+#            agents, derive fields and feed the streaming accumulators
+# The dedupe index is the only state that grows with the number of listings;
+# past the --memory-budget it spills to a temporary SQLite table. The
+# streaming accumulators keep bounded per-agent / per-value state (counters,
+# last and first values, top-K heaps for recent listings) and produce the
+# same outputs as the default ones; a market's listing records for its
+# listing pages also spill to SQLite past LISTINGS_LIMIT. They cannot
+# retract, so streaming does not combine with --incremental (or --store /
+# --archive, which need the full table).
+# =============================================================================
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+# Rough in-memory cost of one dedupe index entry (key, list and values)
+DEDUPE_ENTRY_BYTES = 320
+DEDUPE_FETCH_BATCH = 10000
+
+
+class LineReader:
+    """Decoded lines of a binary file, tracking the byte offset after the last one read."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = f.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        # Same newline handling as reading the CSV in text mode
+        return line.decode('utf-8', errors='ignore').replace('\r\n', '\n')
+
+
+def iter_csv_records(f):
+    """
+    Yield (offset, length, values) for each CSV record of a binary file
+    (the header included). Records may span lines (quoted newlines).
+    """
+    lines = LineReader(f)
+    start = lines.offset
+    for values in csv.reader(lines):
+        yield start, lines.offset - start, values
+        start = lines.offset
+
+
+def read_csv_record(f, offset: int, length: int) -> list:
+    """The values of the CSV record spanning [offset, offset + length)."""
+    f.seek(offset)
+    text = f.read(length).decode('utf-8', errors='ignore').replace('\r\n', '\n')
+    return next(csv.reader(io.StringIO(text, newline=None)), [])
+
+
+class DedupeIndex:
+    """
+    mls -> (timestamp, offset, length) of the newest record, iterated in
+    first-seen order like dedupe_by_mls. Holds up to max_entries in a dict;
+    beyond that batches spill to a temporary on-disk SQLite table, which
+    keeps each MLS number's first-seen position.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(max_entries, 1)
+        self.entries = {}   # mls -> [position, timestamp, offset, length]
+        self.position = 0
+        self.db = None
+        self.spilled = 0    # MLS numbers held when the index first spilled
+
+    def add(self, mls: str, timestamp: str, offset: int, length: int):
+        entry = self.entries.get(mls)
+        if entry is None:
+            self.entries[mls] = [self.position, timestamp, offset, length]
+            self.position += 1
+            if len(self.entries) >= self.max_entries:
+                self.spill()
+        elif timestamp > entry[1]:
+            entry[1:] = timestamp, offset, length
+
+    def spill(self):
+        if self.db is None:
+            self.spilled = len(self.entries)
+            # '' is a private temporary database on disk, deleted on close
+            self.db = sqlite3.connect('')
+            self.db.execute("PRAGMA journal_mode = OFF")
+            self.db.execute("PRAGMA cache_size = -16384")  # KiB
+            self.db.execute("CREATE TABLE seen (mls TEXT PRIMARY KEY, position INTEGER, "
+                            "timestamp TEXT, start INTEGER, length INTEGER)")
+        # Spilled MLS numbers keep their earlier position and only take a
+        # strictly newer record, as dedupe_by_mls does
+        self.db.executemany(
+            "INSERT INTO seen VALUES (?, ?, ?, ?, ?) ON CONFLICT (mls) DO UPDATE SET "
+            "timestamp = excluded.timestamp, start = excluded.start, length = excluded.length "
+            "WHERE excluded.timestamp > seen.timestamp",
+            ((mls, *entry) for mls, entry in self.entries.items()))
+        self.db.commit()
+        self.entries = {}
+
+    def __len__(self) -> int:
+        if self.db is None:
+            return len(self.entries)
+        self.spill()
+        return self.db.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def winners(self):
+        """(offset, length) of each MLS number's newest record, in first-seen order."""
+        if self.db is None:
+            for _, _, offset, length in self.entries.values():
+                yield offset, length
+            return
+        self.spill()
+        self.db.execute("CREATE INDEX IF NOT EXISTS seen_position ON seen (position)")
+        cursor = self.db.execute("SELECT start, length FROM seen ORDER BY position")
+        while True:
+            batch = cursor.fetchmany(DEDUPE_FETCH_BATCH)
+            if not batch:
+                return
+            yield from batch
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def build_dedupe_index(f, parse, fields: list, max_entries: int) -> tuple:
+    """Pass 1: (DedupeIndex, records read) over the data records of f."""
+    mls_idx = fields.index('mls_number')
+    ts_idx = fields.index('timestamp') if 'timestamp' in fields else None
+    index = DedupeIndex(max_entries)
+    loaded = 0
+    for offset, length, values in iter_csv_records(f):
+        row = parse(values)
+        if row is None:
+            continue
+        loaded += 1
+        index.add(row[mls_idx], row[ts_idx] if ts_idx is not None else '', offset, length)
+    return index, loaded
+
+
+def iter_winning_rows(f, index: DedupeIndex, parse, fields: list):
+    """Yield each deduped listing as a fresh row dict, in first-seen order."""
+    for offset, length in index.winners():
+        yield dict(zip(fields, parse(read_csv_record(f, offset, length))))
+
+
+class StreamingSummaryAccumulator(MarketSummaryAccumulator):
+    """MarketSummaryAccumulator without the per-listing records."""
+
+    def __init__(self):
+        super().__init__()
+        self.total = 0
+
+    def add(self, row: dict, idx: int):
+        self.total += 1
+        count_add(self.by_status, row.get('status', 'Unknown'))
+        self.lp_matched += is_lp_flagged(row)
+
+    def result(self) -> dict:
+        return dict(super().result(), total=self.total)
+
+
+class StreamingVerifiedAgentsAccumulator(VerifiedAgentsAccumulator):
+    """
+    VerifiedAgentsAccumulator keeping, per agent, distinct names/phones/
+    offices, running totals, month buckets, day buckets for the dates a
+    rolling window can still reach and a top-RECENT_LISTINGS heap. The
+    windows end at the newest list date, known only at the end, so day
+    buckets at or before `horizon` (the longest window back from the newest
+    date so far) are dropped whenever that date enters a new month.
+    """
+
+    def __init__(self, market_name: str):
+        super().__init__(market_name)
+        self.newest = ''
+        self.horizon = ''
+
+    def add(self, row: dict, idx: int):
+        email = valid_agent_email(row)
+        if not email:
+            return
+        _, name, phone, office, price_cents, is_lp, list_date, listing = self.make_record(row, idx)
+        agent = self.agents.get(email)
+        if agent is None:
+            # [names, phones, offices, total, volume, lp, month buckets, day buckets, recent heap]
+            agent = self.agents[email] = [{}, {}, {}, 0, 0, 0, {}, {}, []]
+        for values, value in zip(agent[:3], (name, phone, office)):
+            if value:
+                values[value] = None
+        agent[3] += 1
+        if price_cents is not None:
+            agent[4] += price_cents / 100
+        agent[5] += bool(is_lp)
+        if list_date:
+            add_activity(agent[6].setdefault(list_date[:7], [0, 0, 0]), is_lp, price_cents)
+            if list_date > self.newest:
+                self.advance(list_date)
+            if list_date > self.horizon:
+                add_activity(agent[7].setdefault(list_date, [0, 0, 0]), is_lp, price_cents)
+        if listing is not None:
+            # Newest list date first, ties in row order (the stable sort's order)
+            item = (listing['list_date'] or '0000-00-00', -idx, listing)
+            if len(agent[8]) < self.RECENT_LISTINGS:
+                heapq.heappush(agent[8], item)
+            else:
+                heapq.heappushpop(agent[8], item)
+
+    def advance(self, list_date: str):
+        """Move the newest list date forward, dropping unreachable day buckets at each new month."""
+        new_month = list_date[:7] != self.newest[:7]
+        self.newest = list_date
+        if new_month:
+            self.horizon = (date.fromisoformat(list_date) - timedelta(days=max(self.ROLLING_WINDOWS))).isoformat()
+            for agent in self.agents.values():
+                days = agent[7]
+                for day in [day for day in days if day <= self.horizon]:
+                    del days[day]
+
+    def newest_list_date(self) -> str:
+        return self.newest
+
+    def rolling(self, days: dict, starts: list) -> dict:
+        """Sum an agent's day buckets into the rolling windows."""
+        rolling = {label: [0, 0, 0] for label, _ in starts}
+        for day, bucket in days.items():
+            for label, start in starts:
+                if start < day <= self.as_of:
+                    window = rolling[label]
+                    for i in range(3):
+                        window[i] += bucket[i]
+        return rolling
+
+    def agent_entries(self) -> list:
+        self.as_of = self.newest
+        starts = self.rolling_starts()
+        return [self.make_entry(
+            email, list(names), list(phones), list(offices), total, volume, lp, monthly, self.rolling(days, starts),
+            [listing for _, _, listing in sorted(recent, reverse=True)],
+        ) for email, (names, phones, offices, total, volume, lp, monthly, days, recent) in self.agents.items()]
+
+
+class StreamingCustomerLoyaltyAccumulator(CustomerLoyaltyAccumulator):
+    """
+    CustomerLoyaltyAccumulator keeping, per agent, the last contact values,
+    running totals and the first RECENT_LISTINGS records.
+    """
+
+    def __init__(self, market_name: str):
+        super().__init__(market_name)
+        self.filtered = 0
+
+    def add(self, row: dict, idx: int):
+        email = valid_agent_email(row)
+        if not email:
+            return
+        if not row['camera_valid'] and is_lp_flagged(row):
+            self.filtered += 1
+        record = self.make_record(row, idx)
+        agent = self.agents.get(email)
+        if agent is None:
+            # [name, phone, office, preferred, total, volume, lp, first records]
+            agent = self.agents[email] = ['', '', '', '', 0, 0, 0, []]
+        for i in range(4):
+            agent[i] = record[i + 1] or agent[i]
+        agent[4] += 1
+        if record[5] is not None:
+            agent[5] += record[5] / 100
+        agent[6] += bool(record[6])
+        if len(agent[7]) < self.RECENT_LISTINGS:
+            agent[7].append(record)
+
+    def camera_filtered_count(self) -> int:
+        return self.filtered
+
+    def agent_entries(self) -> list:
+        return [self.make_entry(email, *agent[:7], self.recent_listing_entries(agent[7]))
+                for email, agent in self.agents.items()]
+
+
+class StreamingPhotographersAccumulator(PhotographersAccumulator):
+    """PhotographersAccumulator without the per-listing records."""
+
+    def add(self, row: dict, idx: int):
+        self._count(self.make_record(row), 1)
+
+
+class StreamingPhotographerAnalyticsAccumulator(PhotographerAnalyticsAccumulator):
+    """
+    PhotographerAnalyticsAccumulator keeping per-agent totals, per-fingerprint
+    counts and samples, per artist/camera agent counts with their last
+    contact values, and the listing records: in memory while they are under
+    LISTINGS_LIMIT, then (for the market's listing pages) in a temporary
+    on-disk SQLite table.
+    """
+
+    def __init__(self, market_name: str):
+        super().__init__(market_name)
+        self.total = 0
+        self.listings = []  # Records not yet spilled to self.db
+        self.db = None
+
+    def add(self, row: dict, idx: int):
+        email = valid_agent_email(row)
+        if not email:
+            return
+        record = self.make_record(row, idx, email)
+        name, phone, office, is_lp, camera, lens, artist, preferred = record[self.NAME:self.MLS]
+        self.total += 1
+
+        agent = self.agents.get(email)
+        if agent is None:
+            # Contact details from the agent's first listing
+            agent = self.agents[email] = {'email': email, 'name': name, 'phone': phone, 'office': office,
+                                          'total_listings': 0, 'lp_listings': 0}
+        agent['total_listings'] += 1
+        agent['lp_listings'] += bool(is_lp)
+
+        key = f"{camera}|||{lens}"
+        fingerprint = self.equipment_fingerprints.get(key)
+        if fingerprint is None:
+            # [count, emails, exif artist counts, sample records]
+            fingerprint = self.equipment_fingerprints[key] = [0, set(), {}, []]
+        fingerprint[0] += 1
+        fingerprint[1].add(email)
+        if artist:
+            count_add(fingerprint[2], artist)
+        if len(fingerprint[3]) < self.SAMPLE_LISTINGS:
+            fingerprint[3].append(record)
 
-        # Track cameras and lenses
         if camera != '-':
-            cameras[camera] += 1
-            # Track this agent as a user of this camera
-            cam_agent = camera_to_agents[camera][email]
-            cam_agent['count'] += 1
-            cam_agent['email'] = email
-            cam_agent['name'] = row.get('agent_name', '') or cam_agent['name']
-            cam_agent['phone'] = row.get('agent_phone', '') or cam_agent['phone']
-            cam_agent['office'] = row.get('office_name', '') or cam_agent['office']
+            count_add(self.cameras, camera)
+            self._count_agent(self.camera_to_agents, camera, record)
         if lens != '-':
-            lenses[lens] += 1
-
-        # Track EXIF artist
-        artist = row.get('exif_artist', '').strip()
+            count_add(self.lenses, lens)
         if artist:
-            exif_artists[artist] += 1
-            # Track this agent as a customer of this EXIF artist
-            agent_data = artist_to_agents[artist][email]
-            agent_data['count'] += 1
-            agent_data['email'] = email
-            agent_data['name'] = row.get('agent_name', '') or agent_data['name']
-            agent_data['phone'] = row.get('agent_phone', '') or agent_data['phone']
-            agent_data['office'] = row.get('office_name', '') or agent_data['office']
-            # These will be finalized after the loop with accurate totals
-            agent_data['total_listings'] = agents_by_email[email]['total_listings']
-            agent_data['lp_listings'] = agents_by_email[email]['lp_listings']
-
-        # Track preferred photographer
-        preferred = row.get('preferred_photographer', '').strip()
+            count_add(self.exif_artists, artist)
+            self._count_agent(self.artist_to_agents, artist, record)
         if preferred:
-            preferred_photographers[preferred] += 1
+            count_add(self.preferred_photographers, preferred)
+
+        self.listings.append(record)
+        if len(self.listings) >= (self.LISTINGS_LIMIT if self.db is None else DEDUPE_FETCH_BATCH):
+            self.spill_listings()
+
+    def spill_listings(self):
+        """Move the held listing records to the on-disk table (created at LISTINGS_LIMIT)."""
+        if self.db is None:
+            # '' is a private temporary database on disk, deleted on close
+            self.db = sqlite3.connect('')
+            self.db.execute("PRAGMA journal_mode = OFF")
+            self.db.execute("CREATE TABLE listings (list_date TEXT, position INTEGER, record TEXT)")
+        self.db.executemany("INSERT INTO listings VALUES (?, ?, ?)",
+                            ((r[self.LIST_DATE], r[self.IDX], json.dumps(r)) for r in self.listings))
+        self.listings = []
+
+    def _count_agent(self, groups: dict, key: str, record: tuple):
+        """Count a record towards its agent under groups[key], keeping the last contact values."""
+        agents = groups.setdefault(key, {})
+        agent = agents.get(record[self.EMAIL])
+        if agent is None:
+            agent = agents[record[self.EMAIL]] = [0, '', '', '']
+        agent[0] += 1
+        agent[1] = record[self.NAME] or agent[1]
+        agent[2] = record[self.PHONE] or agent[2]
+        agent[3] = record[self.OFFICE] or agent[3]
+
+    def agent_totals(self) -> dict:
+        return self.agents
+
+    def fingerprint_entries(self) -> list:
+        fingerprints_list = [self.fingerprint_entry(key, count, len(emails), exif_artists, samples)
+                             for key, (count, emails, exif_artists, samples) in self.equipment_fingerprints.items()]
+        fingerprints_list.sort(key=lambda x: x['count'], reverse=True)
+        return fingerprints_list
+
+    def agent_lookups(self, groups: dict, agents_by_email: dict, count_field: str) -> dict:
+        lookups = {}
+        for key, agents in groups.items():
+            agents_list = [self.lookup_entry(email, name, phone, office, count_field, count, agents_by_email)
+                           for email, (count, name, phone, office) in agents.items()]
+            agents_list.sort(key=lambda x: x[count_field], reverse=True)
+            lookups[key] = agents_list
+        return lookups
+
+    def listing_entries(self) -> list:
+        return [self.listing_entry(r) for r in self.listings]
+
+    def paged_listings(self):
+        if self.db is None:
+            yield from super().paged_listings()
+            return
+        self.spill_listings()
+        # Same order as the stable sort: newest list date first ('' last), ties in row order
+        cursor = self.db.execute("SELECT record FROM listings ORDER BY list_date DESC, position")
+        while True:
+            batch = cursor.fetchmany(DEDUPE_FETCH_BATCH)
+            if not batch:
+                return
+            for (record,) in batch:
+                yield self.listing_entry(json.loads(record))
+
+    def total_listings(self) -> int:
+        return self.total
+
+
+def streaming_accumulators(market_name: str) -> list:
+    """Fresh streaming accumulators for every per-market output, in MARKET_OUTPUTS order."""
+    return [
+        StreamingSummaryAccumulator(),
+        StreamingVerifiedAgentsAccumulator(market_name),
+        StreamingCustomerLoyaltyAccumulator(market_name),
+        StreamingPhotographersAccumulator(market_name),
+        StreamingPhotographerAnalyticsAccumulator(market_name),
+    ]
 
-        # Build equipment fingerprint
-        fingerprint_key = f"{camera}|||{lens}"
-        fp = equipment_fingerprints[fingerprint_key]
-        fp['count'] += 1
-        fp['agents'].add(email)
-        if artist:
-            fp['exif_artists'][artist] += 1
-        if len(fp['sample_listings']) < 5:
-            fp['sample_listings'].append({
-                'mls': row.get('mls_number', ''),
-                'address': row.get('listing_address', ''),
-                'agent': row.get('agent_name', ''),
-                'filename': row.get('scraped_image_filename', '') or '-',
-            })
 
-        # Parse list_date for photographer analytics
-        list_date = parse_list_date(row.get('list_date', ''))
+def prepare_market_streaming(csv_path: Path, market_name: str, lp_addresses: set, photographer_map: dict,
+                             lp_matcher: AddressMatcher = None,
+                             memory_budget: int = DEFAULT_MEMORY_BUDGET_MB) -> tuple:
+    """
+    prepare_market() for --stream: the same outputs in three passes over
+    the CSV without holding its rows. Returns (None, accumulators, None).
+    memory_budget (MB) caps the in-memory part of the dedupe index.
+    """
+    accumulators = streaming_accumulators(market_name)
+    if not csv_path.exists():
+        print(f"  Warning: {csv_path} not found")
+        print("    Loaded 0 rows")
+        return None, accumulators, None
+
+    with open(csv_path, 'rb') as f:
+        records = iter_csv_records(f)
+        _, _, headers = next(records, (0, 0, []))
+        positions = csv_field_positions(headers)
+        if 'mls_number' not in positions:
+            print("    Loaded 0 rows")
+            return None, accumulators, None
+        fields = list(positions)
+        parse = csv_row_parser(positions, fields, len(headers))
+
+        # Pass 1: dedupe index
+        with measure_stage('dedupe_index') as record:
+            index, loaded = build_dedupe_index(f, parse, fields, memory_budget * (1 << 20) // DEDUPE_ENTRY_BYTES)
+            record.update(rows_in=loaded, rows_out=len(index))
+        try:
+            print(f"    Loaded {loaded} rows")
+            print(f"    After deduplication: {len(index)} unique MLS numbers")
+            if index.spilled:
+                print(f"    Dedupe index spilled to disk after {index.spilled} MLS numbers "
+                      f"(--memory-budget {memory_budget} MB)")
+
+            # Pass 2: enrich and count each agent's confirmed LP orders
+            matches = {'filename': 0, 'address': 0, 'fuzzy': 0}
+            agent_stats = {}
+            with measure_stage('enrich', len(index)):
+                for row in iter_winning_rows(f, index, parse, fields):
+                    match = enrich_row(row, lp_addresses, photographer_map, lp_matcher)
+                    if match:
+                        matches[match] += 1
+                    count_agent_lp(agent_stats, row)
+            report_lp_matches(matches, lp_matcher is not None)
+            high_loyalty_agents = loyal_agent_emails(agent_stats)
+            del agent_stats
+
+            # Pass 3: enrich again, infer, derive and aggregate
+            add_fns = [acc.add for acc in accumulators]
+            inferred_count = 0
+            with measure_stage('aggregate', len(index)):
+                for idx, row in enumerate(iter_winning_rows(f, index, parse, fields)):
+                    enrich_row(row, lp_addresses, photographer_map, lp_matcher)
+                    if row.get('agent_email', '') in high_loyalty_agents:
+                        inferred_count += infer_lp(row)
+                    derive_listing_fields([row])
+                    for add in add_fns:
+                        add(row, idx)
+            report_lp_inference(inferred_count, high_loyalty_agents)
+        finally:
+            index.close()
+
+    return None, accumulators, None
+
+
+# =============================================================================
+# SQLITE STORE (--store)
+# The optional local store in listings_store.py keeps one upserted row per
+# MLS number, so reading it replaces re-reading and deduping the whole CSV.
+# A market with no listings in the store is seeded from its CSV first.
+# Incremental runs watermark the store revision instead of a CSV offset and
+# fetch only the rows changed since (through the revision index). The lookup
+# CSVs are re-imported only when their SHA-256 changes, and every run is
+# recorded in the store's run history.
+# =============================================================================
+
+def read_store_table(store_path: Path, market_name: str, csv_path: Path) -> tuple:
+    """A market's listings from the store as (ListingTable, watermark)."""
+    with ListingsStore(store_path) as store:
+        if not store.count(market_name) and csv_path.exists():
+            inserted, _ = store.upsert_listings(market_name, read_csv_file(csv_path).iter_dicts())
+            print(f"    Seeded {store_path.name} with {inserted} {market_name} listings from {csv_path.name}")
+        revision, values = store.snapshot(market_name)
+    table = append_csv_rows(ListingTable(), LISTING_COLUMNS, values)
+    return table, {'store': store_path.name, 'revision': revision}
+
+
+def read_store_tail(store_path: Path, market_name: str, watermark: dict) -> tuple:
+    """Listings changed after the watermarked revision, as (ListingTable, new watermark)."""
+    with ListingsStore(store_path) as store:
+        revision, values = store.snapshot(market_name, since_revision=watermark['revision'])
+    table = append_csv_rows(ListingTable(), LISTING_COLUMNS, values)
+    return table, {'store': store_path.name, 'revision': revision}
+
+
+def load_store_lookups(store_path: Path, lp_orders_path: Path, photographers_path: Path) -> tuple:
+    """
+    (lp_addresses, photographer_map) from the store, re-importing a lookup
+    CSV first when it changed since it was last imported.
+    """
+    with ListingsStore(store_path) as store:
+        sha256 = file_sha256(lp_orders_path)
+        if sha256 != store.lookups_sha256('lp_orders'):
+            store.replace_lp_orders(read_listerpros_orders(lp_orders_path), sha256)
+            print(f"    Imported {lp_orders_path.name} into {store_path.name}")
+        sha256 = file_sha256(photographers_path)
+        if sha256 != store.lookups_sha256('preferred_photographers'):
+            store.replace_preferred_photographers(read_preferred_photographers(photographers_path), sha256)
+            print(f"    Imported {photographers_path.name} into {store_path.name}")
+        return store.lp_addresses(), store.photographer_map()
+
+
+# =============================================================================
+# COLUMNAR ARCHIVE (--archive, needs pyarrow)
+# Most analytics need a handful of columns over years of history. --archive
+# writes each market's final (deduped, enriched, inferred) listings as
+# Parquet under archive/, hive-partitioned by market and list month:
+#   archive/market=phoenix/list_month=2025-12/part-0.parquet
+# read_archive() loads only the requested columns, and its date range prunes
+# whole month partitions before filtering rows on list_date_iso, so e.g.
+# build_archive_photographer_analytics() reads just the bytes that builder
+# uses. Listings without a parseable list_date go in list_month=none.
+# =============================================================================
+
+ARCHIVE_DIR = SCRIPT_DIR / "archive"
+ARCHIVE_NO_MONTH = 'none'
+ARCHIVE_FIELDS = STANDARD_FIELDS + ['lp_flag_enriched', 'lp_inferred', 'lp_match_confidence', 'list_date_iso']
+ARCHIVE_ORDER = 'table_row'  # Row position in the market table (restores table order)
+
+# Columns PhotographerAnalyticsAccumulator and derive_listing_fields read
+PHOTOGRAPHER_ANALYTICS_FIELDS = [
+    'mls_number', 'agent_email', 'agent_name', 'agent_phone', 'office_name', 'lp_flag',
+    'exif_make', 'exif_model', 'exif_lens_model', 'exif_artist', 'preferred_photographer',
+    'listing_address', 'scraped_image_filename', 'list_date', 'timestamp',
+]
 
-        # Add to listings array (limit fields)
-        listings.append({
-            'mls': row.get('mls_number', ''),
-            'address': row.get('listing_address', ''),
-            'email': email,
-            'name': row.get('agent_name', ''),
-            'lp': is_lp,
-            'cam': camera,
-            'lens': lens,
-            'artist': artist or '-',
-            'file': row.get('scraped_image_filename', '') or '-',
-            'list_date': list_date,
-            'ts': row.get('timestamp', '') or '-',
-        })
-
-    # Convert fingerprints for JSON serialization
-    fingerprints_list = []
-    for key, data in equipment_fingerprints.items():
-        camera, lens = key.split('|||')
-        fingerprints_list.append({
-            'camera': camera,
-            'lens': lens,
-            'count': data['count'],
-            'agent_count': len(data['agents']),
-            'exif_artists': dict(data['exif_artists']),
-            'sample_listings': data['sample_listings'],
-        })
-
-    # Sort fingerprints by count descending
-    fingerprints_list.sort(key=lambda x: x['count'], reverse=True)
-
-    # Build artist_agents lookup - finalize agent totals and convert to list format
-    artist_agents = {}
-    for artist, agents_dict in artist_to_agents.items():
-        agents_list = []
-        for email, agent_data in agents_dict.items():
-            # Get final totals from agents_by_email
-            final_agent = agents_by_email.get(email, {})
-            agents_list.append({
-                'email': agent_data['email'],
-                'name': agent_data['name'],
-                'phone': agent_data['phone'],
-                'office': agent_data['office'],
-                'photographer_listings': agent_data['count'],  # Listings with this photographer
-                'total_listings': final_agent.get('total_listings', 0),
-                'lp_listings': final_agent.get('lp_listings', 0),
-            })
-        # Sort by photographer_listings descending (biggest customers first)
-        agents_list.sort(key=lambda x: x['photographer_listings'], reverse=True)
-        # Store all agents per photographer
-        artist_agents[artist] = agents_list
-
-    # Build camera_agents lookup - who uses each camera model
-    camera_agents = {}
-    for camera, agents_dict in camera_to_agents.items():
-        agents_list = []
-        for email, agent_data in agents_dict.items():
-            final_agent = agents_by_email.get(email, {})
-            agents_list.append({
-                'email': agent_data['email'],
-                'name': agent_data['name'],
-                'phone': agent_data['phone'],
-                'office': agent_data['office'],
-                'camera_listings': agent_data['count'],  # Listings with this camera
-                'total_listings': final_agent.get('total_listings', 0),
-                'lp_listings': final_agent.get('lp_listings', 0),
-            })
-        # Sort by camera_listings descending
-        agents_list.sort(key=lambda x: x['camera_listings'], reverse=True)
-        camera_agents[camera] = agents_list
 
-    # Calculate market share stats
-    total_agents = len(agents_by_email)
-    agents_using_lp = len(agents_with_lp)
-    lp_agent_percentage = round((agents_using_lp / total_agents * 100) if total_agents > 0 else 0, 1)
-    lp_listing_percentage = round((lp_listings / total_listings * 100) if total_listings > 0 else 0, 1)
+def archive_partitioning():
+    return pads.partitioning(pa.schema([('market', pa.string()), ('list_month', pa.string())]), flavor='hive')
 
-    return {
-        'market': market_name,
-        'summary': {
-            'total_listings': total_listings,
-            'lp_listings': lp_listings,
-            'lp_listing_percentage': lp_listing_percentage,
-            'total_agents': total_agents,
-            'agents_using_lp': agents_using_lp,
-            'lp_agent_percentage': lp_agent_percentage,
-            'unique_cameras': len(cameras),
-            'unique_exif_artists': len(exif_artists),
-        },
-        'cameras': dict(sorted(cameras.items(), key=lambda x: x[1], reverse=True)),
-        'lenses': dict(sorted(lenses.items(), key=lambda x: x[1], reverse=True)),
-        'exif_artists': dict(sorted(exif_artists.items(), key=lambda x: x[1], reverse=True)),
-        'preferred_photographers': dict(sorted(preferred_photographers.items(), key=lambda x: x[1], reverse=True)),
-        'equipment_fingerprints': fingerprints_list,  # All fingerprints
-        # Artist to agents lookup - for photographer->customer drill-down
-        'artist_agents': artist_agents,
-        # Camera to agents lookup - for camera->user drill-down
-        'camera_agents': camera_agents,
-        # Store listings only for Tucson (smaller market) - Phoenix is too large
-        'listings': listings if len(listings) < 30000 else [],
-        'updated': datetime.now(timezone.utc).isoformat(),
-    }
 
+def write_archive(rows: 'ListingTable', market_name: str) -> int:
+    """
+    Replace a market's archive with rows. Month partitions no longer present
+    are removed. Returns the number of month partitions written.
+    """
+    months = [date[:7] or ARCHIVE_NO_MONTH for date in column_values(rows, 'list_date_iso')]
+    data = {field: pa.array(column_values(rows, field), pa.string()) for field in ARCHIVE_FIELDS}
+    data[ARCHIVE_ORDER] = pa.array(range(len(rows)), pa.uint32())
+    data['market'] = pa.array([market_name] * len(rows), pa.string())
+    data['list_month'] = pa.array(months, pa.string())
+
+    pads.write_dataset(pa.table(data), ARCHIVE_DIR, format='parquet', partitioning=archive_partitioning(),
+                       basename_template='part-{i}.parquet', existing_data_behavior='delete_matching')
+
+    keep = {f"list_month={month}" for month in months}
+    market_dir = ARCHIVE_DIR / f"market={market_name}"
+    for month_dir in (market_dir.iterdir() if market_dir.exists() else ()):
+        if month_dir.name not in keep:
+            for path in month_dir.iterdir():
+                path.unlink()
+            month_dir.rmdir()
+    return len(keep)
+
+
+def read_archive(market_name: str, fields=None, start: str = None, end: str = None) -> 'ListingTable':
+    """
+    Load a market's archived listings as a ListingTable in table order.
+    fields limits the columns read; start/end (YYYY-MM-DD, inclusive) keep
+    only listings whose list_date falls in the range.
+    """
+    dataset = pads.dataset(ARCHIVE_DIR, format='parquet', partitioning=archive_partitioning())
+    condition = pads.field('market') == market_name
+    if start:
+        condition &= (pads.field('list_month') >= start[:7]) & (pads.field('list_date_iso') >= start)
+    if end:
+        condition &= (pads.field('list_month') <= end[:7]) & (pads.field('list_date_iso') <= end)
+    fields = list(fields or ARCHIVE_FIELDS)
+    data = dataset.to_table(columns=fields + [ARCHIVE_ORDER], filter=condition).sort_by(ARCHIVE_ORDER)
+
+    table = ListingTable()
+    table.size = data.num_rows
+    for field in fields:
+        table.set_column(field, data.column(field).to_pylist())
+    return table
+
+
+def build_archive_photographer_analytics(market_name: str, start: str = None, end: str = None) -> dict:
+    """photographer_analytics over the archived history between start and end."""
+    rows = derive_listing_fields(read_archive(market_name, PHOTOGRAPHER_ANALYTICS_FIELDS, start, end))
+    return aggregate_rows(rows, [PhotographerAnalyticsAccumulator(market_name)])[0]
+
+
+# =============================================================================
+# STAGE PROFILES (--profile)
+# For digging into a slow stage: each market stage runs in its own cProfile
+# session. profiles/<market>/ gets, per stage, a pstats dump
+# (<stage>.prof, for pstats / snakeviz) and collapsed stacks
+# (<stage>.collapsed.txt, "frame;frame;frame microseconds" lines for
+# flamegraph.pl / speedscope), plus all.collapsed.txt with every stage under
+# a root frame named after it. The market log lists each stage's hottest
+# functions by self time. cProfile keeps caller -> callee edges rather than
+# whole stacks, so the collapsed stacks split a function's time among its
+# callers in proportion to each edge's cumulative time.
+# =============================================================================
+
+PROFILE_DIR = SCRIPT_DIR / "profiles"
+PROFILE_TOP = 10
+COLLAPSED_MIN_US = 1    # Stacks below this many microseconds are dropped
+COLLAPSED_MAX_DEPTH = 64
+
+
+def profile_frame(func: tuple) -> str:
+    """A pstats function key as a stack frame label ('name (file.py:line)')."""
+    filename, line, name = func
+    if filename == '~':
+        return name.replace(';', ',')  # Built-ins: '<built-in method ...>'
+    return f"{name} ({Path(filename).name}:{line})".replace(';', ',')
+
+
+def collapsed_stacks(stats: dict) -> dict:
+    """
+    Approximate collapsed stacks {frames: microseconds of self time} from a
+    pstats call graph ({func: (cc, nc, tottime, cumtime, callers)}).
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    stacks = defaultdict(float)
+
+    def walk(func, path, on_path, seconds):
+        cumtime = stats[func][3]
+        if not cumtime:
+            return
+        scale = min(seconds / cumtime, 1.0)
+        stacks[path] += stats[func][2] * scale * 1e6
+        if len(on_path) >= COLLAPSED_MAX_DEPTH:
+            return
+        for callee, edge_seconds in callees[func]:
+            share = edge_seconds * scale
+            if callee not in on_path and share * 1e6 >= COLLAPSED_MIN_US:
+                walk(callee, f"{path};{profile_frame(callee)}", on_path | {callee}, share)
+
+    for func, entry in stats.items():
+        if not entry[4]:  # Not called from inside the session: a root
+            walk(func, profile_frame(func), frozenset([func]), entry[3])
+    return {path: round(us) for path, us in stacks.items() if round(us) >= COLLAPSED_MIN_US}
+
+
+def print_hottest(stage_name: str, stats: dict, top: int):
+    """Print a stage's `top` functions by self time."""
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    print(f"      Hottest in {stage_name} (self / cumulative seconds, calls):")
+    for func, (_, calls, tottime, cumtime, _) in hottest:
+        print(f"        {tottime:8.3f} {cumtime:8.3f} {calls:>9}  {profile_frame(func)}")
+
+
+class StageProfiler:
+    """Runs stages under cProfile and writes their profiles to out_dir."""
+
+    def __init__(self, out_dir: Path, top: int = PROFILE_TOP):
+        self.out_dir = out_dir
+        self.top = top
+        self.collapsed = {}  # stage name -> collapsed stacks
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for path in list(out_dir.glob("*.prof")) + list(out_dir.glob("*.collapsed.txt")):
+            path.unlink()
+
+    def run(self, stage_name: str, func, *args):
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func, *args)
+        stats = pstats.Stats(profiler).stats
+        stem = stage_name.replace(':', '-')
+        profiler.dump_stats(self.out_dir / f"{stem}.prof")
+        self.collapsed[stage_name] = collapsed_stacks(stats)
+        write_collapsed(self.out_dir / f"{stem}.collapsed.txt", self.collapsed[stage_name])
+        if self.top:
+            print_hottest(stage_name, stats, self.top)
+        return result
+
+    def close(self):
+        """Write all.collapsed.txt: every stage's stacks under a frame named after it."""
+        write_collapsed(self.out_dir / "all.collapsed.txt",
+                        {f"{stage_name};{path}": us for stage_name, stacks in self.collapsed.items()
+                         for path, us in stacks.items()})
+
+
+def write_collapsed(path: Path, stacks: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        for frames, us in sorted(stacks.items()):
+            f.write(f"{frames} {us}\n")
+
+
+# =============================================================================
+# STAGE DAG
+# A market pipeline is a small DAG of stages. Each stage names the context
+# values it reads and the ones it produces; run_stages() starts a stage as
+# soon as its inputs exist, so independent stages (the output builders and
+# their JSON writers) can run concurrently on a thread pool of `jobs`
+# workers. Stages share the market's in-memory table, so threads rather than
+# processes; markets themselves already run in separate processes. The
+# builders are pure Python and hold the GIL, so extra jobs only overlap file
+# I/O; the default stays at one until a benchmark shows a gain.
+# =============================================================================
+
+class Stage:
+    """One pipeline step: func(*inputs) produces outputs (a tuple if several)."""
+
+    __slots__ = ('name', 'func', 'inputs', 'outputs')
+
+    def __init__(self, name: str, func, inputs=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    def results(self, value) -> dict:
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: value}
+        return dict(zip(self.outputs, value or ()))
+
+
+def check_stages(stages: list, context: dict):
+    """Raise ValueError unless every stage input is provided exactly once."""
+    producers = {}
+    for stage in stages:
+        for name in stage.outputs:
+            if name in producers or name in context:
+                raise ValueError(f"Stage output '{name}' is produced twice ({stage.name})")
+            producers[name] = stage.name
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in producers and name not in context]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' needs {', '.join(missing)}, which nothing produces")
+
+
+def run_stage(stage: Stage, args: list, profiler: StageProfiler = None) -> dict:
+    """Run one stage under measure_stage() (and the profiler, if any); returns its outputs by name."""
+    with measure_stage(stage.name) as record:
+        value = profiler.run(stage.name, stage.func, *args) if profiler is not None else stage.func(*args)
+        results = stage.results(value)
+        record.update(stage_output_metrics(results))
+    return results
+
+
+def run_stages(stages: list, context: dict, jobs: int = 1, profiler: StageProfiler = None) -> dict:
+    """
+    Run stages in dependency order, up to `jobs` at a time, each measured
+    in _STAGE_METRICS (and profiled by `profiler`, if given). Returns the
+    context extended with every stage's outputs.
+    """
+    check_stages(stages, context)
+    context = dict(context)
+    pending = list(stages)
+
+    def ready():
+        found = [stage for stage in pending if all(name in context for name in stage.inputs)]
+        for stage in found:
+            pending.remove(stage)
+        return found
+
+    if jobs <= 1:
+        while pending:
+            found = ready()
+            if not found:
+                raise ValueError(f"Stage cycle: {', '.join(stage.name for stage in pending)}")
+            for stage in found:
+                context.update(run_stage(stage, [context[name] for name in stage.inputs], profiler))
+        return context
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while pending or running:
+            for stage in ready():
+                args = [context[name] for name in stage.inputs]
+                running[pool.submit(run_stage, stage, args, profiler)] = stage
+            if not running:
+                raise ValueError(f"Stage cycle: {', '.join(stage.name for stage in pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                context.update(future.result())
+    return context
+
+
+# =============================================================================
+# MARKET PIPELINES
+# Each market in MARKETS runs its stage DAG (prepare -> build each output ->
+# write each output, plus saving incremental state) in its own worker
+# process. The only shared inputs are the read-only lookups (ListerPros
+# addresses, preferred photographers), which main() loads once and hands to
+# every worker through the pool initializer.
+# =============================================================================
+
+# Shared read-only lookups for the market pipelines (set by init_market_worker)
+_LOOKUPS = {}
+
+# Per-market output files: output name -> (file name, JSON style)
+MARKET_FILES = {
+    'verified_agents': ('verified_agents.json', 'pretty'),
+    'customer_loyalty': ('customer_loyalty.json', 'pretty'),
+    'photographers': ('photographers.json', 'pretty'),  # Legacy small file
+    'photographer_analytics': ('photographer_analytics.json', 'compact'),  # Compact to save space
+}
 
-def main():
-    print("=" * 60)
-    print("LISTINGS FEED STORE - DATA PROCESSOR")
-    print("Market-Segmented Output (phx-internal / tuc-internal)")
-    print("=" * 60)
 
-    # Load lookup data
-    print("\n[*] Loading lookup data...")
-    lp_addresses = read_listerpros_orders(DATA_DIR / "listerpros_orders.csv")
-    print(f"    ListerPros addresses: {len(lp_addresses)}")
+def init_market_worker(lp_addresses: set, photographer_map: dict, lookups_sha256: str = '',
+                       fuzzy_addresses: bool = False, trace_memory: bool = False):
+    """
+    Pool initializer: receive the shared lookups once per worker process
+    (and index the LP order addresses for fuzzy matching). trace_memory
+    starts tracemalloc so stage records include their peak.
+    """
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _LOOKUPS['lp_addresses'] = lp_addresses
+    _LOOKUPS['photographer_map'] = photographer_map
+    _LOOKUPS['lookups_sha256'] = lookups_sha256
+    _LOOKUPS['lp_matcher'] = AddressMatcher(lp_addresses) if fuzzy_addresses and lp_addresses else None
+    remember_previous_outputs(load_manifest())
 
-    photographer_map = read_preferred_photographers(DATA_DIR / "preferred_photographers.csv")
-    print(f"    Preferred photographer mappings: {len(photographer_map)}")
 
-    # Read Phoenix data
-    print("\n[*] Reading Phoenix listings...")
-    phoenix_rows = read_csv_file(DATA_DIR / "phoenix_listings.csv")
-    print(f"    Loaded {len(phoenix_rows)} rows")
+def prepare_stage(market: dict, incremental: bool, store: Path, stream: int):
+    print(f"\n[*] Processing {market['label']} listings...")
+    if stream:
+        return prepare_market_streaming(market['input'], market['name'], _LOOKUPS['lp_addresses'],
+                                        _LOOKUPS['photographer_map'], _LOOKUPS['lp_matcher'], memory_budget=stream)
+    return prepare_market(market['input'], market['name'], _LOOKUPS['lp_addresses'],
+                          _LOOKUPS['photographer_map'], _LOOKUPS['lookups_sha256'],
+                          incremental=incremental, lp_matcher=_LOOKUPS['lp_matcher'], store_path=store)
 
-    phoenix_rows = dedupe_by_mls(phoenix_rows)
-    print(f"    After deduplication: {len(phoenix_rows)} unique MLS numbers")
 
-    # Enrich Phoenix
-    phoenix_rows = enrich_listings(phoenix_rows, lp_addresses, photographer_map)
-    # Infer LP orders for high-loyalty agents (50%+ LP rate)
-    phoenix_rows = infer_lp_for_loyal_agents(phoenix_rows)
+def build_stage(output_name: str):
+    """Stage function finishing one output from the shared accumulators."""
+    index = MARKET_OUTPUTS.index(output_name)
 
-    # Read Tucson data
-    print("\n[*] Reading Tucson listings...")
-    tucson_rows = read_csv_file(DATA_DIR / "tucson_listings.csv")
-    print(f"    Loaded {len(tucson_rows)} rows")
+    def build(accumulators):
+        return accumulators[index].result()
+    return build
 
-    tucson_rows = dedupe_by_mls(tucson_rows)
-    print(f"    After deduplication: {len(tucson_rows)} unique MLS numbers")
 
-    # Enrich Tucson
-    tucson_rows = enrich_listings(tucson_rows, lp_addresses, photographer_map)
-    # Infer LP orders for high-loyalty agents (50%+ LP rate)
-    tucson_rows = infer_lp_for_loyal_agents(tucson_rows)
+def write_stage(output_name: str):
+    """
+    Stage function writing one output's JSON file; returns its path.
+    compact=True overrides the file's MARKET_FILES style. It takes the delta
+    feed generation only to run after the delta stage, which diffs against
+    the file being replaced.
+    """
+    filename, style = MARKET_FILES[output_name]
+
+    def write(market, data, compact, _generation):
+        path = market['output_dir'] / filename
+        write_json(path, data, 'compact' if compact else style)
+        return path
+    return write
+
+
+def delta_stage(market: dict, deltas: bool, *outputs):
+    """Diff against the previous generation; returns (generation, paths)."""
+    if not deltas:
+        return None, []
+    outputs = dict(zip(MARKET_FILES, outputs))
+    return write_market_delta(market['output_dir'], market['name'], outputs, outputs['verified_agents']['updated'])
+
+
+def save_state_stage(market: dict, rows, accumulators: list, watermark: dict, *_built):
+    """Persist incremental state (after the builders, which warm entry caches)."""
+    if watermark is None:
+        return None
+    save_market_state(market['name'], {
+        'version': STATE_VERSION,
+        'lookups_sha256': _LOOKUPS['lookups_sha256'],
+        'fuzzy_addresses': _LOOKUPS['lp_matcher'] is not None,
+        'input': dict(watermark, path=market['input'].name),
+        'rows': rows,
+        'accumulators': accumulators,
+    })
+    return market_state_path(market['name'])
 
-    # Write listings summary (combined stats for reference)
-    print("\n[*] Writing output/listings_summary.json...")
 
-    # Calculate status counts
-    phoenix_status = defaultdict(int)
-    tucson_status = defaultdict(int)
-    for row in phoenix_rows:
-        phoenix_status[row.get('status', 'Unknown')] += 1
-    for row in tucson_rows:
-        tucson_status[row.get('status', 'Unknown')] += 1
-
-    listings_summary = {
-        'phoenix': {
-            'total': len(phoenix_rows),
-            'by_status': dict(phoenix_status),
-            'lp_matched': len([r for r in phoenix_rows if r.get('lp_flag', '').lower() in ['yes', 'true', '1']]),
-        },
-        'tucson': {
-            'total': len(tucson_rows),
-            'by_status': dict(tucson_status),
-            'lp_matched': len([r for r in tucson_rows if r.get('lp_flag', '').lower() in ['yes', 'true', '1']]),
-        },
-        'combined': {
-            'total': len(phoenix_rows) + len(tucson_rows),
-            'lp_matched': len([r for r in phoenix_rows + tucson_rows if r.get('lp_flag', '').lower() in ['yes', 'true', '1']]),
-        },
-        'updated': datetime.now(timezone.utc).isoformat(),
-        'note': 'Market-specific data in phx-internal/ and tuc-internal/ folders',
+def shard_stage(market: dict, verified_agents: dict, agent_shards: int):
+    return write_agent_shards(market['output_dir'], verified_agents, agent_shards)
+
+
+def unshard_stage(market: dict, _verified_agents_path: Path):
+    if remove_agent_shards(market['output_dir']):
+        print(f"      Removed {market['label']} agent shards ({AGENT_SHARDS_DIR}/, --agent-shards is off)")
+
+
+def listing_pages_stage(market: dict, accumulators: list, listing_pages: int, photographer_analytics: dict):
+    """Write the market's listing pages if it is paged or --listing-pages is on; else remove old ones."""
+    if not listing_pages and 'listing_pages' not in photographer_analytics:
+        if remove_listing_pages(market['output_dir']):
+            print(f"      Removed {market['label']} listing pages ({LISTING_PAGES_DIR}/, no longer needed)")
+        return []
+    analytics = accumulators[MARKET_OUTPUTS.index('photographer_analytics')]
+    return write_listing_pages(market['output_dir'], market['name'], analytics.paged_listings(),
+                               listing_pages or LISTING_PAGE_SIZE, photographer_analytics['updated'])
+
+
+def archive_stage(market: dict, rows, *_built):
+    return write_archive(rows, market['name'])
+
+
+def publish_stage(*written):
+    """Publish every file the market wrote (single paths or lists of paths)."""
+    paths = []
+    for item in written:
+        paths.extend(item if isinstance(item, list) else [item])
+    return publish_files(paths)
+
+
+def market_stages(options: dict) -> list:
+    """
+    The stage DAG for one market. Its context holds 'market' plus the run
+    options ('incremental', 'compact', 'agent_shards', 'listing_pages', 'deltas', 'store',
+    'archive', 'stream': the --memory-budget in MB when streaming, else None,
+    'profile': the --profile-top count when profiling, else None).
+    """
+    stages = [Stage('prepare', prepare_stage, inputs=('market', 'incremental', 'store', 'stream'),
+                    outputs=('rows', 'accumulators', 'watermark'))]
+    for name in MARKET_OUTPUTS:
+        stages.append(Stage(f'build:{name}', build_stage(name), inputs=('accumulators',), outputs=(name,)))
+    stages.append(Stage('build:agent_hashes', agent_index_hashes, inputs=('verified_agents',),
+                        outputs=('agent_hashes',)))
+    # The delta diffs against the files on disk, so it runs before the writes
+    stages.append(Stage('delta', delta_stage, inputs=('market', 'deltas') + tuple(MARKET_FILES),
+                        outputs=('generation', 'delta_paths')))
+    for name in MARKET_FILES:
+        stages.append(Stage(f'write:{name}', write_stage(name), inputs=('market', name, 'compact', 'generation'),
+                            outputs=(f'{name}_path',)))
+    written = tuple(f'{name}_path' for name in MARKET_FILES) + ('delta_paths',)
+    if options['agent_shards']:
+        stages.append(Stage('write:agent_shards', shard_stage, inputs=('market', 'verified_agents', 'agent_shards'),
+                            outputs=('agent_shards_paths',)))
+        written += ('agent_shards_paths',)
+    else:
+        # After verified_agents.json is written, so lookups always have one of the two
+        stages.append(Stage('clean:agent_shards', unshard_stage, inputs=('market', 'verified_agents_path')))
+    # Markets at LISTINGS_LIMIT always get pages (see listing_pages_stage)
+    stages.append(Stage('write:listing_pages', listing_pages_stage,
+                        inputs=('market', 'accumulators', 'listing_pages', 'photographer_analytics'),
+                        outputs=('listing_pages_paths',)))
+    written += ('listing_pages_paths',)
+    stages.append(Stage('publish', publish_stage, inputs=written, outputs=('published',)))
+    if options['archive']:
+        # After the builders, which read the rows concurrently
+        stages.append(Stage('write:archive', archive_stage, inputs=('market', 'rows') + MARKET_OUTPUTS,
+                            outputs=('archive_months',)))
+    if options['incremental']:
+        stages.append(Stage('save_state', save_state_stage,
+                            inputs=('market', 'rows', 'accumulators', 'watermark') + MARKET_OUTPUTS,
+                            outputs=('state_path',)))
+    return stages
+
+
+def run_market_pipeline(market: dict, options: dict, jobs: int = 1) -> dict:
+    """
+    Run one market end to end and write its outputs. Console output is
+    captured so parallel markets don't interleave; main() prints it.
+    Returns a small summary (the rows and outputs stay in the worker) with
+    the market's stage records.
+    """
+    first_record = len(_STAGE_METRICS)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        profiler = None
+        if options['profile'] is not None:
+            profiler = StageProfiler(PROFILE_DIR / market['name'], options['profile'])
+        context = run_stages(market_stages(options), dict(options, market=market), jobs=jobs, profiler=profiler)
+        if profiler is not None:
+            profiler.close()
+
+        label = market['label']
+        print(f"\n[*] Writing {label} market data ({market['output_dir'].name}/)...")
+        print(f"      Wrote {context['verified_agents']['total_agents']} {label} agents")
+        if options['deltas']:
+            print(f"      {label} generation {context['generation']} ({DELTAS_DIR}/)")
+        if options['agent_shards']:
+            print(f"      Wrote {options['agent_shards']} {label} agent shards ({AGENT_SHARDS_DIR}/)")
+        if context['listing_pages_paths']:
+            print(f"      Wrote {len(context['listing_pages_paths']) - 1} {label} listing pages "
+                  f"({LISTING_PAGES_DIR}/)")
+        if options['archive']:
+            print(f"      Archived {label} listings ({context['archive_months']} months, {ARCHIVE_DIR.name}/)")
+        if profiler is not None:
+            print(f"      Wrote {len(profiler.collapsed)} {label} stage profiles "
+                  f"({PROFILE_DIR.name}/{market['name']}/)")
+        print(f"      {context['customer_loyalty']['summary']['agents_using_lp']} {label} agents have used LP")
+        print(f"      Wrote {label} camera/photographer analytics")
+        print(f"      Wrote {label} photographer analytics "
+              f"({context['photographer_analytics']['summary']['total_listings']} listings)")
+
+    return {
+        'name': market['name'],
+        'log': log.getvalue(),
+        'listings': context['summary']['total'],
+        'summary': context['summary'],
+        'total_agents': context['verified_agents']['total_agents'],
+        'agent_hashes': context['agent_hashes'],
+        'published': context['published'],
+        'writes': {name: _WRITES.get(name, {'written': False}) for name in context['published']},
+        'overall_lp_percentage': context['customer_loyalty']['summary']['overall_lp_percentage'],
+        'stages': take_stage_metrics(first_record),
     }
-    with open(OUTPUT_DIR / "listings_summary.json", 'w', encoding='utf-8') as f:
-        json.dump(listings_summary, f, indent=2, ensure_ascii=False)
-    print(f"    Phoenix: {len(phoenix_rows)}, Tucson: {len(tucson_rows)}")
 
-    # =========================================================================
-    # PHOENIX MARKET OUTPUT (phx-internal/)
-    # =========================================================================
-    print("\n[*] Building Phoenix market data (phx-internal/)...")
-
-    # Phoenix verified agents
-    print("    Building verified_agents.json...")
-    phx_verified_agents = build_verified_agents(phoenix_rows, 'phoenix')
-    with open(PHX_OUTPUT_DIR / "verified_agents.json", 'w', encoding='utf-8') as f:
-        json.dump(phx_verified_agents, f, indent=2, ensure_ascii=False)
-    print(f"      Wrote {phx_verified_agents['total_agents']} Phoenix agents")
-
-    # Phoenix customer loyalty
-    print("    Building customer_loyalty.json...")
-    phx_customer_loyalty = build_customer_loyalty(phoenix_rows, 'phoenix')
-    with open(PHX_OUTPUT_DIR / "customer_loyalty.json", 'w', encoding='utf-8') as f:
-        json.dump(phx_customer_loyalty, f, indent=2, ensure_ascii=False)
-    print(f"      {phx_customer_loyalty['summary']['agents_using_lp']} Phoenix agents have used LP")
-
-    # Phoenix photographers (legacy small file)
-    print("    Building photographers.json...")
-    phx_photographers = build_photographers_data(phoenix_rows, 'phoenix')
-    with open(PHX_OUTPUT_DIR / "photographers.json", 'w', encoding='utf-8') as f:
-        json.dump(phx_photographers, f, indent=2, ensure_ascii=False)
-    print(f"      Wrote Phoenix camera/photographer analytics")
-
-    # Phoenix photographer analytics (comprehensive for photographer pages)
-    print("    Building photographer_analytics.json...")
-    phx_photo_analytics = build_photographer_analytics(phoenix_rows, 'phoenix')
-    with open(PHX_OUTPUT_DIR / "photographer_analytics.json", 'w', encoding='utf-8') as f:
-        json.dump(phx_photo_analytics, f, ensure_ascii=False)  # No indent to save space
-    print(f"      Wrote Phoenix photographer analytics ({phx_photo_analytics['summary']['total_listings']} listings)")
 
-    # =========================================================================
-    # TUCSON MARKET OUTPUT (tuc-internal/)
-    # =========================================================================
-    print("\n[*] Building Tucson market data (tuc-internal/)...")
-
-    # Tucson verified agents
-    print("    Building verified_agents.json...")
-    tuc_verified_agents = build_verified_agents(tucson_rows, 'tucson')
-    with open(TUC_OUTPUT_DIR / "verified_agents.json", 'w', encoding='utf-8') as f:
-        json.dump(tuc_verified_agents, f, indent=2, ensure_ascii=False)
-    print(f"      Wrote {tuc_verified_agents['total_agents']} Tucson agents")
-
-    # Tucson customer loyalty
-    print("    Building customer_loyalty.json...")
-    tuc_customer_loyalty = build_customer_loyalty(tucson_rows, 'tucson')
-    with open(TUC_OUTPUT_DIR / "customer_loyalty.json", 'w', encoding='utf-8') as f:
-        json.dump(tuc_customer_loyalty, f, indent=2, ensure_ascii=False)
-    print(f"      {tuc_customer_loyalty['summary']['agents_using_lp']} Tucson agents have used LP")
-
-    # Tucson photographers (legacy small file)
-    print("    Building photographers.json...")
-    tuc_photographers = build_photographers_data(tucson_rows, 'tucson')
-    with open(TUC_OUTPUT_DIR / "photographers.json", 'w', encoding='utf-8') as f:
-        json.dump(tuc_photographers, f, indent=2, ensure_ascii=False)
-    print(f"      Wrote Tucson camera/photographer analytics")
-
-    # Tucson photographer analytics (comprehensive for photographer pages)
-    print("    Building photographer_analytics.json...")
-    tuc_photo_analytics = build_photographer_analytics(tucson_rows, 'tucson')
-    with open(TUC_OUTPUT_DIR / "photographer_analytics.json", 'w', encoding='utf-8') as f:
-        json.dump(tuc_photo_analytics, f, ensure_ascii=False)  # No indent to save space
-    print(f"      Wrote Tucson photographer analytics ({tuc_photo_analytics['summary']['total_listings']} listings)")
+def run_markets(markets: list, lookups: tuple, options: dict, parallel: bool = True, jobs: int = 1) -> dict:
+    """
+    Run every market pipeline, in a process pool when parallel is set.
+    Prints each market's log as it finishes. Returns {market name: summary}.
+    """
+    results = {}
+    if parallel and len(markets) > 1:
+        workers = min(len(markets), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_market_worker, initargs=lookups) as pool:
+            futures = [pool.submit(run_market_pipeline, market, options, jobs) for market in markets]
+            for future in as_completed(futures):
+                result = future.result()
+                print(result['log'], end='')
+                results[result['name']] = result
+    else:
+        init_market_worker(*lookups)
+        for market in markets:
+            result = run_market_pipeline(market, options, jobs)
+            print(result['log'], end='')
+            results[result['name']] = result
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process the market listing CSVs into JSON outputs.")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"fold in only rows appended since the last run (state kept in {STATE_DIR.name}/)")
+    parser.add_argument('--serial', action='store_true',
+                        help="run the markets one after another in this process instead of a process pool")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="stages to run concurrently on threads within each market (default: 1)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help=f"record each stage's tracemalloc peak in {RUN_METRICS_FILE} (slower; runs a "
+                             f"market's stages one at a time)")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"profile each market stage with cProfile: pstats and collapsed stacks under "
+                             f"{PROFILE_DIR.name}/<market>/ (runs a market's stages one at a time)")
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP, metavar='N',
+                        help=f"with --profile, functions listed per stage in the log (default: {PROFILE_TOP})")
+    parser.add_argument('--compact', action='store_true',
+                        help="write every JSON output without indentation (smallest files)")
+    parser.add_argument('--events', action='store_true',
+                        help=f"record status/price changes in the listing event store "
+                             f"({EVENTS_DIR.parent.name}/{EVENTS_DIR.name}/)")
+    parser.add_argument('--reconcile', action='store_true',
+                        help=f"first apply {CURRENT_STATUSES_PATH.name} to the listing CSVs (rewrites them in "
+                             f"place, as reconcile_statuses.py does)")
+    parser.add_argument('--fuzzy-addresses', action='store_true',
+                        help=f"also flag listings whose address approximately matches an LP order address "
+                             f"(confidence {LP_FUZZY_MIN_CONFIDENCE}+; default: exact matches only)")
+    parser.add_argument('--no-deltas', action='store_true',
+                        help=f"don't diff against the previous outputs or update {DELTAS_DIR}/")
+    parser.add_argument('--agent-shards', type=int, default=0, metavar='N',
+                        help=f"also write each market's agents as N hash-bucketed files under "
+                             f"{AGENT_SHARDS_DIR}/ (e.g. 64; default: off)")
+    parser.add_argument('--listing-pages', type=int, nargs='?', const=LISTING_PAGE_SIZE, default=0, metavar='N',
+                        help=f"write every market's listings, newest first, as NDJSON pages of N under "
+                             f"{LISTING_PAGES_DIR}/ (default N: {LISTING_PAGE_SIZE}; default: only markets with "
+                             f"{PhotographerAnalyticsAccumulator.LISTINGS_LIMIT}+ listings, in pages of "
+                             f"{LISTING_PAGE_SIZE})")
+    parser.add_argument('--store', type=Path, nargs='?', const=DEFAULT_STORE_PATH, metavar='PATH',
+                        help=f"read listings and lookups from the SQLite store (default path: "
+                             f"{DEFAULT_STORE_PATH.parent.name}/{DEFAULT_STORE_PATH.name}; seeded from the CSVs if empty)")
+    parser.add_argument('--archive', action='store_true',
+                        help=f"also write each market's listings as Parquet under {ARCHIVE_DIR.name}/, "
+                             f"partitioned by list month (needs pyarrow)")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream each market's CSV in passes instead of loading it (bounded memory)")
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET_MB, metavar='MB',
+                        help=f"with --stream, memory for the MLS dedupe index before it spills to disk "
+                             f"(default: {DEFAULT_MEMORY_BUDGET_MB})")
+    args = parser.parse_args(argv)
+    if args.archive and pa is None:
+        parser.error("--archive needs pyarrow (pip install pyarrow)")
+    if args.stream and (args.incremental or args.store or args.archive):
+        parser.error("--stream can't be combined with --incremental, --store or --archive")
+    if args.listing_pages < 0:
+        parser.error("--listing-pages must be a positive page size")
+    if args.memory_budget < 1:
+        parser.error("--memory-budget must be at least 1 MB")
+    if args.profile_top < 0:
+        parser.error("--profile-top can't be negative")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = datetime.now(timezone.utc).isoformat()
+    started_wall = time.perf_counter()
+    if args.trace_memory:
+        tracemalloc.start()
+    output_dirs = [f"{market['output_dir'].name}" for market in MARKETS]
+
+    print("=" * 60)
+    print("LISTINGS FEED STORE - DATA PROCESSOR")
+    print(f"Market-Segmented Output ({' / '.join(output_dirs)})")
+    if args.incremental:
+        print("Incremental mode")
+    if args.store:
+        print(f"Reading from {args.store}")
+    if args.stream:
+        print(f"Streaming mode (dedupe index budget {args.memory_budget} MB)")
+    if args.trace_memory:
+        print("Tracing memory per stage")
+    if args.profile:
+        print(f"Profiling each stage ({PROFILE_DIR.name}/)")
+    print("=" * 60)
+
+    # Listing history: the scraped rows are recorded before reconciliation
+    # rewrites their status, the current statuses after it
+    if args.events:
+        with measure_stage('record_events') as record:
+            partitions = {market['name']: EventPartition(market['name']) for market in MARKETS}
+            new_events = {market['name']: partitions[market['name']].ingest(csv_observations(market['input']))
+                          for market in MARKETS}
+            record['rows_out'] = sum(new_events.values())
+
+    # Bring archived listings up to date with their current status, price and
+    # days on market (rewrites the listing CSVs only when something changed)
+    if args.reconcile and CURRENT_STATUSES_PATH.exists():
+        print(f"\n[*] Reconciling listing statuses with {CURRENT_STATUSES_PATH.name}...")
+        with measure_stage('reconcile_statuses') as record:
+            reconciled = reconcile_statuses({market['label']: market['input'] for market in MARKETS})
+            record['rows_out'] = sum(counts['rows_updated'] for counts in reconciled.values())
+        print_reconciliation(reconciled)
+
+    if args.events:
+        print(f"\n[*] Recording listing events ({EVENTS_DIR.parent.name}/{EVENTS_DIR.name}/)...")
+        with measure_stage('record_status_events') as record:
+            current = read_current_statuses(CURRENT_STATUSES_PATH) if CURRENT_STATUSES_PATH.exists() else {}
+            record['rows_out'] = 0
+            for market in MARKETS:
+                rows = current.get(market['label'].lower(), {})
+                added = partitions[market['name']].ingest(current_status_observations(rows), STATUSES_SOURCE)
+                new_events[market['name']] += added
+                record['rows_out'] += added
+        for market in MARKETS:
+            partition = partitions[market['name']]
+            print(f"    {market['label']}: {new_events[market['name']]} new events ({len(partition)} total, "
+                  f"{partition.meta['bytes'] / 1024:.0f} KB)")
+
+    # Load lookup data (shared read-only by every market)
+    print("\n[*] Loading lookup data...")
+    lp_orders_path = DATA_DIR / "listerpros_orders.csv"
+    photographers_path = DATA_DIR / "preferred_photographers.csv"
+    with measure_stage('load_lookups') as record:
+        if args.store:
+            lp_addresses, photographer_map = load_store_lookups(args.store, lp_orders_path, photographers_path)
+        else:
+            lp_addresses = read_listerpros_orders(lp_orders_path)
+            photographer_map = read_preferred_photographers(photographers_path)
+        record['rows_out'] = len(lp_addresses) + len(photographer_map)
+    print(f"    ListerPros addresses: {len(lp_addresses)}")
+    print(f"    Preferred photographer mappings: {len(photographer_map)}")
+    print(f"    JSON encoder: {JSON_BACKEND}")
+
+    lookups_sha256 = lookups_fingerprint(lp_orders_path, photographers_path) if args.incremental else ''
+    remember_previous_outputs(load_manifest())
+
+    # Market pipelines: read -> dedupe -> enrich -> infer -> derive -> build -> write
+    options = {'incremental': args.incremental, 'compact': args.compact, 'agent_shards': args.agent_shards,
+               'listing_pages': args.listing_pages, 'deltas': not args.no_deltas, 'store': args.store,
+               'archive': args.archive, 'stream': args.memory_budget if args.stream else None,
+               'profile': args.profile_top if args.profile else None}
+    lookups = (lp_addresses, photographer_map, lookups_sha256, args.fuzzy_addresses, args.trace_memory)
+    # Per-stage tracemalloc peaks and profiles only mean something with one
+    # stage running at a time
+    jobs = 1 if args.trace_memory or args.profile else args.jobs
+    results = run_markets(MARKETS, lookups, options, parallel=not args.serial, jobs=jobs)
+
+    # Write listings summary (combined stats for reference)
+    print("\n[*] Writing output/listings_summary.json...")
+    listings_summary = {market['name']: results[market['name']]['summary'] for market in MARKETS}
+    listings_summary['combined'] = {
+        'total': sum(r['summary']['total'] for r in results.values()),
+        'lp_matched': sum(r['summary']['lp_matched'] for r in results.values()),
+    }
+    listings_summary['updated'] = datetime.now(timezone.utc).isoformat()
+    listings_summary['note'] = f"Market-specific data in {' and '.join(d + '/' for d in output_dirs)} folders"
+    with measure_stage('write:listings_summary') as record:
+        write_json(OUTPUT_DIR / "listings_summary.json", listings_summary, 'compact' if args.compact else 'pretty')
+        record['bytes'] = (OUTPUT_DIR / "listings_summary.json").stat().st_size
+    print("    " + ", ".join(f"{market['label']}: {results[market['name']]['listings']}" for market in MARKETS))
+
+    # Email membership index for agent verification (both markets)
+    print(f"\n[*] Writing output/{AGENT_INDEX_FILE}...")
+    index_path = OUTPUT_DIR / AGENT_INDEX_FILE
+    with measure_stage('write:agent_index') as record:
+        write_agent_index(index_path, {market['name']: results[market['name']]['agent_hashes']
+                                       for market in MARKETS}, listings_summary['updated'])
+        record['bytes'] = index_path.stat().st_size
+    print(f"    {sum(len(r['agent_hashes']) for r in results.values())} agent emails, "
+          f"{index_path.stat().st_size / 1024:.1f} KB")
+
+    # Content-hashed, precompressed copies of every output plus the manifest
+    print(f"\n[*] Writing output/{MANIFEST_FILE}...")
+    with measure_stage('write:manifest') as record:
+        published = publish_files([OUTPUT_DIR / "listings_summary.json", index_path])
+        for market in MARKETS:
+            published.update(results[market['name']]['published'])
+        write_manifest(published, listings_summary['updated'])
+        record['rows_out'] = len(published)
+    raw_bytes = sum(entry['bytes'] for entry in published.values())
+    print(f"    {len(published)} outputs, {raw_bytes / 1024:.0f} KB -> "
+          + ", ".join(f"{sum(entry.get(suffix + '_bytes', 0) for entry in published.values()) / 1024:.0f} KB .{suffix}"
+                      for suffix in COMPRESSORS))
+    if brotli is None:
+        print("    brotli not installed - .br siblings skipped (pip install brotli)")
+
+    # Run metrics: which outputs were rewritten and which were left untouched,
+    # plus per-stage timings and memory
+    writes = dict(_WRITES)
+    for market in MARKETS:
+        writes.update(results[market['name']]['writes'])
+    stages = {'main': take_stage_metrics()}
+    stages.update((market['name'], results[market['name']]['stages']) for market in MARKETS)
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    run = {
+        'started': started,
+        'wall_seconds': round(time.perf_counter() - started_wall, 4),
+        'cpu_seconds': round(sum(u.ru_utime + u.ru_stime for u in usage), 4),
+        'max_rss_mb': max(max_rss_mb(), max_rss_mb(resource.RUSAGE_CHILDREN)),
+        'listings': listings_summary['combined']['total'],
+        'options': dict({key: str(value) if isinstance(value, Path) else value for key, value in options.items()},
+                        serial=args.serial, jobs=jobs, trace_memory=args.trace_memory),
+    }
+    write_run_metrics(writes, listings_summary['updated'], run, stages)
+    skipped = sum(1 for write in writes.values() if not write['written'])
+    print(f"\n[*] Wrote output/{RUN_METRICS_FILE}: {len(writes) - skipped} outputs rewritten, "
+          f"{skipped} unchanged (left untouched)")
+    slowest = sorted(leaf_stages(stages), key=lambda item: item[1]['wall_seconds'], reverse=True)[:3]
+    print(f"    {run['wall_seconds']:.1f}s total; slowest stages: "
+          + ", ".join(f"{group} {record['stage']} {record['wall_seconds']:.2f}s" for group, record in slowest))
+
+    if args.store:
+        with ListingsStore(args.store) as store:
+            store.record_run(started, {
+                'listings': {market['name']: results[market['name']]['listings'] for market in MARKETS},
+                'incremental': args.incremental,
+                'outputs_written': len(writes) - skipped,
+            })
 
     # =========================================================================
     # SUMMARY
@@ -1159,18 +4467,17 @@ def main():
     print("\n" + "=" * 60)
     print("PROCESSING COMPLETE")
     print("=" * 60)
-    print(f"  Phoenix listings:  {len(phoenix_rows)}")
-    print(f"  Phoenix agents:    {phx_verified_agents['total_agents']}")
-    print(f"  Phoenix LP rate:   {phx_customer_loyalty['summary']['overall_lp_percentage']}%")
-    print()
-    print(f"  Tucson listings:   {len(tucson_rows)}")
-    print(f"  Tucson agents:     {tuc_verified_agents['total_agents']}")
-    print(f"  Tucson LP rate:    {tuc_customer_loyalty['summary']['overall_lp_percentage']}%")
-    print()
+    for market in MARKETS:
+        result = results[market['name']]
+        label = market['label']
+        print(f"{'  ' + label + ' listings:':<21}{result['listings']}")
+        print(f"{'  ' + label + ' agents:':<21}{result['total_agents']}")
+        print(f"{'  ' + label + ' LP rate:':<21}{result['overall_lp_percentage']}%")
+        print()
     print("  Output folders:")
-    print("    - phx-internal/  (Phoenix market data)")
-    print("    - tuc-internal/  (Tucson market data)")
-    print("    - output/        (Combined summary)")
+    for market in MARKETS:
+        print(f"{'    - ' + market['output_dir'].name + '/':<20}({market['label']} market data)")
+    print(f"{'    - ' + OUTPUT_DIR.name + '/':<20}(Combined summary)")
     print("=" * 60)
 
 
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Listings Feed Store - Status Reconciliation
+The scrapers only append MLS numbers they haven't seen before, so an
+archived listing keeps the status and price it had on its first scrape.
+data/current_statuses.csv holds each tracked listing's latest status, price
+and days on market; reconciliation hash-joins it into the listing CSVs by
+MLS number:
+
+- every archived row of a listing takes its current status, price and
+  days_on_market (a column added to the CSV when missing);
+- each status change found (against the row dedupe_by_mls would keep) is
+  appended to data/status_changes.csv.
+
+It is one pass over each file, and idempotent: a rerun finds the archive up
+to date, and a change already logged as a listing's latest transition is not
+logged twice (the log is appended before the archive is replaced, so an
+interrupted run is safe to repeat).
+
+Rows that don't change are copied byte for byte. Each rewrite is journaled in
+data/<market>_listings.rewrites.json (the offsets, old and new text of every
+rewritten row), so process_data.py --incremental can carry its watermark
+across the rewrite instead of rebuilding. Run it on its own before
+processing, or with process_data.py --reconcile:
+
+    python reconcile_statuses.py
+    python reconcile_statuses.py --dry-run
+"""
+
+import argparse
+import csv
+import io
+import json
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from listings_store import normalize_mls
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR / "data"
+CURRENT_STATUSES_PATH = DATA_DIR / "current_statuses.csv"
+STATUS_CHANGES_PATH = DATA_DIR / "status_changes.csv"
+TZ = ZoneInfo("America/Phoenix")
+
+# Listing CSVs by market label (the 'market' column of current_statuses.csv)
+LISTING_CSVS = {
+    'Phoenix': DATA_DIR / "phoenix_listings.csv",
+    'Tucson': DATA_DIR / "tucson_listings.csv",
+}
+
+# Fields current_statuses.csv overrides in the archive (when non-empty)
+RECONCILED_FIELDS = ('status', 'price', 'days_on_market')
+
+STATUS_CHANGE_FIELDS = [
+    'change_date', 'mls_number', 'old_status', 'new_status', 'address', 'formatted_address',
+    'agent_name', 'agent_email', 'agent_phone', 'price', 'list_date', 'days_on_market', 'lp_order', 'market'
+]
+
+# Same values process_data.is_lp_flagged() accepts
+LP_FLAG_VALUES = ('yes', 'true', '1')
+
+# Rewrites kept per listing CSV journal, and the most row text one entry
+# records; a bigger rewrite is journaled without its rows (not rebaseable)
+REWRITE_HISTORY = 8
+REWRITE_MAX_TEXT = 8 << 20
+
+# process_data reads the listing CSVs with errors='ignore', so they may hold
+# stray non-UTF-8 bytes. A rewrite decodes them to lone surrogates and copies
+# untouched records back byte for byte (keeping the journal's offsets exact;
+# json.dump escapes the surrogates there). Values are matched and rewritten
+# as process_data reads them, with the stray bytes dropped (see readable).
+CSV_ERRORS = 'surrogateescape'
+
+
+def read_current_statuses(path: Path) -> dict:
+    """{market label (lowercase): {mls_number: current row}}; later rows win."""
+    current = {}
+    with open(path, newline='', encoding='utf-8', errors='ignore') as f:
+        for row in csv.DictReader(f):
+            mls = normalize_mls(row.get('mls_number'))
+            if mls and (row.get('status') or '').strip():
+                market = (row.get('market') or '').strip().lower()
+                current.setdefault(market, {})[mls] = {field: (value or '').strip() for field, value in row.items()
+                                                       if field is not None}
+    return current
+
+
+def read_last_transitions(path: Path) -> dict:
+    """{(market label (lowercase), mls_number): new_status of its latest logged change}."""
+    last = {}
+    if path.exists():
+        with open(path, newline='', encoding='utf-8', errors='ignore') as f:
+            for row in csv.DictReader(f):
+                key = ((row.get('market') or '').strip().lower(), normalize_mls(row.get('mls_number')))
+                last[key] = (row.get('new_status') or '').strip()
+    return last
+
+
+def append_status_changes(path: Path, changes: list):
+    """Append change rows to the status change log (creating it with a header)."""
+    new_file = not path.exists() or path.stat().st_size == 0
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=STATUS_CHANGE_FIELDS, extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerows(changes)
+
+
+def rewrite_log_path(path: Path) -> Path:
+    """The rewrite journal of a listing CSV (data/<market>_listings.rewrites.json)."""
+    return path.with_name(f"{path.stem}.rewrites.json")
+
+
+def read_rewrites(path: Path) -> list:
+    """
+    A listing CSV's journaled rewrites, oldest first: {'rewrite': id,
+    'date', 'patches': [[old offset, new offset, old text, new text], ...]
+    or None when too big to record}. Offsets are byte offsets of whole
+    records (the header is the record at 0).
+    """
+    log_path = rewrite_log_path(path)
+    if not log_path.exists():
+        return []
+    with open(log_path, encoding='utf-8') as f:
+        return json.load(f)['rewrites']
+
+
+def log_rewrite(path: Path, change_date: str, patches: list):
+    """Append a rewrite of `path` to its journal, keeping the last REWRITE_HISTORY."""
+    rewrites = read_rewrites(path)
+    if sum(len(old) + len(new) for _, _, old, new in patches) > REWRITE_MAX_TEXT:
+        patches = None
+    rewrites.append({
+        'rewrite': rewrites[-1]['rewrite'] + 1 if rewrites else 1,
+        'date': change_date,
+        'patches': patches,
+    })
+    log_path = rewrite_log_path(path)
+    tmp_path = log_path.with_name(log_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'csv': path.name, 'rewrites': rewrites[-REWRITE_HISTORY:]}, f)
+    tmp_path.replace(log_path)
+
+
+def last_rewrite(path: Path) -> int:
+    """Id of a listing CSV's latest journaled rewrite (0 if none)."""
+    rewrites = read_rewrites(path)
+    return rewrites[-1]['rewrite'] if rewrites else 0
+
+
+def readable(values: list) -> list:
+    """CSV values as process_data reads them: stray bytes (lone surrogates) dropped."""
+    return [value.encode('utf-8', 'ignore').decode('utf-8') for value in values]
+
+
+def csv_records(lines):
+    """(values, raw text) for each record of a CSV read from lines (quoted newlines included)."""
+    consumed = []
+
+    def feed():
+        for line in lines:
+            consumed.append(line)
+            yield line
+
+    for values in csv.reader(feed()):
+        yield values, ''.join(consumed)
+        consumed.clear()
+
+
+def csv_line_terminator(path: Path) -> str:
+    """The line ending a CSV was written with, so rewrites keep it."""
+    with open(path, 'rb') as f:
+        return '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+
+
+def status_change(change_date: str, market: str, old_status: str, row: dict, latest: dict) -> dict:
+    """A status_changes.csv row for one listing (archive row, current status row)."""
+    def value(field, fallback=None):
+        return (row.get(field) or '').strip() or latest.get(fallback or field, '')
+    return {
+        'change_date': change_date,
+        'mls_number': normalize_mls(row.get('mls_number')),
+        'old_status': old_status,
+        'new_status': latest['status'],
+        'address': value('listing_address', 'address'),
+        'formatted_address': value('formatted_address'),
+        'agent_name': value('agent_name'),
+        'agent_email': value('agent_email'),
+        'agent_phone': value('agent_phone'),
+        'price': latest.get('price') or value('price'),
+        'list_date': value('list_date'),
+        'days_on_market': latest.get('days_on_market', ''),
+        'lp_order': 'TRUE' if (row.get('lp_flag') or '').strip().lower() in LP_FLAG_VALUES else 'FALSE',
+        'market': market,
+    }
+
+
+def reconcile_listings(path: Path, market: str, current: dict, last_transitions: dict, change_date: str,
+                       changes_path: Path = STATUS_CHANGES_PATH, dry_run: bool = False) -> dict:
+    """
+    Apply the current statuses to one market's listing CSV and log its
+    status changes. Only changed rows are re-encoded, and a rewrite is
+    journaled (see log_rewrite). Returns {'rows_updated', 'changes', 'unmatched'}.
+    """
+    line_terminator = csv_line_terminator(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    rows_updated = 0
+    newest = {}  # mls -> (timestamp, status before reconciling, row)
+    patches = []  # [old offset, new offset, old text, new text] per rewritten record
+    old_offset = new_offset = 0
+    try:
+        with open(path, newline='', encoding='utf-8', errors=CSV_ERRORS) as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8', errors=CSV_ERRORS) as dst:
+            records = csv_records(src)
+            header, text = next(records, ([], ''))
+            header = readable(header)
+            fieldnames = list(header)
+            if 'days_on_market' not in fieldnames:
+                fieldnames.append('days_on_market')
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction='ignore',
+                                    lineterminator=line_terminator)
+
+            def copy(text: str, out: str):
+                """Write a record (out is text unless it was rewritten) and track both files' offsets."""
+                nonlocal old_offset, new_offset
+                if out is not text:
+                    patches.append([old_offset, new_offset, text, out])
+                dst.write(out)
+                old_offset += len(text.encode('utf-8', CSV_ERRORS))
+                new_offset += len(out.encode('utf-8', CSV_ERRORS))
+
+            out = text
+            if fieldnames != header:
+                writer.writeheader()
+                out = buffer.getvalue()
+            copy(text, out)
+            for values, text in records:
+                out = text
+                if values:
+                    row = dict(zip(header, values if text.isascii() else readable(values)))
+                    mls = normalize_mls(row.get('mls_number'))
+                    latest = current.get(mls)
+                    if latest is not None:
+                        timestamp = row.get('timestamp') or ''
+                        seen = newest.get(mls)
+                        # Same keep-newest rule as dedupe_by_mls (first row wins ties)
+                        if seen is None or timestamp > seen[0]:
+                            newest[mls] = (timestamp, (row.get('status') or '').strip(), row)
+                        changed = {field: latest[field] for field in RECONCILED_FIELDS
+                                   if latest.get(field) and (row.get(field) or '').strip() != latest[field]}
+                        if changed:
+                            row.update(changed)
+                            rows_updated += 1
+                            buffer.seek(0)
+                            buffer.truncate()
+                            writer.writerow(row)
+                            out = buffer.getvalue()
+                copy(text, out)
+
+        market_key = market.lower()
+        changes = [status_change(change_date, market, old_status, row, current[mls])
+                   for mls, (_, old_status, row) in newest.items()
+                   if old_status != current[mls]['status']
+                   and last_transitions.get((market_key, mls)) != current[mls]['status']]
+        if not dry_run:
+            if changes:
+                append_status_changes(changes_path, changes)
+                for change in changes:
+                    last_transitions[(market_key, change['mls_number'])] = change['new_status']
+            if rows_updated:
+                log_rewrite(path, change_date, patches)
+                tmp_path.replace(path)
+    finally:
+        # Never leave a partial rewrite behind, whatever went wrong
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return {'rows_updated': rows_updated, 'changes': len(changes), 'unmatched': len(current) - len(newest)}
+
+
+def reconcile_statuses(listing_csvs: dict = None, current_path: Path = CURRENT_STATUSES_PATH,
+                       changes_path: Path = STATUS_CHANGES_PATH, change_date: str = None,
+                       dry_run: bool = False) -> dict:
+    """
+    Reconcile every market's listing CSV ({market label: path}) with the
+    current statuses. Returns {market label: counts} (see reconcile_listings)
+    for the markets with a CSV; {} when there is no current statuses file.
+    """
+    if not current_path.exists():
+        return {}
+    listing_csvs = LISTING_CSVS if listing_csvs is None else listing_csvs
+    change_date = change_date or datetime.now(TZ).date().isoformat()
+    current = read_current_statuses(current_path)
+    last_transitions = read_last_transitions(changes_path)
+    return {market: reconcile_listings(path, market, current.get(market.lower(), {}), last_transitions,
+                                       change_date, changes_path, dry_run)
+            for market, path in listing_csvs.items() if path.exists()}
+
+
+def print_reconciliation(results: dict, dry_run: bool = False):
+    for market, counts in results.items():
+        print(f"    {market}: {counts['rows_updated']} rows {'to update' if dry_run else 'updated'}, "
+              f"{counts['changes']} status changes{' found' if dry_run else ' logged'}"
+              + (f", {counts['unmatched']} current listings not in the archive" if counts['unmatched'] else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply data/current_statuses.csv to the listing CSVs.")
+    parser.add_argument('--dry-run', action='store_true', help="report what would change without writing")
+    parser.add_argument('--date', help="change_date for logged changes (default: today, Arizona time)")
+    args = parser.parse_args(argv)
+
+    print(f"[*] Reconciling listing statuses with {CURRENT_STATUSES_PATH.name}...")
+    results = reconcile_statuses(change_date=args.date, dry_run=args.dry_run)
+    if not results:
+        print(f"    Nothing to reconcile ({CURRENT_STATUSES_PATH.name} or the listing CSVs not found)")
+    print_reconciliation(results, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
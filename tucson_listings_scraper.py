@@ -31,6 +31,9 @@ from zoneinfo import ZoneInfo
 from io import StringIO
 from urllib.parse import urljoin
 
+from address_canon import CANONICAL_FIELD, canonicalize_address, fill_canonical_addresses, format_address
+from listings_store import ListingsStore
+
 try:
     from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
     from bs4 import BeautifulSoup
@@ -59,6 +62,10 @@ GITHUB_REPO = "jjnielsen82/listings-feed-store"
 GITHUB_BRANCH = "main"
 GITHUB_CSV_PATH = "data/tucson_listings.csv"
 
+# Optional local SQLite store (see listings_store.py) - set LISTINGS_STORE to its path
+LISTINGS_STORE = os.environ.get("LISTINGS_STORE", "")
+STORE_MARKET = "tucson"
+
 # Timing
 INTERVAL_HOURS = 6
 INTERVAL_SECONDS = INTERVAL_HOURS * 60 * 60
@@ -199,6 +206,8 @@ class GitHubSync:
             all_rows = list(existing_reader) + new_rows
         else:
             all_rows = new_rows
+        # Backfill the canonical address on rows written before the column existed
+        fill_canonical_addresses(all_rows)
 
         output = StringIO()
         writer = csv.DictWriter(output, fieldnames=fieldnames, extrasaction='ignore')
@@ -231,7 +240,9 @@ class TucsonListingsScraper:
             'formatted_address', 'image_filename',
             'exif_artist', 'exif_copyright', 'exif_make', 'exif_model',
             'exif_lens_model', 'exif_body_serial_number', 'exif_date_time_digitized',
-            'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer'
+            'scraped_image_filename', 'lp_flag', 'cleaned', 'preferred_photographer',
+            CANONICAL_FIELD,
+            'days_on_market'  # Filled in by reconcile_statuses.py; kept on sync
         ]
 
     def find_button_anywhere(self, page, regex: str):
@@ -477,8 +488,7 @@ class TucsonListingsScraper:
                             if img_path.exists():
                                 metadata = self.extract_image_metadata(img_path)
 
-            formatted_address = re.sub(r'[^\w\s]', ' ', listing_address.lower())
-            formatted_address = re.sub(r'\s+', ' ', formatted_address).strip()
+            formatted_address = format_address(listing_address)
 
             listing = {
                 'timestamp': current_timestamp,
@@ -508,6 +518,7 @@ class TucsonListingsScraper:
                 'lp_flag': '',
                 'cleaned': '',
                 'preferred_photographer': '',
+                CANONICAL_FIELD: canonicalize_address(formatted_address),
             }
 
             self.listings.append(listing)
@@ -602,6 +613,10 @@ def main():
                 listings, fieldnames = scraper.run()
 
                 if listings:
+                    if LISTINGS_STORE:
+                        with ListingsStore(LISTINGS_STORE) as store:
+                            inserted, updated = store.upsert_listings(STORE_MARKET, listings)
+                        print(f"\n[✓] {timestamp()} - Local store: {inserted} new, {updated} updated ({LISTINGS_STORE})")
                     sync = GitHubSync()
                     new_count = sync.sync_csv(listings, fieldnames)
                     print(f"\n[✓] {timestamp()} - Complete: {len(listings)} scraped, {new_count} new synced")